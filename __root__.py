@@ -147,12 +147,13 @@ else:
 ui.hook.idb.add('changing_cmt', __import__('hooks').address.changing, 45)
 ui.hook.idb.add('cmt_changed', __import__('hooks').address.changed, 45)
 
-## hook naming and "extra" comments to support updating the implicit tags
+## hook naming, "extra" comments, and colors to support updating the implicit tags
 if idaapi.__version__ < 7.0:
     ui.hook.idp.add('rename', __import__('hooks').rename, 40)
 else:
     ui.hook.idp.add('ev_rename', __import__('hooks').rename, 40)
 ui.hook.idb.add('extra_cmt_changed', __import__('hooks').extra_cmt_changed, 40)
+[ ui.hook.idb.add(_, getattr(__import__('hooks'), _), 40) for _ in ('item_color_changed',) if hasattr(idaapi.IDB_Hooks, _) ]
 
 ## hook function transformations so we can shuffle their tags between types
 if idaapi.__version__ < 7.0:
@@ -164,11 +165,32 @@ else:
     ui.hook.idb.add('deleting_func', __import__('hooks').del_func, 40)
     ui.hook.idb.add('set_func_start', __import__('hooks').set_func_start, 40)
     ui.hook.idb.add('set_func_end', __import__('hooks').set_func_end, 40)
+    ui.hook.idb.add('func_updated', __import__('hooks').func_updated, 40)
+    ui.hook.idb.add('tail_owner_changed', __import__('hooks').tail_owner_changed, 40)
 [ ui.hook.idb.add(_, getattr(__import__('hooks'), _), 40) for _ in ('thunk_func_created', 'func_tail_appended') ]
 
 ## rebase the entire tagcache when the entire database is rebased.
 ui.hook.idb.add('allsegs_moved', __import__('hooks').rebase, 50)
 
+## write the contents cache into the tagcache when the database is saved or idle, and discard it when closed
+if idaapi.__version__ < 7.0:
+    ui.hook.idp.add('savebase', __import__('hooks').on_save, 0)
+    ui.hook.idp.add('closebase', __import__('hooks').on_close, 0)
+else:
+    ui.hook.idb.add('savebase', __import__('hooks').on_save, 0)
+    ui.hook.idb.add('closebase', __import__('hooks').on_close, 0)
+ui.timer.register('tagcache', 1000, __import__('hooks').on_timer)
+
+## discard any decoded instructions and basic blocks when the bytes or the types of their addresses are changed
+if idaapi.__version__ < 7.0:
+    ui.hook.idb.add('byte_patched', __import__('hooks').byte_patched, 40)
+    [ ui.hook.idp.add(_, getattr(__import__('hooks'), _), 40) for _ in ('make_code', 'make_data', 'undefine') ]
+else:
+    [ ui.hook.idb.add(_, getattr(__import__('hooks'), _), 40) for _ in ('byte_patched', 'make_code', 'make_data', 'destroyed_items') ]
+
+## discard the images of the segments, the decoded instructions, and the basic blocks when any of the segments are changed
+[ ui.hook.idb.add(_, __import__('hooks').segments_changed, 40) for _ in ('segm_added', 'segm_deleted', 'segm_start_changed', 'segm_end_changed', 'segm_moved') if hasattr(idaapi.IDB_Hooks, _) ]
+
 ## switch the instruction set when the processor is switched
 if idaapi.__version__ < 7.0:
     ui.hook.idp.add('newprc', instruction.__newprc__, 50)
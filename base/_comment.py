@@ -58,11 +58,12 @@ that is prefixed with a backslash.
 """
 
 import functools, operator, itertools, types
-import collections, heapq, string
+import collections, heapq, string, re
+import contextlib, bisect
 import six, logging
 
 import internal, idaapi
-import codecs
+import codecs, zlib
 
 ### cheap data structure for doing pattern matching with
 class trie(dict):
@@ -138,11 +139,15 @@ class trie(dict):
 class cache(object):
     state, tree = collections.defaultdict(set), trie()
 
+    # encoders that have already been resolved for a given type
+    resolved = {}
+
     @classmethod
     def register(cls, type, *characters):
         def result(definition):
             # add definition to constant search by specified type
             cls.state[type].add(definition)
+            cls.resolved.clear()
 
             # add definition to symbolic search
             if characters:
@@ -154,12 +159,18 @@ class cache(object):
     @classmethod
     def by(cls, instance):
         type = instance.__class__
+        if type in cls.resolved:
+            return cls.resolved[type]
+
         try:
             if type not in cls.state:
                 type = next(t for t in cls.state if issubclass(type, t))
             res = next(enc for enc in cls.state[type] if enc.type(instance))
         except StopIteration:
             raise internal.exceptions.SerializationError(u"{:s}.by({!s}) : Unable to find an encoder for the serialization of the specified type ({!s}).".format('.'.join(('internal', __name__, cls.__name__)), type, type))
+
+        # each of the encoders determine whether they match by type, so we can cache it
+        cls.resolved[instance.__class__] = res
         return res
 
     @classmethod
@@ -340,6 +351,11 @@ class _set(default):
 class tag(object):
     """
     Namespace for encoding and decoding a tag and it's value.
+
+    This feeds each character through the escape and unescape coroutines
+    and is thus pretty slow. The ``codec`` namespace is what's actually
+    used to encode and decode a comment, and this namespace is kept as the
+    reference implementation that ``codec`` is verified against.
     """
 
     ## Tag name
@@ -516,6 +532,169 @@ class tag(object):
         # plain and simple...
         return key.get(), value.get()
 
+### single-pass tag encoding/decoding
+class codec(object):
+    """
+    Namespace for encoding and decoding an entire line of a comment in a
+    single pass.
+
+    The results of this namespace are identical to the ``tag`` namespace.
+    Escaping is done with ``unicode.translate`` using tables whose entries
+    are populated on demand from the ``tag`` namespace. This way a character
+    is only ever processed by the escape coroutine once. Decoding splits a
+    line with a regular expression and only unescapes the tag name.
+    """
+
+    class table(dict):
+        '''A translation table that uses `escape` to populate any missing characters.'''
+        def __init__(self, escape):
+            self.escape = escape
+        def __missing__(self, ordinal):
+            res = self[ordinal] = self.escape(ordinal)
+            return res
+
+    @staticmethod
+    def escape_name(ch):
+        res = internal.interface.collect_t(unicode, operator.add)
+        tag.name.encode(iter(ch), res)
+        return res.get()[1:-1]
+
+    @staticmethod
+    def escape_value(ch):
+        return unicode().join(_str._escape(iter(ch)))
+
+    # translation tables for escaping the name and value of a tag from either a unicode string, or bytes that have been decoded as latin1
+    names = table(internal.utils.fcompose(six.unichr, escape_name.__func__)), table(internal.utils.fcompose(six.int2byte, escape_name.__func__))
+    values = table(internal.utils.fcompose(six.unichr, escape_value.__func__)), table(internal.utils.fcompose(six.int2byte, escape_value.__func__))
+
+    # regular expression for splitting up a line into its name and its value
+    line = re.compile(r'^[{:s}]*\[([^\]]*)\]?(.*)$'.format(re.escape(string.whitespace)), re.DOTALL)
+
+    @classmethod
+    def escape(cls, string, tables):
+        '''Escape the specified `string` using the translation table for its type in `tables`.'''
+        unicodetable, bytestable = tables
+        if isinstance(string, unicode):
+            return string.translate(unicodetable)
+        return string.decode('latin1').translate(bytestable)
+
+    @classmethod
+    def unescape(cls, string):
+        '''Unescape the tag name in `string` exactly like the ``utils.character.unescape`` coroutine.'''
+        res = []
+        try:
+            cls.__unescape__(string, res)
+
+        # if we couldn't unescape it, then any characters that came before need to be decoded first
+        except internal.exceptions.InvalidFormatError:
+            unicode().join(res)
+            raise
+        return unicode().join(res)
+
+    @classmethod
+    def __unescape__(cls, string, res):
+        const, hexQ, of_hex = internal.utils.character.const, internal.utils.character.hexQ, internal.utils.character.of_hex
+        index = 0
+        while True:
+            backslash = string.find(const.backslash, index)
+            if backslash < 0:
+                res.append(string[index:])
+                break
+            res.append(string[index : backslash])
+
+            # an escape that's cut off is discarded as there's nothing to terminate it
+            t = string[backslash + 1 : backslash + 2]
+            if not t:
+                break
+
+            elif operator.contains(const.inverse, const.backslash + t):
+                res.append(operator.getitem(const.inverse, const.backslash + t))
+                index = backslash + 2
+
+            elif operator.contains(const.backslash, t):
+                res.append(const.backslash)
+                index = backslash + 2
+
+            # hex digits for an ascii character
+            elif t == 'x':
+                digits = string[backslash + 2 : backslash + 4]
+                if len(digits) < 2:
+                    break
+                if any(not hexQ(b) for b in digits):
+                    raise internal.exceptions.InvalidFormatError(u"{:s}.unescape(...) : Expected the next two characters ({:s}) to be hex digits for an ascii character.".format('.'.join(('internal', __name__, cls.__name__)), ', '.join(u"'{:s}'".format(internal.utils.string.escape(b, '\'')) for b in digits)))
+                res.append(six.int2byte(int(digits, 0x10)))
+                index = backslash + 4
+
+            # hex digits for a unicode character
+            elif t == 'u':
+                digits = string[backslash + 2 : backslash + 6]
+                if len(digits) < 4:
+                    break
+                if any(not hexQ(b) for b in digits):
+                    raise internal.exceptions.InvalidFormatError(u"{:s}.unescape(...) : Expected the next four characters ({:s}) to be hex digits for a unicode character.".format('.'.join(('internal', __name__, cls.__name__)), ', '.join(u"'{:s}'".format(internal.utils.string.escape(b, '\'')) for b in digits)))
+                res.append(six.unichr(int(digits, 0x10)))
+                index = backslash + 6
+
+            # hex digits for a long unicode character
+            elif t == 'U':
+                digits = string[backslash + 2 : backslash + 10]
+                if len(digits) < 8:
+                    break
+                if any(not hexQ(b) or of_hex(b) for b in digits[:2]):
+                    raise internal.exceptions.InvalidFormatError(u"{:s}.unescape(...) : Expected the next two characters ({:s}) to be zero for a long-unicode character.".format('.'.join(('internal', __name__, cls.__name__)), ', '.join(u"'{:s}'".format(internal.utils.string.escape(b, '\'')) for b in digits[:2])))
+                if any(not hexQ(b) for b in digits[2:]) or digits[2] not in {'0', '1'}:
+                    raise internal.exceptions.InvalidFormatError(u"{:s}.unescape(...) : Expected the next six characters ({:s}) to be hex digits for a long-unicode character.".format('.'.join(('internal', __name__, cls.__name__)), ', '.join(u"'{:s}'".format(internal.utils.string.escape(b, '\'')) for b in digits[2:])))
+                res.append(six.unichr(int(digits[2:], 0x10)))
+                index = backslash + 10
+
+            else:
+                raise internal.exceptions.InvalidFormatError(u"{:s}.unescape(...) : An unknown character code was specified ('{:s}').".format('.'.join(('internal', __name__, cls.__name__)), internal.utils.string.escape(t, '\'')))
+            continue
+        return
+
+    @classmethod
+    def string(cls, data):
+        '''Decode the string in `data` exactly like the ``_str`` type.'''
+        res = data if isinstance(data, unicode) else data.decode('utf8')
+        return res.lstrip()
+
+    @classmethod
+    def encode(cls, key, value):
+        '''Encode the provided `key` and `value` into a line fit for a comment.'''
+        t = cache.by(value)
+        res = cls.escape(value, cls.values) if issubclass(t, _str) else t.encode(value)
+        return unicode().join((tag.name.prefix, cls.escape(key, cls.names), tag.name.suffix, ' ', res))
+
+    @classmethod
+    def decode(cls, line):
+        '''Decode the provided `line` into its key and its value.'''
+        match = cls.line.match(line)
+        if match is None:
+            raise internal.exceptions.InvalidFormatError(u"{:s}.decode(...) : Input for tag name does not begin with the proper character ('{:s}') and instead starts with '{:s}'.".format('.'.join(('internal', __name__, cls.__name__)), internal.utils.string.escape(tag.name.prefix, '\''), internal.utils.string.escape(line.lstrip(string.whitespace)[:1], '\'')))
+        name, value = match.groups()
+
+        # if there's no value, then it's always an empty string
+        key, value_s = cls.unescape(name), value.lstrip(string.whitespace)
+        if not value_s:
+            return key, unicode()
+
+        # now we'll try to find out what type to decode it as
+        try:
+            t = cache.match(value_s)
+        except KeyError:
+            t = _str
+
+        # we have a type and a value. try to decode it
+        try:
+            res = cls.string(value_s) if t is _str else t.decode(value_s)
+
+        # if we weren't able to, then fall back to a string
+        except:
+            t = _str
+            logging.debug(u"{:s}.decode(...) : Assuming value ({!s}) is of type {!s}.".format('.'.join(('internal', __name__, cls.__name__)), internal.utils.string.repr(value_s), t))
+            res = cls.string(value_s)
+        return key, res
+
 ### Encoding and decoding of a comment
 def decode(data, default=''):
     """Decode all the `(key, value)` pairs from the string `data` delimited by newlines.
@@ -529,15 +708,13 @@ def decode(data, default=''):
 
     # initialize some variables to keep our state
     res = {}
-    key, value = internal.interface.collect_t(object, lambda _, key: key), internal.interface.collect_t(object, lambda _, value: value)
 
     # iterate through each line in the data
     for line in data.split('\n'):
-        iterable = iter(line)
 
         # try and decode the key and the value from the line
         try:
-            k, v = tag.decode(iterable)
+            k, v = codec.decode(line)
 
         # if the key was formatted incorrectly, then key the whole line by the default key
         except internal.exceptions.InvalidFormatError:
@@ -556,7 +733,7 @@ def encode(dict):
     # walk each item in the dictionary
     for k, v in six.iteritems(dict or {}):
         # encode the key and value from the dictionary
-        line = tag.encode(k, v)
+        line = codec.encode(k, v)
 
         # aggregate it into our list
         res.append(line)
@@ -566,20 +743,106 @@ def encode(dict):
 
 def check(data):
     '''Check that the string `data` has the correct format by trying to decode it.'''
-    res = map(iter, (data or '').split('\n'))
+    res = (data or '').split('\n')
     try:
-        map(tag.decode, res)
+        map(codec.decode, res)
     except:
         return False
     return True
 
+### compact binary encoding used by the tagcache
+class binary(object):
+    """
+    This namespace contains the primitives that are used to serialize
+    the tagcache into its compact binary format. Integers are encoded
+    as variable-length integers with 7 bits per byte, and strings are
+    prefixed by a byte that describes their type and their length.
+
+    Each function that reads takes a ``bytearray`` and the offset to
+    read from, and returns the decoded value along with the offset that
+    follows it. Each function that writes appends to a ``bytearray``.
+    """
+
+    @staticmethod
+    def unsigned(integer, result):
+        '''Append the unsigned `integer` to the bytearray in `result` as a variable-length integer.'''
+        while integer > 0x7f:
+            result.append(0x80 | integer & 0x7f)
+            integer >>= 7
+        result.append(integer)
+        return result
+
+    @classmethod
+    def string(cls, string, result):
+        '''Append the `string` to the bytearray in `result` along with its type and length.'''
+        if isinstance(string, unicode):
+            res, type = string.encode('utf8'), 1
+        elif isinstance(string, bytes):
+            res, type = string, 0
+        else:
+            raise internal.exceptions.SerializationError(u"{:s}.string({!r}, ...) : Unable to serialize an unsupported type ({!s}).".format('.'.join(('internal', __name__, cls.__name__)), string, string.__class__))
+        result.append(type)
+        cls.unsigned(len(res), result)
+        result.extend(res)
+        return result
+
+    @staticmethod
+    def integers(iterable, result):
+        '''Append each unsigned integer from `iterable` to the bytearray in `result` as a variable-length integer.'''
+        append = result.append
+        for integer in iterable:
+            while integer > 0x7f:
+                append(0x80 | integer & 0x7f)
+                integer >>= 7
+            append(integer)
+        return result
+
+    @staticmethod
+    def read_integers(data, offset, count):
+        '''Return a list of `count` variable-length integers at `offset` of the bytearray in `data` and the offset that follows them.'''
+        res, integer, shift = [], 0, 0
+        append = res.append
+        while len(res) < count:
+            byte = data[offset]
+            offset += 1
+            if byte < 0x80:
+                append(integer | byte << shift)
+                integer = shift = 0
+            else:
+                integer |= (byte & 0x7f) << shift
+                shift += 7
+            continue
+        return res, offset
+
+    @staticmethod
+    def read_unsigned(data, offset):
+        '''Return the variable-length integer at `offset` of the bytearray in `data` and the offset that follows it.'''
+        res = shift = 0
+        while True:
+            byte = data[offset]
+            res, offset = res | (byte & 0x7f) << shift, offset + 1
+            if byte < 0x80:
+                return res, offset
+            shift += 7
+        return
+
+    @classmethod
+    def read_string(cls, data, offset):
+        '''Return the string at `offset` of the bytearray in `data` and the offset that follows it.'''
+        type, (length, offset) = data[offset], cls.read_unsigned(data, offset + 1)
+        res = bytes(data[offset : offset + length])
+        if len(res) != length:
+            raise IndexError(offset + length)
+        return res.decode('utf8') if type else res, offset + length
+
 ### Tag reference counting
 class tagging(object):
     """
     This namespace is essentially the configuration of the tagging
     database. This configurations specifies how to marshal and
     compress reference counts that are retained by the tagging
-    infrastructure.
+    infrastructure, and the version of the format that they are
+    stored in.
 
     The keys for the dictionaries that store the reference count
     are named according to ``tagging.__tags__`` for the tag names
@@ -595,11 +858,19 @@ class tagging(object):
     __node__ = '$ tagcache'
     __tags__, __address__ = 'name', 'address'
 
+    # the original format that is still used by the index
     marshaller = __import__('marshal')
     codec = __import__('codecs').lookup('bz2_codec')
 
+    # the version of the format for the tagcache
+    # netnode.value = VERSION
+    VERSION = 1
+
     @classmethod
     def __init_tagcache__(cls, idp_modname):
+        if internal.netnode.get(cls.__node__) == idaapi.BADADDR:
+            cls.set_version(cls.VERSION)
+            index.reset()
         cls.node()
         logging.debug(u"{:s}.init_tagcache('{:s}') : Initialized tagcache with netnode \"{:s}\" and node id {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), internal.utils.string.escape(idp_modname, '\''), internal.utils.string.escape(cls.__node__, '"'), cls.__nodeid__))
 
@@ -613,46 +884,213 @@ class tagging(object):
         cls.__nodeid__ = node
         return node
 
+    @classmethod
+    def version(cls):
+        '''Return the version of the format that the tagcache is stored in.'''
+        res = internal.netnode.value.get(tagging.node(), type=int)
+        return res or 0
+
+    @classmethod
+    def set_version(cls, version):
+        '''Set the version of the format that the tagcache is stored in to `version`.'''
+        res, node = cls.version(), tagging.node()
+        internal.netnode.value.set(node, version)
+        return res
+
+    ## write-back caches for the tagcache
+    __depth__ = 0
+
+    @classmethod
+    def commit(cls):
+        '''Write each of the caches that compose the tagcache into the database and return the number of items that were written.'''
+        return contents.flush() + index.flush()
+
+    @classmethod
+    def discard(cls):
+        '''Discard each of the caches that compose the tagcache without writing them and return the number of items that were modified.'''
+        return contents.invalidate() + index.forget()
+
+    @classmethod
+    @contextlib.contextmanager
+    def transaction(cls):
+        """Return a context manager that defers writing the tagcache into the database until the outermost transaction has completed.
+
+        This is intended to be used when updating a large number of
+        reference counts so that each item is only written once.
+        """
+        tagging.__depth__ += 1
+        try:
+            yield cls
+        finally:
+            tagging.__depth__ -= 1
+            if not tagging.__depth__:
+                tagging.commit()
+        return
+
+    @classmethod
+    def idle(cls):
+        '''Write the tagcache into the database if there are no transactions in progress and return the number of items that were written.'''
+        if tagging.__depth__:
+            return 0
+        return tagging.commit()
+
 class contents(tagging):
     '''Tagging for an address within a function (contents)'''
     """
     This namespace is used to update the tag state for any content tags
     associated with a function in the database. The address for the top
     of the function represents a key within the netnode that is used to
-    fetch the blob and the supval which contains a marshall'd dictionary
-    and a marshall'd set. These are stored within the `tagging.node()`
+    fetch the blob and the supval which contains the reference counts
+    and the tag names. These are stored within the `tagging.node()`
     netnode withn the tag `contents.btag`.
 
-    The marshall'd dictionary that is stored in the netnode's blob is
-    used to retain a dictionary of reference counts for both the tag
-    names and the addresses that they reside at. Anytime a tag is
-    written or removed, the reference count for both the name and the
-    address is adjusted.
-
-    Due to a size limit of a blob, the supval for the tagging node is
-    used to store the tag names that are used within a function as a
-    marshall'd ``set``. This ``set`` is used to verify that the tag
-    names within the contents of the function correspond with the
-    reference count that is stored within the marshall'd dictionary
-    in the blob.
+    The dictionary that is stored in the netnode's blob is used to
+    retain a dictionary of reference counts for both the tag names and
+    the addresses that they reside at. Anytime a tag is written or
+    removed, the reference count for both the name and the address is
+    adjusted. The blob is stored in a compact binary format. The tag
+    names are stored as a table followed by each of their reference
+    counts, and the addresses are stored in sorted order as the
+    difference from the previous address starting at the top of the
+    function. If the result is large enough, it is compressed with
+    ``zlib`` at the level specified by ``contents.compression``.
+
+    The supval for the tagging node is used to store the table of the
+    tag names that are used within a function. This table is used to
+    verify that the tag names within the contents of the function
+    correspond with the reference count that is stored within the
+    blob. If the table is larger than a supval, then it is split into
+    chunks that are stored under the tags in ``contents.chunks`` at
+    the same index.
+
+    The original format marshalled the dictionary and compressed it
+    with ``bz2``. This format is still readable, and the version that
+    is stored in the tagging node is used to determine whether the
+    contents need to be migrated to the current format.
+
+    As decoding and encoding the blob is expensive, the dictionaries
+    are kept decoded within a write-back cache that is keyed by the
+    address of each function. Modified functions are only written back
+    to the netnode when they are evicted from the cache, when the
+    outermost ``contents.transaction()`` completes, or when the cache
+    is explicitly flushed with ``contents.flush()``.
     """
 
     ## for each function's content
-    # netnode.blob[fn.start_ea, btag] = marshal.dumps({'name', 'address'})
-    # netnode.sup[fn.start_ea] = marshal.dumps({tagnames})
+    # netnode.blob[fn.start_ea, btag] = pack({'name', 'address'})
+    # netnode.sup[fn.start_ea] = pack_header({tagnames})
+    # netnode.sup[fn.start_ea, chunks[i]] = pack_header({tagnames})[(i + 1) * MAX_SIZE:]
 
     #btag = idaapi.stag         # XXX: apparently 'S' is used for comments
     btag = idaapi.atag
 
+    # the first byte of the binary format (the original format always begins with "BZh")
+    RAW, COMPRESSED = 0x80, 0x81
+    compression, threshold = 1, 0x40
+    chunks = string.digits + string.ascii_lowercase
+
     @classmethod
     def _key(cls, ea):
         '''Converts the address `ea` to a key that's used to store contents data for the specified function.'''
         res = idaapi.get_func(ea)
         return internal.interface.range.start(res) if res else None
 
+    @classmethod
+    def _compress(cls, data):
+        '''Return the bytearray in `data` with the byte describing its format, compressing it if it is large enough.'''
+        if cls.compression is not None and len(data) > cls.threshold:
+            res = zlib.compress(bytes(data), cls.compression)
+            if len(res) < len(data):
+                return six.int2byte(cls.COMPRESSED) + res
+            return six.int2byte(cls.RAW) + bytes(data)
+        return six.int2byte(cls.RAW) + bytes(data)
+
+    @classmethod
+    def _binaryQ(cls, data):
+        '''Return whether the specified `data` is encoded in the binary format instead of the original format.'''
+        return bool(data) and six.byte2int(data) in {cls.RAW, cls.COMPRESSED}
+
+    @classmethod
+    def _decompress(cls, data):
+        '''Return a bytearray from `data` that was encoded in the binary format, decompressing it if necessary.'''
+        res = six.byte2int(data)
+        if res == cls.COMPRESSED:
+            return bytearray(zlib.decompress(data[1:]))
+        return bytearray(data[1:])
+
+    @classmethod
+    def pack(cls, key, state):
+        '''Encode the contents dictionary `state` for the function at `key` into the binary format.'''
+        result = bytearray()
+        names, addresses = state.get(cls.__tags__, {}), state.get(cls.__address__, {})
+
+        # the tag names and their reference counts
+        binary.unsigned(len(names), result)
+        for name, count in six.iteritems(names):
+            binary.string(name, result)
+            binary.unsigned(count, result)
+
+        # the addresses relative to the previous one (zig-zag encoded) and their reference counts
+        binary.unsigned(len(addresses), result)
+        items, previous = [], key
+        for ea in sorted(addresses):
+            delta, previous = ea - previous, ea
+            items.append(2 * delta if delta >= 0 else -2 * delta - 1)
+            items.append(addresses[ea])
+        binary.integers(items, result)
+        return cls._compress(result)
+
+    @classmethod
+    def unpack(cls, key, data):
+        '''Decode the contents dictionary for the function at `key` out of the binary format in `data`.'''
+        data = cls._decompress(data)
+        names, addresses = {}, {}
+
+        count, offset = binary.read_unsigned(data, 0)
+        for _ in six.moves.range(count):
+            name, offset = binary.read_string(data, offset)
+            names[name], offset = binary.read_unsigned(data, offset)
+
+        count, offset = binary.read_unsigned(data, offset)
+        items, offset = binary.read_integers(data, offset, 2 * count)
+        ea = key
+        for delta, refs in zip(items[0::2], items[1::2]):
+            ea += (delta >> 1) ^ -(delta & 1)
+            addresses[ea] = refs
+
+        if offset != len(data):
+            raise internal.exceptions.SizeMismatchError(u"{:s}.unpack({:#x}, ...) : The number of bytes that was decoded ({:#x}) did not match the expected size ({:#x}).".format('.'.join(('internal', __name__, cls.__name__)), key, offset, len(data)))
+
+        res = {}
+        if names: res[cls.__tags__] = names
+        if addresses: res[cls.__address__] = addresses
+        return res
+
+    @classmethod
+    def pack_header(cls, names):
+        '''Encode the tag names in `names` into the binary format for the header.'''
+        result = bytearray()
+        binary.unsigned(len(names), result)
+        for name in sorted(names):
+            binary.string(name, result)
+        return cls._compress(result)
+
+    @classmethod
+    def unpack_header(cls, data):
+        '''Decode the tag names for the header out of the binary format in `data`.'''
+        data = cls._decompress(data)
+        count, offset = binary.read_unsigned(data, 0)
+        res = set()
+        for _ in six.moves.range(count):
+            name, offset = binary.read_string(data, offset)
+            res.add(name)
+        if offset != len(data):
+            raise internal.exceptions.SizeMismatchError(u"{:s}.unpack_header(...) : The number of bytes that was decoded ({:#x}) did not match the expected size ({:#x}).".format('.'.join(('internal', __name__, cls.__name__)), offset, len(data)))
+        return res
+
     @classmethod
     def _read_header(cls, target, ea):
-        """Read the contents dictionary out of the supval belonging to the function at `target`.
+        """Read the tag names out of the supval belonging to the function at `target`.
 
         If `target` is ``None``, then use the address of the function containing `ea`.
         """
@@ -664,6 +1102,19 @@ class contents(tagging):
         if encdata is None:
             return None
 
+        # if it's in the binary format, then collect the rest of its chunks and decode it
+        if cls._binaryQ(encdata):
+            res = [encdata]
+            for tag in cls.chunks:
+                data = internal.netnode.sup.get(node, key, tag=tag)
+                if data is None: break
+                res.append(data)
+
+            try:
+                return cls.unpack_header(b''.join(res))
+            except (IndexError, zlib.error, UnicodeDecodeError, internal.exceptions.SizeMismatchError):
+                raise internal.exceptions.SerializationError(u"{:s}._read_header({!r}, {:#x}) : Unable to decode contents for {:#x} at {:#x}. The data that failed to be decoded is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, b''.join(res)))
+
         try:
             data, sz = cls.codec.decode(encdata)
             if len(encdata) != sz:
@@ -679,7 +1130,7 @@ class contents(tagging):
 
     @classmethod
     def _write_header(cls, target, ea, value):
-        """Write the specified `value` into the contents supval belonging to the supval of the function at `target`.
+        """Write the tag names in `value` into the contents supval belonging to the supval of the function at `target`.
 
         If `target` is ``None`` then use `ea` to locate the function.
         If `value` is ``None``, then remove the supval at the specified `target`.
@@ -688,116 +1139,284 @@ class contents(tagging):
         if key is None:
             raise internal.exceptions.FunctionNotFoundError(u"{:s}._write_header({!r}, {:#x}, {!s}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea))
 
-        if not value:
+        # remove any chunks that are left over from the previous header
+        def discard(tags):
+            for tag in tags:
+                if not internal.netnode.sup.remove(node, key, tag=tag): break
+            return
+
+        if value is None:
             ok = internal.netnode.sup.remove(node, key)
+            discard(cls.chunks)
             return bool(ok)
 
         try:
-            data = cls.marshaller.dumps(value)
-        except:
-            raise internal.exceptions.SerializationError(u"{:s}._write_header({!r}, {:#x}, {!s}) : Unable to marshal contents for {:#x} at {:#x}. The data that failed to be marshalled is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, value))
-
-        try:
-            encdata, sz = cls.codec.encode(data)
-            if sz != len(data):
-                raise internal.exceptions.SizeMismatchError(u"{:s}._write_header({!r}, {:#x}, {!s}) : The number of bytes that was encoded ({:#x}) did not match the expected size ({:+#x}).".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), sz, len(data)))
-        except:
-            raise internal.exceptions.SerializationError(u"{:s}._write_header({!r}, {:#x}, {!s}) : Unable to encode contents for {:#x} at {:#x}. The data that failed to be encoded is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, data))
-
-        if len(encdata) > internal.netnode.sup.MAX_SIZE:
-            logging.warn(u"{:s}._write_header({!r}, {:#x}, {!s}) : Too many tags within function. The size {:#x} must be < {:#x}. Ignoring it.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), len(encdata), internal.netnode.sup.MAX_SIZE))
-
-        ok = internal.netnode.sup.set(node, key, encdata)
+            encdata = cls.pack_header(value)
+        except internal.exceptions.SerializationError:
+            raise internal.exceptions.SerializationError(u"{:s}._write_header({!r}, {:#x}, {!s}) : Unable to encode contents for {:#x} at {:#x}. The data that failed to be encoded is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, value))
+
+        # split it into chunks that will fit into a supval
+        size = internal.netnode.sup.MAX_SIZE
+        res = [encdata[offset : offset + size] for offset in six.moves.range(0, len(encdata), size)]
+        if len(res) > 1 + len(cls.chunks):
+            raise internal.exceptions.SizeMismatchError(u"{:s}._write_header({!r}, {:#x}, {!s}) : Too many tags within function. The size {:#x} must be < {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), len(encdata), size * (1 + len(cls.chunks))))
+
+        ok = internal.netnode.sup.set(node, key, res[0])
+        for tag, chunk in zip(cls.chunks, res[1:]):
+            ok = ok and internal.netnode.sup.set(node, key, chunk, tag=tag)
+        discard(cls.chunks[len(res) - 1:])
         return bool(ok)
 
     @classmethod
-    def _read(cls, target, ea):
-        """Reads the value from the contents supval for the specific `target`.
+    def _load(cls, target, ea):
+        """Load the value from the contents blob for the specific `target` directly out of the netnode.
 
         If `target` is undefined or ``None`` then use `ea` to locate the function.
         """
         node, key = tagging.node(), cls._key(ea) if target is None else target
         if key is None:
-            raise internal.exceptions.FunctionNotFoundError(u"{:s}._read({!r}, {:#x}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea))
+            raise internal.exceptions.FunctionNotFoundError(u"{:s}._load({!r}, {:#x}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea))
 
         encdata = internal.netnode.blob.get(key, cls.btag)
         if encdata is None:
             return None
 
+        # if it's in the binary format, then we can decode it directly
+        if cls._binaryQ(encdata):
+            try:
+                return cls.unpack(key, encdata)
+            except (IndexError, zlib.error, UnicodeDecodeError, internal.exceptions.SizeMismatchError):
+                raise internal.exceptions.SerializationError(u"{:s}._load({!r}, {:#x}) : Unable to decode contents for {:#x} at {:#x}. The data that failed to decode is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, encdata))
+
         try:
             data, sz = cls.codec.decode(encdata)
             if len(encdata) != sz:
-                raise internal.exceptions.SizeMismatchError(u"{:s}._read({!r}, {:#x}) : The number of bytes that was decoded ({:#x}) did not match the expected size ({:+#x}).".format('.'.join(('internal', __name__, cls.__name__)), target, ea, sz, len(encdata)))
+                raise internal.exceptions.SizeMismatchError(u"{:s}._load({!r}, {:#x}) : The number of bytes that was decoded ({:#x}) did not match the expected size ({:+#x}).".format('.'.join(('internal', __name__, cls.__name__)), target, ea, sz, len(encdata)))
         except:
-            raise internal.exceptions.SerializationError(u"{:s}._read({!r}, {:#x}) : Unable to decode contents for {:#x} at {:#x}. The data that failed to decode is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, encdata))
+            raise internal.exceptions.SerializationError(u"{:s}._load({!r}, {:#x}) : Unable to decode contents for {:#x} at {:#x}. The data that failed to decode is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, encdata))
 
         try:
             result = cls.marshaller.loads(data)
         except:
-            raise internal.exceptions.SerializationError(u"{:s}._read({!r}, {:#x}) : Unable to unmarshal contents for {:#x} at {:#x}. The data that failed to be unmarshalled is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, data))
+            raise internal.exceptions.SerializationError(u"{:s}._load({!r}, {:#x}) : Unable to unmarshal contents for {:#x} at {:#x}. The data that failed to be unmarshalled is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea, data))
         return result
 
     @classmethod
-    def _write(cls, target, ea, value):
-        """Writes a `value` to the contents supval for the specific `target`.
+    def _store(cls, target, ea, value):
+        """Store a `value` directly into the contents blob and supval of the netnode for the specific `target`.
 
         If `target` is undefined or ``None`` then use `ea` to locate the function.
         If `value` is ``None``, then erase the value from the supval.
         """
         node, key = tagging.node(), cls._key(ea) if target is None else target
         if key is None:
-            raise internal.exceptions.FunctionNotFoundError(u"{:s}._write({!r}, {:#x}, {!r}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, value, key, ea))
+            raise internal.exceptions.FunctionNotFoundError(u"{:s}._store({!r}, {:#x}, {!r}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, value, key, ea))
 
         # erase cache and blob if no data is specified
         if not value:
             try:
                 ok = cls._write_header(target, ea, None)
                 if not ok:
-                    logging.debug(u"{:s}._write({!r}, {:#x}, {!s}) : Unable to remove address from sup cache with the key {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key))
+                    logging.debug(u"{:s}._store({!r}, {:#x}, {!s}) : Unable to remove address from sup cache with the key {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key))
             finally:
                 return internal.netnode.blob.remove(key, cls.btag)
 
         # update blob for given address
-        res = value
         try:
-            data = cls.marshaller.dumps(res)
-        except:
-            raise internal.exceptions.SerializationError(u"{:s}._write({!r}, {:#x}, {!s}) : Unable to marshal contents for {:#x} at {:#x}. The data that failed to be marshalled is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, res))
-
-        try:
-            encdata, sz = cls.codec.encode(data)
-        except:
-            raise internal.exceptions.SerializationError(u"{:s}._write({!r}, {:#x}, {!s}) : Unable to encode contents for {:#x} at {:#x}. The data that failed to be encoded is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, data))
-
-        if sz != len(data):
-            raise internal.exceptions.SizeMismatchError(u"{:s}._write({!r}, {:#x}, {!s}) : The number of bytes that was encoded ({:#x}) did not match the expected size ({:+#x}).".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), sz, len(data)))
+            encdata = cls.pack(key, value)
+        except internal.exceptions.SerializationError:
+            raise internal.exceptions.SerializationError(u"{:s}._store({!r}, {:#x}, {!s}) : Unable to encode contents for {:#x} at {:#x}. The data that failed to be encoded is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, value))
 
         # write blob
         try:
             ok = internal.netnode.blob.set(key, cls.btag, encdata)
             if not ok: raise AssertionError # XXX: use an explicit exception
         except:
-            raise internal.exceptions.DisassemblerError(u"{:s}._write({!r}, {:#x}, {!s}) : Unable to set contents for {:#x} at {:#x}. The data that failed to be set is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, encdata))
+            raise internal.exceptions.DisassemblerError(u"{:s}._store({!r}, {:#x}, {!s}) : Unable to set contents for {:#x} at {:#x}. The data that failed to be set is {!r}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key, ea, encdata))
 
-        # update sup cache with keys
-        res = set(six.viewkeys(value))
+        # update sup cache with the tag names
+        res = set(six.viewkeys(value.get(cls.__tags__, {})))
         try:
             ok = cls._write_header(target, ea, res)
             if not ok: raise AssertionError # XXX: use an explicit exception
         except:
-            logging.fatal(u"{:s}._write({!r}, {:#x}, {!s}) : Unable to set address to sup cache with the key {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key))
+            logging.fatal(u"{:s}._store({!r}, {:#x}, {!s}) : Unable to set address to sup cache with the key {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, internal.utils.string.repr(value), key), exc_info=True)
+        return ok
+
+    @classmethod
+    def migrate(cls):
+        """Upgrade the contents of every function in the tagcache to the current format.
+
+        This yields the total number of functions followed by each
+        function that was upgraded. Once every function has been
+        upgraded, the version stored in the tagging node is updated.
+        """
+        cls.flush()
+        if tagging.version() >= tagging.VERSION:
+            yield 0
+            return
+
+        node = tagging.node()
+        res = [ea for ea in internal.netnode.sup.fiter(node)]
+        yield len(res)
+
+        for ea in res:
+            try:
+                state = cls._load(ea, ea)
+            except internal.exceptions.SerializationError:
+                logging.warn(u"{:s}.migrate() : Unable to decode the contents for the function at {:#x}. Its reference counts will need to be rebuilt.".format('.'.join(('internal', __name__, cls.__name__)), ea), exc_info=True)
+                continue
+            cls._store(ea, ea, state or None)
+            yield ea
+        tagging.set_version(tagging.VERSION)
+
+    ## write-back cache for the contents of each function
+    # __cache__[fn.start_ea] = {'name', 'address'}
+    # __dirty__ = {fn.start_ea, ...}
+
+    MAXIMUM = 0x100
+    __cache__, __dirty__ = collections.OrderedDict(), set()
+
+    @staticmethod
+    def _copy(state):
+        '''Return a copy of the contents dictionary `state` so that modifying it will not modify the cache.'''
+        return { k : dict(v) for k, v in six.iteritems(state) }
+
+    @classmethod
+    def _fetch(cls, target, ea):
+        """Return the key and the cached contents dictionary for the specific `target` loading it from the netnode if it has not been cached.
+
+        If `target` is undefined or ``None`` then use `ea` to locate the function.
+        The dictionary that is returned is owned by the cache and is marked as
+        the most recently used. Any modifications to it need to be followed by
+        adding its key to ``contents.__dirty__``.
+        """
+        key = cls._key(ea) if target is None else target
+        if key is None:
+            raise internal.exceptions.FunctionNotFoundError(u"{:s}._fetch({!r}, {:#x}) : Unable to find a function for target ({!r}) at {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), target, ea, key, ea))
+
+        cache = cls.__cache__
+        res = cache.pop(key) if key in cache else cls._load(key, ea) or {}
+        cache[key] = res
+
+        # evict the least recently used functions and write back any that were modified
+        while len(cache) > max(1, cls.MAXIMUM):
+            item, state = cache.popitem(last=False)
+            if item in cls.__dirty__:
+                cls._commit(item, state)
+            continue
+        return key, res
+
+    @classmethod
+    def _commit(cls, key, state):
+        '''Write the contents dictionary `state` for the function at `key` into the netnode and mark it as clean.'''
+        ok = cls._store(key, key, state or None)
+        cls.__dirty__.discard(key)
         return ok
 
+    @classmethod
+    def _read(cls, target, ea):
+        """Reads the value from the contents cache for the specific `target`.
+
+        If `target` is undefined or ``None`` then use `ea` to locate the function.
+        """
+        _, res = cls._fetch(target, ea)
+        return cls._copy(res) if res else None
+
+    @classmethod
+    def _write(cls, target, ea, value):
+        """Writes a `value` to the contents cache for the specific `target`.
+
+        If `target` is undefined or ``None`` then use `ea` to locate the function.
+        If `value` is ``None``, then erase the value from the cache. The
+        value will be written into the netnode when the cache is flushed.
+        """
+        key, res = cls._fetch(target, ea)
+        res.clear(), res.update(cls._copy(value or {}))
+        cls.__dirty__.add(key)
+        return True
+
+    @classmethod
+    def flush(cls):
+        '''Write each function that has been modified within the cache into the netnode and return the number of functions that were written.'''
+        cache, count = cls.__cache__, 0
+        for key in sorted(cls.__dirty__):
+            cls._commit(key, cache.get(key, {}))
+            count += 1
+        return count
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the entire cache without writing any of the modified functions into the netnode.'''
+        count = len(cls.__dirty__)
+        cls.__cache__.clear(), cls.__dirty__.clear()
+        return count
+
+    @classmethod
+    def relocate(cls, segments):
+        """Re-key each of the cached functions and translate their addresses using the list of `(old, new, size)` tuples in `segments` after the database has been rebased.
+
+        As the cached functions might have been loaded from the original
+        format which stores absolute addresses, each of them is marked as
+        modified so that they will be written back with their new addresses.
+        The supvals containing the tag names for every function are keyed by
+        their address within the tagging node which is not moved by the
+        disassembler, so they are all moved to the new address of their
+        function regardless of the format that their contents are in.
+        """
+        def translate(ea):
+            res = next(((old, new) for old, new, size in segments if old <= ea < old + size), None)
+            return ea if res is None else ea - res[0] + res[1]
+
+        # remove every header that was moved before writing any of them, so
+        # that a header can't be overwritten if it's moved onto another one
+        node, headers = tagging.node(), []
+        for ea in [ea for ea in internal.netnode.sup.fiter(node)]:
+            if translate(ea) == ea:
+                continue
+            res = [internal.netnode.sup.get(node, ea)]
+            for tag in cls.chunks:
+                data = internal.netnode.sup.get(node, ea, tag=tag)
+                if data is None: break
+                res.append(data)
+            headers.append((translate(ea), res))
+            cls._write_header(ea, ea, None)
+
+        for ea, res in headers:
+            internal.netnode.sup.set(node, ea, res[0])
+            [ internal.netnode.sup.set(node, ea, data, tag=tag) for tag, data in zip(cls.chunks, res[1:]) ]
+
+        items = [(translate(key), { k : { translate(ea) : refs for ea, refs in six.iteritems(v) } if k == cls.__address__ else v for k, v in six.iteritems(state) }) for key, state in six.iteritems(cls.__cache__)]
+        cls.__cache__.clear(), cls.__cache__.update(items)
+        cls.__dirty__.clear(), cls.__dirty__.update(key for key, _ in items)
+        return len(items)
+
+    @classmethod
+    def _absoluteQ(cls, key):
+        """Return whether the contents for the function at `key` are stored with absolute addresses and have not been cached.
+
+        Only the original format stores absolute addresses, as the binary
+        format stores them relative to the function and the cached ones are
+        translated by ``contents.relocate``. Thus these are the only ones
+        that need their addresses translated when the database is rebased.
+        """
+        if key in cls.__cache__:
+            return False
+        encdata = internal.netnode.blob.get(key, cls.btag)
+        return encdata is not None and not cls._binaryQ(encdata)
+
     @classmethod
     def iterate(cls):
-        '''Yield each address and names for all of the contents tags in the database according to what is written into the tagging supval.'''
+        '''Yield each address and the tag names for all of the contents tags in the database according to what is written into the tagging supval.'''
+        cls.flush()
+
         node = tagging.node()
         for ea in internal.netnode.sup.fiter(node):
-            encdata = internal.netnode.sup.get(node, ea)
-            data, sz = cls.codec.decode(encdata)
-            if len(encdata) != sz:
-                logging.warn(u"{:s}.iterate() : Failed decoding tag names out of sup cache for {:#x} due to the length of encoded data ({:#x}) not matching the expected size ({:#x}).".format('.'.join(('internal', __name__, cls.__name__)), ea, len(encdata), sz))
-            res = cls.marshaller.loads(data)
+            try:
+                res = cls._read_header(ea, ea)
+            except internal.exceptions.SerializationError:
+                logging.warn(u"{:s}.iterate() : Failed decoding tag names out of sup cache for {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), ea), exc_info=True)
+                continue
             yield ea, res
         return
 
@@ -807,19 +1426,14 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        res = cls._read(target.get('target', None), address) or {}
-        state, cache = res.get(cls.__tags__, {}), res.get(cls.__address__, {})
+        key, res = cls._fetch(target.get('target', None), address)
+        state, cache = res.setdefault(cls.__tags__, {}), res.setdefault(cls.__address__, {})
 
         state[name] = refs = state.get(name, 0) + 1
         cache[address] = cache.get(address, 0) + 1
 
-        if state: res[cls.__tags__] = state
-        else: del res[cls.__tags__]
-
-        if cache: res[cls.__address__] = cache
-        else: del res[cls.__address__]
-
-        cls._write(target.get('target', None), address, res)
+        cls.__dirty__.add(key)
+        index.add(key, name, address)
         return refs
 
     @classmethod
@@ -828,7 +1442,7 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        res = cls._read(target.get('target', None), address) or {}
+        key, res = cls._fetch(target.get('target', None), address)
         state, cache = res.get(cls.__tags__, {}), res.get(cls.__address__, {})
 
         refs, count = state.pop(name, 0) - 1, cache.pop(address, 0) - 1
@@ -844,7 +1458,8 @@ class contents(tagging):
         if cache: res[cls.__address__] = cache
         else: res.pop(cls.__address__, None)
 
-        cls._write(target.get('target', None), address, res)
+        cls.__dirty__.add(key)
+        index.remove(key, name, address)
         return refs
 
     @classmethod
@@ -853,7 +1468,7 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        res = cls._read(target.get('target', None), address) or {}
+        _, res = cls._fetch(target.get('target', None), address)
         res = res.get(cls.__tags__, {})
         return set(six.viewkeys(res))
 
@@ -863,7 +1478,7 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        res = cls._read(target.get('target', None), address) or {}
+        _, res = cls._fetch(target.get('target', None), address)
         res = res.get(cls.__address__, {})
         return sorted(six.viewkeys(res))
 
@@ -873,7 +1488,7 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        state = cls._read(target.get('target', None), address) or {}
+        key, state = cls._fetch(target.get('target', None), address)
 
         res = state.get(cls.__tags__, {})
         if count > 0:
@@ -886,10 +1501,8 @@ class contents(tagging):
         else:
             state.pop(cls.__tags__, None)
 
-        ok = cls._write(target.get('target', None), address, state)
-        if ok:
-            return state
-        raise internal.exceptions.ReadOrWriteError(u"{:s}.set_name({:#x}, {!r}, {:d}{:s}) : Unable to write name to address {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), address, name, count, ', {:s}'.format(internal.utils.string.kwargs(target)) if target else '', address))
+        cls.__dirty__.add(key)
+        return cls._copy(state)
 
     @classmethod
     def set_address(cls, address, count, **target):
@@ -897,7 +1510,7 @@ class contents(tagging):
 
         If `target` is undefined or ``None`` then use `address` to locate the function.
         """
-        state = cls._read(target.get('target', None), address) or {}
+        key, state = cls._fetch(target.get('target', None), address)
 
         res = state.get(cls.__address__, {})
         if count > 0:
@@ -910,10 +1523,8 @@ class contents(tagging):
         else:
             state.pop(cls.__address__, None)
 
-        ok = cls._write(target.get('target', None), address, state)
-        if ok:
-            return state
-        raise internal.exceptions.ReadOrWriteError(u"{:s}.set_address({:#x}, {:d}{:s}) : Unable to write name to address {:#x}.".format('.'.join(('internal', __name__, cls.__name__)), address, count, ', {:s}'.format(internal.utils.string.kwargs(target)) if target else '', address))
+        cls.__dirty__.add(key)
+        return cls._copy(state)
 
 class globals(tagging):
     """
@@ -943,6 +1554,7 @@ class globals(tagging):
         internal.netnode.hash.set(node, eName, cName)
         internal.netnode.alt.set(node, address, cAddress)
 
+        index.add(None, name, address)
         return cName
 
     @classmethod
@@ -963,6 +1575,7 @@ class globals(tagging):
         else:
             internal.netnode.alt.set(node, address, cAddress)
 
+        index.remove(None, name, address)
         return cName
 
     @classmethod
@@ -972,8 +1585,14 @@ class globals(tagging):
         return { internal.utils.string.of(name) for name in internal.netnode.hash.fiter(node) }
 
     @classmethod
-    def address(cls):
-        '''Return all the tag addresses (``sorted``) in the specified database (globals and func-tags)'''
+    def address(cls, *range):
+        """Return all the tag addresses (``sorted``) in the specified database (globals and func-tags)
+
+        If `range` is specified as a `start` and `stop` address, then only return the addresses within it.
+        """
+        if range:
+            start, stop = range
+            return [ea for ea, _ in internal.netnode.alt.fbetween(tagging.node(), start, stop)]
         return sorted(ea for ea, _ in internal.netnode.alt.fiter(tagging.node()))
 
     @classmethod
@@ -992,3 +1611,353 @@ class globals(tagging):
         internal.netnode.alt.set(node, address, count)
         return res
 
+
+class colors(tagging):
+    """
+    This namespace is used to keep track of the addresses that have a
+    color so that the reference count for the implicit ``__color__`` tag
+    can be updated when the color of an address is changed. As the
+    disassembler doesn't tell us what the previous color of an address
+    was, each address with a color is stored as an altval of the
+    `tagging.node()` netnode within the tag ``colors.atag``.
+
+    The colors can only be tracked if the disassembler notifies us when
+    the color of an address has changed. This can be checked with
+    ``colors.tracked()``.
+    """
+
+    ## for each address with a color
+    # netnode.alt[address, atag] = 1
+
+    atag = 'C'
+
+    @classmethod
+    def tracked(cls):
+        '''Return whether the disassembler notifies us when the color of an address has been changed.'''
+        return hasattr(idaapi.IDB_Hooks, 'item_color_changed')
+
+    @classmethod
+    def has(cls, address):
+        '''Return whether the `address` is known to have a color.'''
+        return bool(internal.netnode.alt.get(tagging.node(), address, tag=cls.atag))
+
+    @classmethod
+    def set(cls, address, colored):
+        '''Record whether the `address` has a color according to the bool `colored` and return whether it was known to have one before.'''
+        node, res = tagging.node(), cls.has(address)
+        if colored and not res:
+            internal.netnode.alt.set(node, address, 1, tag=cls.atag)
+        elif res and not colored:
+            internal.netnode.alt.remove(node, address, tag=cls.atag)
+        return res
+
+    @classmethod
+    def address(cls, *range):
+        """Return all the addresses (``sorted``) that are known to have a color.
+
+        If `range` is specified as a `start` and `stop` address, then only return the addresses within it.
+        """
+        start, stop = range if range else (0, idaapi.BADADDR)
+        return [ea for ea, _ in internal.netnode.alt.fbetween(tagging.node(), start, stop, tag=cls.atag)]
+
+    @classmethod
+    def relocate(cls, segments):
+        '''Translate each address with a color using the list of `(old, new, size)` tuples in `segments` after the database has been rebased.'''
+        def translate(ea):
+            res = next(((old, new) for old, new, size in segments if old <= ea < old + size), None)
+            return ea if res is None else ea - res[0] + res[1]
+
+        # remove all of them before adding them back so that none are lost if they overlap
+        res = [ea for ea in cls.address() if translate(ea) != ea]
+        [ cls.set(ea, False) for ea in res ]
+        [ cls.set(translate(ea), True) for ea in res ]
+        return len(res)
+
+class index(tagging):
+    """
+    This namespace is used to maintain an inverted index of the tags
+    within the database. The inverted index maps each tag name to the
+    sorted list of addresses that it is located at so that a query for
+    a tag can be resolved without having to decode every single comment.
+
+    The index is stored within its own netnode as defined by
+    ``index.__node__``. Each tag name is assigned an identifier that is
+    stored in the netnode's hashval keyed by the tag name. This
+    identifier is used to locate the blob containing the dictionary of
+    the addresses for the tag name. This dictionary is keyed by the scope
+    of the addresses, ``None`` for the global tags or the address of a
+    function for its contents, and each of its values is the sorted list
+    of addresses. The blob uses the same binary format as the contents
+    with each list being delta-encoded. The original format which
+    marshalled the dictionary and compressed it with ``bz2`` is still
+    readable.
+
+    If the netnode for the index does not exist, then the index is
+    considered to be unavailable and any queries will need to fall
+    back to decoding each tag. The index is created when a database
+    is created or when it is explicitly rebuilt by the user.
+
+    The implicit tags in ``index.__untracked__`` are not updated by any
+    of the hooks, so the index can be missing some of their addresses.
+    Any query for one of them will also need to fall back to decoding
+    each tag. This is only the case for ``__color__`` when the colors
+    are not being tracked by the ``colors`` namespace.
+    """
+
+    ## for each tag name
+    # netnode.hash[name] = identifier
+    # netnode.blob[identifier * STRIDE, btag] = pack({scope : [address, ...]})
+
+    __node__ = '$ tagindex'
+    btag, STRIDE = 'I', 0x10000
+
+    ## write-back cache for the addresses of each tag name
+    # __cache__[name] = {scope : [address, ...]}
+    # __dirty__ = {name, ...}
+
+    __cache__, __dirty__ = {}, set()
+
+    ## implicit tags whose addresses are not updated by the hooks
+    __untracked__ = set() if colors.tracked() else {'__color__'}
+
+    @classmethod
+    def node(cls):
+        '''Return the netnode for the index or ``None`` if the index does not exist.'''
+        if hasattr(cls, '__indexid__'):
+            return cls.__indexid__
+        node = internal.netnode.get(cls.__node__)
+        if node == idaapi.BADADDR:
+            return None
+        cls.__indexid__ = node
+        return node
+
+    @classmethod
+    def available(cls):
+        '''Return whether the index exists within the database and can be used to resolve queries.'''
+        return cls.node() is not None
+
+    @classmethod
+    def reset(cls):
+        '''Erase the index from the database and create an empty one in its place.'''
+        node = cls.node()
+        if node is not None:
+            internal.netnode.remove(node)
+        cls.invalidate()
+        cls.__indexid__ = res = internal.netnode.new(cls.__node__)
+        return res
+
+    @classmethod
+    def _identifier(cls, name, create=False):
+        '''Return the identifier for the tag `name`, allocating a new one if `create` is true.'''
+        node, eName = cls.node(), internal.utils.string.to(name)
+        res = internal.netnode.hash.get(node, eName, type=int)
+        if res or not create:
+            return res
+        res = (internal.netnode.value.get(node, type=int) or 0) + 1
+        internal.netnode.value.set(node, res)
+        internal.netnode.hash.set(node, eName, res)
+        return res
+
+    @classmethod
+    def _load(cls, name):
+        '''Load the dictionary of sorted addresses for the tag `name` directly out of the netnode.'''
+        identifier = cls._identifier(name)
+        if not identifier:
+            return {}
+
+        encdata = internal.netnode.blob.get(cls.node(), cls.btag, identifier * cls.STRIDE)
+        if encdata is None:
+            return {}
+
+        # if it's in the binary format, then we can decode it directly
+        if contents._binaryQ(encdata):
+            try:
+                return cls.unpack(encdata)
+            except (IndexError, zlib.error, internal.exceptions.SizeMismatchError):
+                raise internal.exceptions.SerializationError(u"{:s}._load({!r}) : Unable to decode the index for the tag with the identifier {:d}.".format('.'.join(('internal', __name__, cls.__name__)), name, identifier))
+
+        try:
+            data, _ = cls.codec.decode(encdata)
+            res = cls.marshaller.loads(data)
+        except:
+            raise internal.exceptions.SerializationError(u"{:s}._load({!r}) : Unable to decode the index for the tag with the identifier {:d}.".format('.'.join(('internal', __name__, cls.__name__)), name, identifier))
+        return { scope : cls._accumulate(deltas) for scope, deltas in six.iteritems(res) }
+
+    @classmethod
+    def _store(cls, name, state):
+        '''Store the dictionary of sorted addresses in `state` for the tag `name` directly into the netnode.'''
+        identifier = cls._identifier(name, create=bool(state))
+        if not identifier:
+            return True
+
+        start = identifier * cls.STRIDE
+        if not state:
+            return internal.netnode.blob.remove(cls.node(), cls.btag, start)
+
+        encdata = cls.pack(state)
+        return internal.netnode.blob.set(cls.node(), cls.btag, encdata, start)
+
+    @classmethod
+    def pack(cls, state):
+        '''Encode the dictionary of sorted addresses in `state` into the binary format.'''
+        result = bytearray()
+        binary.unsigned(len(state), result)
+        for scope, items in six.iteritems(state):
+            binary.unsigned(0 if scope is None else 1 + scope, result)
+            binary.unsigned(len(items), result)
+            binary.integers((ea - previous for previous, ea in zip([0] + items[:-1], items)), result)
+        return contents._compress(result)
+
+    @classmethod
+    def unpack(cls, data):
+        '''Decode the dictionary of sorted addresses out of the binary format in `data`.'''
+        data, res = contents._decompress(data), {}
+        count, offset = binary.read_unsigned(data, 0)
+        for _ in six.moves.range(count):
+            scope, offset = binary.read_unsigned(data, offset)
+            length, offset = binary.read_unsigned(data, offset)
+            deltas, offset = binary.read_integers(data, offset, length)
+            res[None if scope == 0 else scope - 1] = cls._accumulate(deltas)
+
+        if offset != len(data):
+            raise internal.exceptions.SizeMismatchError(u"{:s}.unpack(...) : The number of bytes that was decoded ({:#x}) did not match the expected size ({:#x}).".format('.'.join(('internal', __name__, cls.__name__)), offset, len(data)))
+        return res
+
+    @staticmethod
+    def _accumulate(deltas):
+        '''Return the list of addresses that were delta-encoded in `deltas`.'''
+        res, ea = [], 0
+        for item in deltas:
+            ea += item
+            res.append(ea)
+        return res
+
+    @classmethod
+    def _fetch(cls, name):
+        '''Return the cached dictionary of sorted addresses for the tag `name` loading it from the netnode if it has not been cached.'''
+        cache, name = cls.__cache__, internal.utils.string.of(name)
+        if name not in cache:
+            cache[name] = cls._load(name)
+        return cache[name]
+
+    @classmethod
+    def flush(cls):
+        '''Write each tag name that has been modified within the cache into the netnode and return the number of tag names that were written.'''
+        if not cls.available():
+            cls.invalidate()
+            return 0
+        cache, dirty = cls.__cache__, sorted(cls.__dirty__)
+        for name in dirty:
+            cls._store(name, cache.get(name, {}))
+            cls.__dirty__.discard(name)
+        return len(dirty)
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the entire cache without writing any of the modified tag names into the netnode.'''
+        count = len(cls.__dirty__)
+        cls.__cache__.clear(), cls.__dirty__.clear()
+        return count
+
+    @classmethod
+    def forget(cls):
+        '''Forget the netnode for the index so that it will be looked up again for the next database.'''
+        if hasattr(cls, '__indexid__'):
+            del cls.__indexid__
+        return cls.invalidate()
+
+    @classmethod
+    def add(cls, scope, name, address):
+        '''Add the `address` to the index for the tag `name` within the specified `scope`.'''
+        if not cls.available():
+            return False
+        name = internal.utils.string.of(name)
+        state = cls._fetch(name)
+        bisect.insort(state.setdefault(scope, []), address)
+        cls.__dirty__.add(name)
+        return True
+
+    @classmethod
+    def remove(cls, scope, name, address):
+        '''Remove the `address` from the index for the tag `name` within the specified `scope`.'''
+        if not cls.available():
+            return False
+        name = internal.utils.string.of(name)
+        state = cls._fetch(name)
+        items = state.get(scope, [])
+        idx = bisect.bisect_left(items, address)
+        if idx >= len(items) or items[idx] != address:
+            return False
+        del items[idx]
+        if not items:
+            del state[scope]
+        cls.__dirty__.add(name)
+        return True
+
+    @classmethod
+    def addresses(cls, scope, name):
+        '''Return the sorted list of the addresses for the tag `name` within the specified `scope`.'''
+        state = cls._fetch(name)
+        return state.get(scope, [])
+
+    @classmethod
+    def relocate(cls, segments):
+        '''Translate each address within the index using the list of `(old, new, size)` tuples in `segments` after the database has been rebased.'''
+        if not cls.available():
+            return 0
+
+        def translate(ea):
+            res = next(((old, new) for old, new, size in segments if old <= ea < old + size), None)
+            return ea if res is None else ea - res[0] + res[1]
+
+        names = [ internal.utils.string.of(name) for name in internal.netnode.hash.fiter(cls.node()) ]
+        for name in names:
+            state = cls._fetch(name)
+            res = { None if scope is None else translate(scope) : sorted(map(translate, items)) for scope, items in six.iteritems(state) }
+            state.clear(), state.update(res)
+            cls.__dirty__.add(name)
+        return len(names)
+
+    @classmethod
+    def select(cls, scope, And=(), Or=()):
+        """Return the sorted list of addresses within `scope` that could match the query specified by `And` and `Or`.
+
+        If `And` is not empty, then the result contains the addresses that
+        have every one of the tag names in `And`. Otherwise the result contains
+        the addresses that have any of the tag names in `Or`. If the index is
+        not available or any of the tag names are not tracked by the index,
+        then ``None`` is returned.
+        """
+        if not cls.available():
+            return None
+
+        # if the index can't be trusted for one of the names, then it needs to be walked
+        if cls.__untracked__ & {internal.utils.string.of(name) for name in itertools.chain(And, Or)}:
+            return None
+
+        # intersect the addresses for each tag name starting with the smallest
+        if And:
+            arrays = sorted((cls.addresses(scope, name) for name in And), key=len)
+            smallest, rest = arrays[0], arrays[1:]
+            res = []
+            for ea in smallest:
+                if res and res[-1] == ea:
+                    continue
+                if all(cls._contains(items, ea) for items in rest):
+                    res.append(ea)
+                continue
+            return res
+
+        # union the addresses for each tag name
+        res = []
+        for ea in heapq.merge(*(cls.addresses(scope, name) for name in Or)):
+            if not res or res[-1] != ea:
+                res.append(ea)
+            continue
+        return res
+
+    @staticmethod
+    def _contains(items, ea):
+        '''Return whether the sorted list in `items` contains the address `ea`.'''
+        idx = bisect.bisect_left(items, ea)
+        return idx < len(items) and items[idx] == ea
@@ -12,6 +12,7 @@ import sys, logging
 import functools, operator, itertools, types
 import collections, heapq, traceback, ctypes
 import unicodedata as _unicodedata, string as _string
+import array as _array
 
 import ui, internal
 import idaapi
@@ -841,6 +842,10 @@ class register_t(symbol_t):
     def position(self):
         '''Returns the binary offset into the full register which owns it.'''
         return self.__position__
+    @property
+    def mask(self):
+        '''Returns the bitmask that uniquely identifies the register within its architecture.'''
+        return 1 << self.__ordinal__
 
     def __str__(self):
         '''Return the architecture's register prefix concatenated to the register's name.'''
@@ -889,8 +894,63 @@ class register_t(symbol_t):
 
     def relatedQ(self, other):
         '''Returns true if both `other` and `self` affect each other when one is modified.'''
+        if isinstance(other, register_t) and other.architecture is self.architecture:
+            return self.architecture.overlap(self) & other.mask != 0
         return self.supersetQ(other) or self.subsetQ(other)
 
+    def __or__(self, other):
+        '''Return a ``regmask_t`` containing both `self` and the `other` register.'''
+        return regmask_t(self.architecture, self.mask) | other
+    __ror__ = __or__
+
+class regmask_t(object):
+    """
+    An object representing a set of registers belonging to an architecture
+    as a bitmask. This can be used in place of a register when matching
+    the registers that are used by an instruction so that each operand
+    can be tested against all of the registers with a single operation.
+    """
+    __slots__ = ('architecture', 'mask')
+
+    def __init__(self, architecture, mask=0):
+        '''Construct a set of the registers from the `architecture` that are set within the bitmask `mask`.'''
+        self.architecture, self.mask = architecture, mask
+
+    def __iter__(self):
+        '''Yield each register that is a member of the set.'''
+        for register in self.architecture.registers(self.mask):
+            yield register
+        return
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __contains__(self, register):
+        '''Returns True if the `register` is a member of the set.'''
+        return isinstance(register, register_t) and register.architecture is self.architecture and self.mask & register.mask != 0
+
+    def __or__(self, other):
+        '''Return a ``regmask_t`` containing the registers from `self` and the `other` register or set.'''
+        if isinstance(other, (register_t, regmask_t)) and other.architecture is self.architecture:
+            return regmask_t(self.architecture, self.mask | other.mask)
+        elif isinstance(other, basestring):
+            return self | self.architecture.by_name(other)
+        cls = self.__class__
+        raise internal.exceptions.InvalidTypeOrValueError(u"{:s}.__or__({!r}) : Unable to combine a register set with an object from a different architecture or of an unsupported type ({!r}).".format('.'.join(('internal', __name__, cls.__name__)), other, other.__class__))
+    __ror__ = __or__
+
+    def __eq__(self, other):
+        return isinstance(other, regmask_t) and (self.architecture, self.mask) == (other.architecture, other.mask)
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __str__(self):
+        return '|'.join(map("{!s}".format, self))
+
+    def __repr__(self):
+        cls = self.__class__
+        return "<class '{:s}' mask={:#x} registers={{{:s}}}>".format(cls.__name__, self.mask, ', '.join(register.name for register in self))
+
 class regmatch(object):
     """
     This namespace is used to assist with doing register matching
@@ -914,11 +974,20 @@ class regmatch(object):
         '''Return a closure that checks if an address and opnum uses the specified `regs`.'''
         _instruction = sys.modules.get('instruction', __import__('instruction'))
 
-        # convert any regs that are strings into their correct object type
+        # convert any regs that are strings into their correct object type and expand any sets
         regs = { _instruction.architecture.by_name(r) if isinstance(r, basestring) else r for r in regs }
+        regs = { r for item in regs for r in (item if isinstance(item, regmask_t) else [item]) }
+
+        # if all of the registers belong to the current architecture, then we
+        # can match each register against all of them with a single bitmask.
+        architecture = _instruction.architecture
+        if all(r.architecture is architecture for r in regs):
+            mask, overlap = functools.reduce(operator.or_, (r.mask for r in regs), 0), architecture.overlap
+            match = lambda r, mask=mask: r.architecture is architecture and overlap(r) & mask != 0
 
         # returns an iterable of bools that returns whether r is a subset of any of the registers in `regs`.
-        match = lambda r, regs=regs: any(itertools.imap(r.relatedQ, regs))
+        else:
+            match = lambda r, regs=regs: any(itertools.imap(r.relatedQ, regs))
 
         # returns true if the operand at the specified address is related to one of the registers in `regs`.
         def uses_register(ea, opnum):
@@ -1285,7 +1354,7 @@ class architecture_t(object):
     Similarly on the 64-bit version of the processor module, all of the
     registers `%ax`, `%eax`, and `%rax` have the same index.
     """
-    __slots__ = ('__register__', '__cache__',)
+    __slots__ = ('__register__', '__cache__', '__order__', '__overlap__')
     r = register = property(fget=lambda s: s.__register__)
 
     def __init__(self, **cache):
@@ -1296,6 +1365,7 @@ class architecture_t(object):
         more commonly recognized register name.
         """
         self.__register__, self.__cache__ = map_t(), cache.get('cache', {})
+        self.__order__, self.__overlap__ = [], None
 
     def new(self, name, bits, idaname=None, **kwargs):
         '''Add a register to the architecture's cache.'''
@@ -1311,13 +1381,15 @@ class architecture_t(object):
         dtype = six.next((kwargs[n] for n in ('dtyp', 'dtype', 'type') if n in kwargs), idaapi.dt_bitfield if bits == 1 else dtype_by_size(bits // 8))
 
         namespace = dict(register_t.__dict__)
-        namespace.update({'__name__':name, '__parent__':None, '__children__':{}, '__dtype__':dtype, '__position__':0, '__size__':bits})
+        namespace.update({'__name__':name, '__parent__':None, '__children__':{}, '__dtype__':dtype, '__position__':0, '__size__':bits, '__ordinal__':len(self.__order__)})
         namespace['realname'] = idaname
         namespace['alias'] = kwargs.get('alias', set())
         namespace['architecture'] = self
         res = type(name, (register_t,), namespace)()
         self.__register__.__state__[name] = res
         self.__cache__[idaname or name, dtype] = name
+        self.__order__.append(res)
+        self.__overlap__ = None
         return res
 
     def child(self, parent, name, position, bits, idaname=None, **kwargs):
@@ -1333,7 +1405,7 @@ class architecture_t(object):
         dtype = six.next((kwargs[n] for n in ('dtyp', 'dtype', 'type') if n in kwargs), idaapi.dt_bitfield if bits == 1 else dtype_by_size(bits // 8))
         #dtyp = kwargs.get('dtyp', idaapi.dt_bitfild if bits == 1 else dtype_by_size(bits//8))
         namespace = dict(register_t.__dict__)
-        namespace.update({'__name__':name, '__parent__':parent, '__children__':{}, '__dtype__':dtype, '__position__':position, '__size__':bits})
+        namespace.update({'__name__':name, '__parent__':parent, '__children__':{}, '__dtype__':dtype, '__position__':position, '__size__':bits, '__ordinal__':len(self.__order__)})
         namespace['realname'] = idaname
         namespace['alias'] = kwargs.get('alias', set())
         namespace['architecture'] = self
@@ -1341,8 +1413,49 @@ class architecture_t(object):
         self.__register__.__state__[name] = res
         self.__cache__[idaname or name, dtype] = name
         parent.__children__[position] = res
+        self.__order__.append(res)
+        self.__overlap__ = None
+        return res
+
+    def __matrix__(self):
+        '''Build the matrix of the registers that overlap each register as a list of bitmasks indexed by their ordinal.'''
+        res = []
+        for register in self.__order__:
+            related, pos = set(), register
+            while pos is not None:
+                related.add(pos)
+                pos = pos.__parent__
+
+            # collect all of the children of the register
+            stack = [register]
+            while stack:
+                item = stack.pop()
+                related.add(item)
+                stack.extend(six.itervalues(item.__children__))
+
+            related.update(item for item in register.alias if isinstance(item, register_t))
+            res.append(functools.reduce(operator.or_, (item.mask for item in related), 0))
+        self.__overlap__ = res
         return res
 
+    def overlap(self, register):
+        '''Return the bitmask of each register that is affected when the specified `register` is modified.'''
+        res = self.__overlap__ or self.__matrix__()
+        return res[register.__ordinal__]
+
+    def mask(self, *registers):
+        '''Return a ``regmask_t`` containing each of the specified `registers`.'''
+        res = (self.by_name(r) if isinstance(r, basestring) else r for r in registers)
+        return functools.reduce(operator.or_, res, regmask_t(self))
+
+    def registers(self, mask):
+        '''Yield each register that is set within the bitmask specified by `mask`.'''
+        for register in self.__order__:
+            if mask & register.mask:
+                yield register
+            continue
+        return
+
     def by_index(self, index):
         """Lookup a register according to its `index`.
 
@@ -1403,3 +1516,105 @@ class bounds_t(namedtypedtuple):
     _fields = ('left', 'right')
     _types = (six.integer_types, six.integer_types)
 
+class flags_t(object):
+    """
+    An object containing the flags for every address within a range of
+    the database that were read at the same time. This allows one to
+    classify each address of a range without having to fetch the flags
+    for each address individually.
+
+    The flags for an address can be selected with the following keywords
+    which can be combined and are each tested as a single mask:
+
+        `code` - Select the addresses that are instructions
+        `data` - Select the addresses that are data
+        `unknown` - Select the addresses that are undefined
+        `tail` - Select the addresses that are not the head of an item
+        `head` - Select the addresses that are the head of an item
+        `comment` - Select the addresses that are commented
+        `reference` - Select the addresses that have a reference
+        `customname` - Select the addresses that have a custom-name
+        `dummyname` - Select the addresses that have a dummy-name
+        `initialized` - Select the addresses that are initialized
+
+    If the value of a keyword is false, then its inverse is selected.
+    """
+    __slots__ = ('start', 'flags')
+
+    def __init__(self, start, flags):
+        '''Construct a snapshot for the range starting at the address `start` from the array containing its `flags`.'''
+        self.start, self.flags = start, flags
+
+    @property
+    def end(self):
+        '''Return the address following the last address within the snapshot.'''
+        return self.start + len(self.flags)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, ea):
+        '''Return the flags for the address `ea`.'''
+        if not (self.start <= ea < self.end):
+            cls = self.__class__
+            raise internal.exceptions.OutOfBoundsError(u"{:s}.__getitem__({:#x}) : The specified address is not within the snapshot ({:#x}<>{:#x}).".format('.'.join(('internal', __name__, cls.__name__)), ea, self.start, self.end))
+        return self.flags[ea - self.start]
+
+    def __repr__(self):
+        cls = self.__class__
+        return "<class '{:s}' range={:#x}<>{:#x}>".format(cls.__name__, self.start, self.end)
+
+    @classmethod
+    def __selection__(cls, **type):
+        '''Return the mask and the set of masked values for the flags that are selected by the keywords in `type`.'''
+        classes = {
+            'code' : {idaapi.FF_CODE}, 'data' : {idaapi.FF_DATA},
+            'unknown' : {idaapi.FF_UNK}, 'tail' : {idaapi.FF_TAIL},
+            'head' : {idaapi.FF_CODE, idaapi.FF_DATA},
+        }
+        bits = {
+            'comment' : idaapi.FF_COMM, 'reference' : idaapi.FF_REF,
+            'customname' : idaapi.FF_NAME, 'dummyname' : idaapi.FF_LABL,
+            'initialized' : idaapi.FF_IVL,
+        }
+
+        unknown = { key for key in type if key not in classes and key not in bits }
+        if unknown:
+            raise internal.exceptions.InvalidParameterError(u"{:s}.__selection__({:s}) : Unable to select the flags for the unknown keyword{:s} ({:s}).".format('.'.join(('internal', __name__, cls.__name__)), internal.utils.string.kwargs(type), '' if len(unknown) == 1 else 's', ', '.join(sorted(unknown))))
+
+        # figure out which item classes were chosen, and then combine them with the bits
+        values = {idaapi.FF_CODE, idaapi.FF_DATA, idaapi.FF_UNK, idaapi.FF_TAIL}
+        if any(type[key] for key in classes if key in type):
+            values = set().union(*(classes[key] for key in classes if type.get(key, False)))
+        values.difference_update(*(classes[key] for key in classes if key in type and not type[key]))
+        mask = idaapi.MS_CLS if any(key in type for key in classes) else 0
+
+        mask |= functools.reduce(operator.or_, (bits[key] for key in bits if key in type), 0)
+        value = functools.reduce(operator.or_, (bits[key] for key in bits if type.get(key, False)), 0)
+        return mask, { item | value for item in values } if mask & idaapi.MS_CLS else {value}
+
+    def iterate(self, **type):
+        '''Yield each address within the snapshot with the flags selected by the keywords in `type`.'''
+        mask, values = self.__selection__(**type)
+        start = self.start
+        for index, flags in enumerate(self.flags):
+            if flags & mask in values:
+                yield start + index
+            continue
+        return
+
+    def select(self, **type):
+        '''Return a list of the addresses within the snapshot with the flags selected by the keywords in `type`.'''
+        mask, values = self.__selection__(**type)
+        start = self.start
+        return [ start + index for index, flags in enumerate(self.flags) if flags & mask in values ]
+
+    def mask(self, **type):
+        '''Return an ``array.array`` containing 1 for each address within the snapshot with the flags selected by the keywords in `type`, and 0 otherwise.'''
+        mask, values = self.__selection__(**type)
+        return _array.array('B', (1 if flags & mask in values else 0 for flags in self.flags))
+
+    def count(self, **type):
+        '''Return the number of addresses within the snapshot with the flags selected by the keywords in `type`.'''
+        mask, values = self.__selection__(**type)
+        return sum(1 for flags in self.flags if flags & mask in values)
@@ -349,19 +349,19 @@ def fiter():
 class alt(object):
     '''Sparse array[int] of int'''
     @classmethod
-    def get(cls, nodeidx, idx):
-        node = netnode.new(nodeidx)
-        return netnode.altval(node, idx)
+    def get(cls, nodeidx, idx, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        return netnode.altval(node, idx, *args)
 
     @classmethod
-    def set(cls, nodeidx, idx, value):
-        node = netnode.new(nodeidx)
-        return netnode.altset(node, idx, value)
+    def set(cls, nodeidx, idx, value, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        return netnode.altset(node, idx, value, *args)
 
     @classmethod
-    def remove(cls, nodeidx, idx):
-        node = netnode.new(nodeidx)
-        return netnode.altdel(node, idx)
+    def remove(cls, nodeidx, idx, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        return netnode.altdel(node, idx, *args)
 
     @classmethod
     def fiter(cls, nodeidx):
@@ -377,6 +377,15 @@ class alt(object):
             yield idx, value
         return
 
+    @classmethod
+    def fbetween(cls, nodeidx, start, stop, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        idx = netnode.altnext(node, start - 1, *args) if start > 0 else netnode.altfirst(node, *args)
+        while idx not in {None, idaapi.BADADDR} and idx < stop:
+            yield idx, netnode.altval(node, idx, *args)
+            idx = netnode.altnext(node, idx, *args)
+        return
+
     @classmethod
     def repr(cls, nodeidx):
         res = []
@@ -393,23 +402,23 @@ class sup(object):
     MAX_SIZE = 0x400
 
     @classmethod
-    def get(cls, nodeidx, idx, type=None):
-        node = netnode.new(nodeidx)
+    def get(cls, nodeidx, idx, type=None, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
         if type is None:
-            return netnode.supval(node, idx)
+            return netnode.supval(node, idx, *args)
         elif issubclass(type, basestring):
-            return netnode.supstr(node, idx)
+            return netnode.supstr(node, idx, *args)
         raise internal.exceptions.InvalidTypeOrValueError(u"{:s}.get({:#x}, {:#x}, type={!r}) : An unsupported type ({!r}) was requested for the netnode's supval.".format('.'.join(('internal', __name__, cls.__name__)), nodeidx, idx, type, type))
 
     @classmethod
-    def set(cls, nodeidx, idx, value):
-        node = netnode.new(nodeidx)
-        return netnode.supset(node, idx, value)
+    def set(cls, nodeidx, idx, value, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        return netnode.supset(node, idx, value, *args)
 
     @classmethod
-    def remove(cls, nodeidx, idx):
-        node = netnode.new(nodeidx)
-        return netnode.supdel(node, idx)
+    def remove(cls, nodeidx, idx, tag=None):
+        node, args = netnode.new(nodeidx), () if tag is None else (tag,)
+        return netnode.supdel(node, idx, *args)
 
     @classmethod
     def fiter(cls, nodeidx):
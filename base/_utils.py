@@ -3,8 +3,9 @@ Utilities module (internal)
 
 This module contains a number of tools that help with the interface for this
 plugin. This contains things such as the multicase decorator, the matcher
-class for querying and filtering lists of things, support for aliasing
-functions, and a number of functional programming primitives (combinators).
+class for querying and filtering lists of things, an index for querying
+names, support for aliasing functions, and a number of functional
+programming primitives (combinators).
 """
 
 import six
@@ -13,6 +14,7 @@ from six.moves import builtins
 import logging, types, weakref
 import functools, operator, itertools
 import sys, heapq, collections
+import os, re, bisect, fnmatch
 
 import internal
 import idaapi
@@ -142,6 +144,7 @@ class multicase(object):
     CO_FUTURE_GENERATOR_STOP    = 0x80000
 
     cache_name = '__multicase_cache__'
+    dispatch_name = '__multicase_dispatch__'
 
     def __new__(cls, *other, **t_args):
         '''Decorate a case of a function with the specified types.'''
@@ -183,6 +186,7 @@ class multicase(object):
                 if current == (tuple(t.get(_, None) for _ in a[1]), a[3]):
                     # yuuup, update it.
                     cache[i] = (priority, (func, t_args, argtuple))
+                    getattr(res, cls.dispatch_name).invalidate()
                     res.__doc__ = cls.document(func.__name__, [n for _, n in cache])
                     return cons(res)
                 continue
@@ -190,6 +194,9 @@ class multicase(object):
             # everything is ok...so should be safe to add it
             heapq.heappush(cache, (priority, (func, t_args, argtuple)))
 
+            # since the cases have changed, our decision table is now stale
+            getattr(res, cls.dispatch_name).invalidate()
+
             # now we can update the docs
             res.__doc__ = cls.document(func.__name__, [n for _, n in cache])
 
@@ -241,8 +248,12 @@ class multicase(object):
 
     @classmethod
     def match(cls, (args, kwds), heap):
-        '''Given the specified `args` and `kwds`, find the correct function according to its types.'''
-        # FIXME: yep, done in O(n) time.
+        """Given the specified `args` and `kwds`, find the correct function according to its types.
+
+        This walks through every case in `heap` and is thus done in O(n) time. The
+        wrapper for a multicased function uses ``multicase.dispatch`` instead which
+        only uses this to raise an exception when no case is able to be matched.
+        """
         for f, ts, (sa, af, defaults, (argname, kwdname)) in heap:
             # populate our arguments
             ac, kc = (n for n in args), dict(kwds)
@@ -255,7 +266,7 @@ class multicase(object):
             try:
                 for n in af[sa:]:
                     try: a.append(next(ac))
-                    except StopIteration: a.append(kc.pop(n) if n in kc else defaults.pop(n))
+                    except StopIteration: a.append(kc.pop(n) if n in kc else defaults[n])
             except KeyError: pass
             finally: a = tuple(a)
 
@@ -282,15 +293,110 @@ class multicase(object):
         error_keywords = ["{:s}={!s}".format(n, kwds[n].__class__.__name__) for n in kwds]
         raise internal.exceptions.UnknownPrototypeError(u"@multicase.call({:s}{:s}): The requested argument types do not match any of the available prototypes. The prototypes that are available are: {:s}.".format(', '.join(error_arguments) if args else '*()', ", {:s}".format(', '.join(error_keywords)) if error_keywords else '', ', '.join(cls.prototype(f, t) for f, t, _ in heap)))
 
+    class dispatch(object):
+        """
+        A decision table for the cases belonging to a multicased function.
+
+        The cases are compiled into a table keyed by the number of positional
+        arguments and the names of the keyword arguments. Each entry of this
+        table contains the candidates in order of their priority along with the
+        type checks that are needed to select one of them. Once a case has been
+        selected for a particular signature of argument types, it is then cached
+        so that any later call using the same types is a single lookup.
+        """
+
+        # the maximum number of argument signatures to cache before starting over
+        MAXIMUM = 0x400
+
+        def __init__(self, cache):
+            self.cache = cache
+            self.table, self.resolved = {}, {}
+
+        def invalidate(self):
+            '''Discard the decision table and any signatures that have been resolved.'''
+            self.table.clear()
+            self.resolved.clear()
+
+        @staticmethod
+        def predicate(t):
+            '''Return a closure that will check a value against the type `t`.'''
+            return builtins.callable if t == callable else (lambda value, t=t: isinstance(value, t))
+
+        def compile(self, count, names):
+            '''Compile the cases that can be called with `count` positional arguments and the keyword arguments in `names`.'''
+            candidates = []
+            for _, (f, ts, (sa, af, defaults, (argname, kwdname))) in heapq.nsmallest(len(self.cache), self.cache):
+                parameters = af[sa:]
+                if count < sa:
+                    continue
+
+                # positional arguments fill the parameters in order, and anything left over goes into the wildcard
+                positional, remaining = count - sa, parameters[count - sa:]
+                if not argname and positional > len(parameters):
+                    continue
+
+                # any parameter that wasn't passed positionally needs to be either a keyword or have a default
+                if any(n not in names and n not in defaults for n in remaining):
+                    continue
+
+                # the keywords that don't belong to a parameter go into the keyword wildcard
+                if not kwdname and any(n not in remaining for n in names):
+                    continue
+
+                # now we can figure out where each value comes from so that its type can be checked
+                checks, ok = [], True
+                for i, n in enumerate(parameters):
+                    if n not in ts:
+                        continue
+                    F = self.predicate(ts[n])
+                    if i < positional:
+                        checks.append((sa + i, F))
+                    elif n in names:
+                        checks.append((n, F))
+
+                    # if the value is a default, then it's constant and we can check it right now
+                    elif not F(defaults[n]):
+                        ok = False
+                    continue
+                if ok: candidates.append((f, tuple(checks)))
+            return tuple(candidates)
+
+        def __call__(self, arguments, keywords):
+            '''Return the case that should be called with the specified `arguments` and `keywords`.'''
+            signature = tuple(item.__class__ for item in arguments), tuple((name, keywords[name].__class__) for name in sorted(keywords)) if keywords else ()
+            if signature in self.resolved:
+                return self.resolved[signature]
+
+            # figure out the candidates that can take this number of parameters
+            key = len(arguments), frozenset(keywords)
+            if key not in self.table:
+                self.table[key] = self.compile(*key)
+
+            # now we just need to check the types of the candidates
+            for f, checks in self.table[key]:
+                if all(F(arguments[index] if isinstance(index, six.integer_types) else keywords[index]) for index, F in checks):
+                    break
+                continue
+
+            # if nothing matched, then fall back to the original matcher so that it can raise an exception
+            else:
+                heap = [res for _, res in heapq.nsmallest(len(self.cache), self.cache)]
+                f, _ = multicase.match((arguments[:], keywords), heap)
+
+            if len(self.resolved) >= self.MAXIMUM:
+                self.resolved.clear()
+            self.resolved[signature] = f
+            return f
+
     @classmethod
     def new_wrapper(cls, func, cache):
         '''Create a new wrapper that will determine the correct function to call.'''
+        dispatch = cls.dispatch(cache)
+
         # define the wrapper...
         def F(*arguments, **keywords):
-            heap = [res for _, res in heapq.nsmallest(len(cache), cache)]
-            f, (a, w, k) = cls.match((arguments[:], keywords), heap)
+            f = dispatch(arguments, keywords)
             return f(*arguments, **keywords)
-            #return f(*(arguments + tuple(w)), **keywords)
 
         # swap out the original code object with our wrapper's
         f, c = F, F.func_code
@@ -302,8 +408,9 @@ class multicase(object):
         res = types.FunctionType(newcode, f.func_globals, f.func_name, f.func_defaults, f.func_closure)
         res.func_name, res.func_doc = func.func_name, func.func_doc
 
-        # assign the specified cache to it
+        # assign the specified cache and its decision table to it
         setattr(res, cls.cache_name, cache)
+        setattr(res, cls.dispatch_name, dispatch)
         # ...and finally add a default docstring
         setattr(res, '__doc__', '')
         return res
@@ -409,6 +516,52 @@ class matcher(object):
         matcher = self.__predicate__[type](value)
         return itertools.ifilter(matcher, iterable)
 
+class nameindex(object):
+    """
+    An object that takes a snapshot of a list of names so that they can be
+    queried by their exact name, a glob, or a regular-expression without
+    having to fetch the name of every single item for each query.
+
+    The names are sorted in the same case as is used by ``fnmatch`` so
+    that any glob with a literal prefix only needs to check the names
+    that begin with it. Each query returns the items in their sorted order.
+    """
+    wildcards = '*?['
+
+    def __init__(self, iterable):
+        '''Build an index out of the `(name, item)` pairs from `iterable`.'''
+        rows = sorted((os.path.normcase(name), name, item) for name, item in iterable)
+        self.__keys__ = [ key for key, _, _ in rows ]
+        self.__rows__ = [ (name, item) for _, name, item in rows ]
+
+    def __len__(self):
+        return len(self.__rows__)
+
+    def __range__(self, prefix):
+        '''Iterate through the index of each name that begins with the normalized `prefix`.'''
+        keys = self.__keys__
+        index = bisect.bisect_left(keys, prefix)
+        while index < len(keys) and keys[index].startswith(prefix):
+            yield index
+            index += 1
+        return
+
+    def name(self, string):
+        '''Return a sorted list of the items with the exact name `string`.'''
+        rows = self.__rows__
+        return sorted(rows[index][1] for index in self.__range__(os.path.normcase(string)) if rows[index][0] == string)
+
+    def like(self, glob):
+        '''Return a sorted list of the items with a name that matches `glob`.'''
+        pattern, keys, rows = os.path.normcase(glob), self.__keys__, self.__rows__
+        prefix = next((pattern[:index] for index, ch in enumerate(pattern) if ch in self.wildcards), pattern)
+        return sorted(rows[index][1] for index in self.__range__(prefix) if fnmatch.fnmatchcase(keys[index], pattern))
+
+    def regex(self, pattern):
+        '''Return a sorted list of the items with a name that is matched by the regular-expression `pattern`.'''
+        search = re.compile(pattern).search
+        return sorted(item for name, item in self.__rows__ if search(name))
+
 ### character processing (escaping and unescaping)
 class character(object):
     """
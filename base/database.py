@@ -24,6 +24,8 @@ from six.moves import builtins
 import functools, operator, itertools, types
 import sys, os, logging
 import math, array as _array, fnmatch, re, ctypes
+import struct as _struct, binascii
+import collections, heapq
 
 import function, segment
 import structure as _structure, instruction as _instruction
@@ -254,6 +256,15 @@ class functions(object):
         > iterable = database.functions.iterate(regex='.*alloc')
         > result = database.functions.search(like='*alloc*')
 
+    When matching the functions by their name, an index of the names of
+    every function is used so that each query does not need to fetch them.
+    When listing the functions, the boundaries, number of chunks, number
+    of blocks, and number of exits for each function are cached by its
+    address so that listing them again does not require rebuilding the
+    flowchart for every function. The hooks will discard the cache for
+    a function as it is changed, but if necessary the entire cache can
+    be discarded with ``database.functions.invalidate``.
+
     """
     __matcher__ = utils.matcher()
     __matcher__.boolean('name', operator.eq, utils.fcompose(function.by, function.name))
@@ -306,11 +317,73 @@ class functions(object):
     @utils.string.decorate_arguments('name', 'like', 'regex')
     def iterate(cls, **type):
         '''Iterate through all of the functions in the database that match the keyword specified by `type`.'''
-        iterable = cls.__iterate__()
+        indexed = builtins.next((key for key in ('name', 'like', 'regex') if key in type), None)
+        iterable = cls.__iterate__() if indexed is None else iter(getattr(cls._names(), indexed)(type[indexed]))
         for key, value in six.iteritems(type or builtins.dict(predicate=utils.fconstant(True))):
+            if key == indexed: continue
             iterable = cls.__matcher__.match(key, value, iterable)
         for item in iterable: yield item
 
+    ## index of the names of every function
+    __names__ = None
+
+    @classmethod
+    def _names(cls):
+        '''Return the index of the names of every function in the database building it if necessary.'''
+        if cls.__names__ is None:
+            cls.__names__ = utils.nameindex((function.name(ea), ea) for ea in cls.__iterate__())
+        return cls.__names__
+
+    ## cache of the metrics for each function
+    MAXIMUM = 0x10000
+    __cache__ = collections.OrderedDict()
+
+    @utils.multicase()
+    @classmethod
+    def metrics(cls):
+        '''Return the metrics for the current function.'''
+        return cls.metrics(ui.current.function())
+    @utils.multicase()
+    @classmethod
+    def metrics(cls, func):
+        """Return the metrics for the function `func` as a tuple.
+
+        The tuple is of the format `(left, right, chunks, blocks, exits)`
+        where `left` and `right` are the boundaries of all of the chunks
+        for the function, and the rest are the number of each of them.
+        """
+        fn = function.by(func)
+        key, cache = interface.range.start(fn), cls.__cache__
+        if key in cache:
+            res = cache.pop(key)
+
+        # the flowchart is cached, so the blocks and the exits only need to build it once
+        else:
+            chunks = builtins.list(function.chunks(fn))
+            left, right = min(l for l, _ in chunks), max(r for _, r in chunks)
+            res = left, right, len(chunks), len(builtins.list(function.blocks(fn))), len(function.bottom(fn))
+        cache[key] = res
+
+        # evict the least recently used functions
+        while len(cache) > max(1, cls.MAXIMUM):
+            cache.popitem(last=False)
+        return res
+
+    @utils.multicase()
+    @classmethod
+    def invalidate(cls):
+        '''Discard the index of the names and the metrics for every function in the database.'''
+        count, cls.__names__ = len(cls.__cache__), None
+        cls.__cache__.clear()
+        return count
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def invalidate(cls, ea):
+        '''Discard the index of the names and the metrics for the function that starts at or contains the address `ea`.'''
+        fn, cls.__names__ = idaapi.get_func(ea), None
+        keys = {ea} if fn is None else {ea, interface.range.start(fn)}
+        return len([ cls.__cache__.pop(key) for key in keys if key in cls.__cache__ ])
+
     @utils.multicase(string=basestring)
     @classmethod
     @utils.string.decorate_arguments('string')
@@ -328,31 +401,28 @@ class functions(object):
         flvars = lambda f: _structure.fragment(f.frame, 0, f.frsize) if f.frsize else iter([])
         favars = lambda f: function.frame.args(f) if f.frsize else iter([])
 
-        # Set some reasonable defaults here
-        maxentry = config.bounds()[0]
-        maxaddr = minaddr = 0
-        maxname = chunks = marks = blocks = exits = 0
-        lvars = avars = 0
+        # Count the marks for each function by walking through the marks only once
+        counts = collections.Counter()
+        for ea, _ in marks():
+            try:
+                counts[function.chunks.owner(ea)] += 1
+            except E.FunctionNotFoundError:
+                pass
+            continue
 
-        # First pass through the list to grab the maximum lengths of the different fields
+        # Collect the metrics for every single function that was matched in a single pass
         for ea in cls.iterate(**type):
             func, _ = function.by(ea), ui.navigation.procedure(ea)
-            maxentry = max(ea, maxentry)
-            maxname = max(len(function.name(func)), maxname)
-
-            res = builtins.list(function.chunks(func))
-            maxaddr, minaddr = max(max(map(operator.itemgetter(-1), res)), maxaddr), max(max(map(operator.itemgetter(0), res)), minaddr)
-            chunks = max(len(res), chunks)
+            left, right, chunks, blocks, exits = cls.metrics(func)
+            avars = len(builtins.list(favars(func))) if func.frsize else 0
+            lvars = len(builtins.list(flvars(func)))
+            listable.append((ea, function.name(func), left, right, chunks, avars, lvars, blocks, exits, counts[ea]))
 
-            marks = max(len(builtins.list(function.marks(func))), marks)
-            blocks = max(len(builtins.list(function.blocks(func))), blocks)
-            exits = max(len(builtins.list(function.bottom(func))), exits)
-            lvars = max(len(builtins.list(flvars(func))) if func.frsize else lvars, lvars)
-            avars = max(len(builtins.list(favars(func))) if func.frsize else avars, avars)
+        # Figure out the maximum sizes for each field from the metrics that were collected
+        maxentry = max([config.bounds()[0]] + [ea for ea, _, _, _, _, _, _, _, _, _ in listable])
+        maxname = max([0] + [len(name) for _, name, _, _, _, _, _, _, _, _ in listable])
+        minaddr, maxaddr, chunks, avars, lvars, blocks, exits, nmarks = (max([0] + [row[index] for row in listable]) for index in six.moves.range(2, 10))
 
-            listable.append(ea)
-
-        # Collect the maximum sizes for everything from the first pass
         cindex = math.ceil(math.log(len(listable) or 1)/math.log(10)) if listable else 1
         try: cmaxoffset = math.floor(math.log(offset(maxentry)) or 1)/math.log(16)
         except: cmaxoffset = 0
@@ -364,23 +434,22 @@ class functions(object):
         cexits = math.floor(math.log(exits or 1)/math.log(10)) if exits else 1
         cavars = math.floor(math.log(avars or 1)/math.log(10)) if avars else 1
         clvars = math.floor(math.log(lvars or 1)/math.log(10)) if lvars else 1
-        cmarks = math.floor(math.log(marks or 1)/math.log(10)) if marks else 1
+        cmarks = math.floor(math.log(nmarks or 1)/math.log(10)) if nmarks else 1
 
         # List all the fields of every single function that was matched
-        for index, ea in enumerate(listable):
-            func, _ = function.by(ea), ui.navigation.procedure(ea)
-            res = builtins.list(function.chunks(func))
+        for index, (ea, name, left, right, count, avars, lvars, blocks, exits, nmarks) in enumerate(listable):
+            ui.navigation.procedure(ea)
             six.print_(u"[{:>{:d}d}] {:+#0{:d}x} : {:#0{:d}x}<>{:#0{:d}x} {:s}({:d}) : {:<{:d}s} : args:{:<{:d}d} lvars:{:<{:d}d} blocks:{:<{:d}d} exits:{:<{:d}d} marks:{:<{:d}d}".format(
                 index, int(cindex),
                 offset(ea), int(cmaxoffset),
-                min(map(operator.itemgetter(0), res)), int(cminaddr), max(map(operator.itemgetter(-1), res)), int(cmaxaddr),
-                int(cchunks) * ' ', len(res),
-                function.name(func), int(maxname),
-                len(list(favars(func))) if func.frsize else 0, 1 + int(cavars),
-                len(list(flvars(func))), 1 + int(clvars),
-                len(list(function.blocks(func))), 1 + int(cblocks),
-                len(list(function.bottom(func))), 1 + int(cexits),
-                len(list(function.marks(func))), 1 + int(cmarks)
+                left, int(cminaddr), right, int(cmaxaddr),
+                int(cchunks) * ' ', count,
+                name, int(maxname),
+                avars, 1 + int(cavars),
+                lvars, 1 + int(clvars),
+                blocks, 1 + int(cblocks),
+                exits, 1 + int(cexits),
+                nmarks, 1 + int(cmarks)
             ))
         return
 
@@ -536,6 +605,154 @@ def disassemble(ea, **options):
     return '\n'.join(res)
 disasm = utils.alias(disassemble)
 
+class image(object):
+    """
+    This namespace is for managing the cache of the contents of each
+    segment that is used by ``database.read`` and ``database.view``.
+    When enabled, the bytes of a segment are read from the database
+    once and then every read within that segment is sliced out of the
+    cached copy instead of asking IDA for the bytes again.
+
+    The cache is disabled by default. Whenever the bytes are modified
+    by ``database.write`` or patched by IDA, the cached copy is updated
+    in place, and it is discarded when the segments are changed. As
+    the views that are returned share the cached copy, they will also
+    reflect any bytes that are modified after they were returned.
+
+    Some examples of this namespace's usage::
+
+        > database.image.enable()
+        > print database.image.statistics()
+        > database.image.invalidate(ea)
+        > database.image.MAXIMUM = 0x10000000
+
+    """
+
+    ## cache of the contents of each segment
+    # __cache__[start] = (end, bytearray or None)
+
+    ENABLED, MAXIMUM = False, 0x4000000
+    __cache__, __counter__ = collections.OrderedDict(), collections.Counter()
+
+    @classmethod
+    def enable(cls):
+        '''Enable the cache for the contents of each segment and return its previous state.'''
+        res, cls.ENABLED = cls.ENABLED, True
+        return res
+    @classmethod
+    def disable(cls):
+        '''Disable the cache for the contents of each segment, discard everything that was cached, and return its previous state.'''
+        res, cls.ENABLED = cls.ENABLED, False
+        cls.invalidate()
+        return res
+
+    @classmethod
+    def __load__(cls, start, end):
+        '''Read the bytes from `start` to `end` into a ``bytearray`` or return None if they are too large or unable to be read.'''
+        get_bytes = idaapi.get_many_bytes if idaapi.__version__ < 7.0 else idaapi.get_bytes
+        if end - start > cls.MAXIMUM:
+            return None
+        res = get_bytes(start, end - start)
+        return bytearray(res) if res is not None and len(res) == end - start else None
+
+    @classmethod
+    def __fetch__(cls, seg):
+        '''Return the boundaries and the cached contents of the segment `seg`.'''
+        start, end = interface.range.unpack(seg)
+
+        cache = cls.__cache__
+        if start in cache and cache[start][0] == end:
+            cls.__counter__['hit'] += 1
+            res = cache.pop(start)
+        else:
+            cls.__counter__['miss'] += 1
+            res = end, cls.__load__(start, end)
+        cache[start] = res
+
+        # evict the least recently used segments until the cache fits
+        while len(cache) > 1 and sum(len(data) for _, data in cache.values() if data is not None) > cls.MAXIMUM:
+            cache.popitem(last=False)
+        _, data = res
+        return start, end, data
+
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def fetch(cls, ea):
+        """Return the boundaries and the cached contents of the segment containing the address `ea`.
+
+        If the contents of the segment were unable to be cached, then None is returned in their place.
+        """
+        seg = idaapi.getseg(ea)
+        if seg is None:
+            raise E.SegmentNotFoundError(u"{:s}.fetch({:#x}) : Unable to locate a segment at the specified address.".format('.'.join((__name__, cls.__name__)), ea))
+        return cls.__fetch__(seg)
+
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def view(cls, start, end):
+        '''Return a ``memoryview`` of the cached contents from `start` to `end` or None if they are not within a single segment that was cached.'''
+        seg = idaapi.getseg(start)
+        if seg is None:
+            return None
+        left, right, data = cls.__fetch__(seg)
+        return None if data is None or end > right else memoryview(data)[start - left : end - left]
+
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def update(cls, ea):
+        '''Update the cached contents of the byte at the address `ea`.'''
+        return cls.update(ea, ea + 1)
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def update(cls, start, end):
+        '''Update the cached contents from `start` to `end` by reading them from the database again.'''
+        get_bytes = idaapi.get_many_bytes if idaapi.__version__ < 7.0 else idaapi.get_bytes
+        cache, count = cls.__cache__, 0
+
+        # overwrite the bytes of each segment that overlaps the range, and
+        # discard the segment if we couldn't read them for some reason
+        for left, (right, data) in builtins.list(cache.items()):
+            lo, hi = max(left, start), min(right, end)
+            if data is None or lo >= hi:
+                continue
+            res = get_bytes(lo, hi - lo)
+            if res is None or len(res) != hi - lo:
+                cache.pop(left)
+                continue
+            data[lo - left : hi - left] = res
+            count += hi - lo
+        return count
+
+    @utils.multicase()
+    @classmethod
+    def invalidate(cls):
+        '''Discard the contents of every segment that has been cached.'''
+        count = len(cls.__cache__)
+        cls.__cache__.clear()
+        return count
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def invalidate(cls, ea):
+        '''Discard the cached contents of the segment containing the address `ea`.'''
+        return cls.invalidate(ea, ea + 1)
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def invalidate(cls, start, end):
+        '''Discard the cached contents of any of the segments that overlap the addresses from `start` to `end`.'''
+        cache = cls.__cache__
+        items = [ left for left, (right, _) in cache.items() if left < end and start < right ]
+        [ cache.pop(left) for left in items ]
+        return len(items)
+
+    @classmethod
+    def statistics(cls):
+        '''Return a dictionary containing the number of hits, misses, and the segments and bytes that are currently cached.'''
+        res = dict(cls.__counter__)
+        res.setdefault('hit', 0), res.setdefault('miss', 0)
+        res['size'], res['bytes'], res['maximum'] = len(cls.__cache__), sum(len(data) for _, data in cls.__cache__.values() if data is not None), cls.MAXIMUM
+        return res
+    stats = utils.alias(statistics, 'image')
+
 def block(start, end):
     '''Return the block of bytes from address `start` to `end`.'''
     if start > end:
@@ -558,8 +775,25 @@ def read(ea, size):
     '''Return `size` number of bytes from address `ea`.'''
     get_bytes = idaapi.get_many_bytes if idaapi.__version__ < 7.0 else idaapi.get_bytes
 
+    # if the segment image is enabled, then slice the bytes out of it if we can
     start, end = interface.address.within(ea, ea+size)
-    return get_bytes(ea, end - start) or ''
+    res = image.view(start, end) if image.ENABLED else None
+    return (get_bytes(ea, end - start) or '') if res is None else res.tobytes()
+
+@utils.multicase(start=six.integer_types, end=six.integer_types)
+def view(start, end):
+    """Return a ``memoryview`` of the bytes from address `start` to `end`.
+
+    If the segment image is enabled with ``database.image.enable`` and the
+    addresses are within a single segment, then the view shares the bytes
+    that were cached for the segment rather than copying them. Otherwise,
+    the bytes are read from the database into a new ``bytearray``.
+    """
+    if start > end:
+        start, end = end, start
+    start, end = interface.address.within(start, end)
+    res = image.view(start, end) if image.ENABLED else None
+    return memoryview(bytearray(read(start, end - start))) if res is None else res
 
 @utils.multicase(data=bytes)
 def write(data, **persist):
@@ -575,7 +809,14 @@ def write(ea, data, **persist):
 
     ea, _ = interface.address.within(ea, ea + len(data))
     originalQ = builtins.next((persist[k] for k in ('original', 'persist', 'store', 'save') if k in persist), False)
-    return patch_bytes(ea, data) if originalQ else put_bytes(ea, data)
+
+    # discard any instructions that were decoded from the bytes being modified
+    _instruction.cache.invalidate(ea, ea + len(data))
+    res = patch_bytes(ea, data) if originalQ else put_bytes(ea, data)
+
+    # update the segment image with whatever was actually written
+    image.update(ea, ea + len(data))
+    return res
 
 class names(object):
     """
@@ -598,6 +839,11 @@ class names(object):
         > iterable = database.names.iterate(like='str.*')
         > result = database.names.search(name='some_really_sick_symbol_name')
 
+    When matching the symbols by their name, a snapshot of every name is
+    used so that each query does not need to fetch them. This snapshot
+    is discarded by the hooks whenever something is renamed, but it can
+    also be discarded with ``database.names.invalidate``.
+
     """
     __matcher__ = utils.matcher()
     __matcher__.mapping('address', idaapi.get_nlist_ea), __matcher__.mapping('ea', idaapi.get_nlist_ea)
@@ -623,11 +869,28 @@ class names(object):
     @classmethod
     @utils.string.decorate_arguments('name', 'like', 'regex')
     def __iterate__(cls, **type):
-        iterable = iter(six.moves.range(idaapi.get_nlist_size()))
+        indexed = builtins.next((key for key in ('name', 'like', 'regex') if key in type), None)
+        iterable = iter(six.moves.range(idaapi.get_nlist_size())) if indexed is None else iter(getattr(cls._names(), indexed)(type[indexed]))
         for key, value in six.iteritems(type or builtins.dict(predicate=utils.fconstant(True))):
+            if key == indexed: continue
             iterable = cls.__matcher__.match(key, value, iterable)
         for item in iterable: yield item
 
+    ## index of every name in the database
+    __names__ = None
+
+    @classmethod
+    def _names(cls):
+        '''Return the index of every name in the database building it if necessary.'''
+        if cls.__names__ is None:
+            cls.__names__ = utils.nameindex((utils.string.of(idaapi.get_nlist_name(index)), index) for index in six.moves.range(idaapi.get_nlist_size()))
+        return cls.__names__
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the index of every name in the database so that it will be rebuilt the next time that it is needed.'''
+        cls.__names__ = None
+
     @utils.multicase(string=basestring)
     @classmethod
     @utils.string.decorate_arguments('string')
@@ -1204,14 +1467,27 @@ class entries(object):
         iterable = itertools.imap(cls.__address__, cls.__iterate__(**type))
         for ea in iterable: yield ea
 
+    ## table of the index of each entry point by its address
+    # __table__ = (entry count, {address : index})
+
+    __table__ = None
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the table of entry points so that it will be rebuilt the next time that it is needed.'''
+        cls.__table__ = None
+
     @classmethod
     def __index__(cls, ea):
         '''Returns the index of the entry point at the specified `address`.'''
-        f = utils.fcompose(idaapi.get_entry_ordinal, idaapi.get_entry)
-        iterable = itertools.imap(utils.fcompose(utils.fmap(f, lambda n:n), builtins.tuple), six.moves.range(idaapi.get_entry_qty()))
-        filterable = itertools.ifilter(utils.fcompose(utils.first, functools.partial(operator.eq, ea)), iterable)
-        result = itertools.imap(utils.second, filterable)
-        return builtins.next(result, None)
+        count = idaapi.get_entry_qty()
+        if cls.__table__ is None or cls.__table__[0] != count:
+            f = utils.fcompose(idaapi.get_entry_ordinal, idaapi.get_entry)
+            table = {}
+            [ table.setdefault(f(index), index) for index in six.moves.range(count) ]
+            cls.__table__ = count, table
+        _, table = cls.__table__
+        return table.get(ea, None)
 
     @classmethod
     def __address__(cls, index):
@@ -1357,6 +1633,7 @@ class entries(object):
         '''Adds an entry point at `ea` with the specified `name` and `ordinal`.'''
         res = idaapi.add_entry(ordinal, interface.address.inside(ea), utils.string.to(name), 0)
         ui.state.wait()
+        cls.invalidate()
         return res
 
     add = utils.alias(new, 'entries')
@@ -1513,7 +1790,6 @@ def tag(ea, key, none):
 
 # FIXME: consolidate the boolean querying logic into the utils module
 # FIXME: document this properly
-# FIXME: add support for searching global tags using the addressing cache
 @utils.multicase(tag=basestring)
 @utils.string.decorate_arguments('And', 'Or')
 def select(tag, *And, **boolean):
@@ -1543,8 +1819,13 @@ def select(**boolean):
     # collect the keys to query as specified by the user
     Or, And = (builtins.set(iter(boolean.get(B, ()))) for B in ('Or', 'And'))
 
-    # walk through all tags so we can cross-check them with the query
-    for ea in internal.comment.globals.address():
+    # use the tag index to find the addresses that could match the query, and
+    # fall back to walking through every tagged address if it can't be used
+    res = internal.comment.index.select(None, And=And, Or=Or)
+    iterable = internal.comment.globals.address() if res is None else res
+
+    # walk through all the candidates so we can cross-check them with the query
+    for ea in iterable:
         ui.navigation.set(ea)
         res, d = {}, function.tag(ea) if function.within(ea) else tag(ea)
 
@@ -1595,10 +1876,10 @@ def selectcontents(**boolean):
     # walk through all tagnames so we can cross-check them against the query
     for ea, res in internal.comment.contents.iterate():
         ui.navigation.procedure(ea)
-        res, d = builtins.set(res), internal.comment.contents._read(None, ea) or {}
+        res, d = builtins.set(res), internal.comment.contents.name(ea)
 
-        # check to see that the dict's keys match
-        if builtins.set(d.viewkeys()) != res:
+        # check to see that the tag names match
+        if d != res:
             # FIXME: include query in warning
             q = utils.string.kwargs(boolean)
             logging.warn(u"{:s}.selectcontents({:s}) : Contents cache is out of sync. Using contents blob at {:#x} instead of the sup cache.".format(__name__, q, ea))
@@ -1652,6 +1933,13 @@ class imports(object):
         > database.imports.list(module='kernelbase.dll')
         > iterable = database.imports.iterate(like='*alloc*')
         > result = database.imports.search(index=42)
+        > ea = database.imports.address('kernelbase.dll!VirtualAlloc')
+
+    The imports are enumerated only once and are then kept in a table that
+    is indexed by their address and their name. This table is rebuilt
+    whenever the number of import modules changes, or when it is discarded
+    by the hooks. If necessary, it can be discarded with the function
+    ``database.imports.invalidate``.
 
     """
     def __new__(cls):
@@ -1675,20 +1963,49 @@ class imports(object):
     __matcher__.predicate('pred', lambda n:n)
     __matcher__.mapping('index', utils.first)
 
+    ## table of every import indexed by its address and its name
+    # __table__ = (module count, [(ea, (module, name, ordinal)), ...], {ea : (module, name, ordinal)}, {fullname : [ea, ...]})
+
+    __table__ = None
+
+    @classmethod
+    def _table(cls):
+        '''Return the table of every import in the database building it if it is missing or the number of import modules has changed.'''
+        count = idaapi.get_import_module_qty()
+        if cls.__table__ is not None and cls.__table__[0] == count:
+            return cls.__table__
+
+        items = []
+        for idx in six.moves.range(count):
+            module = idaapi.get_import_module_name(idx)
+            listable = []
+            idaapi.enum_import_names(idx, utils.fcompose(utils.fbox, listable.append, utils.fconstant(True)))
+            items.extend((ea, (utils.string.of(module), utils.string.of(name), ordinal)) for ea, name, ordinal in listable)
+
+        # index each of the imports by its address and by its name
+        addresses, names = {}, {}
+        for ea, item in items:
+            addresses.setdefault(ea, item)
+            [ names.setdefault(key, []).append(ea) for key in {cls.__formats__(item), cls.__formatl__(item)} ]
+
+        cls.__table__ = res = count, items, addresses, names
+        return res
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the table of imports so that it will be rebuilt the next time that it is needed.'''
+        cls.__table__ = None
+
     @classmethod
     def __iterate__(cls):
         """Iterate through all of the imports in the database.
 
         Yields `(address, (module, name, ordinal))` for each iteration.
         """
-        for idx in six.moves.range(idaapi.get_import_module_qty()):
-            module = idaapi.get_import_module_name(idx)
-            listable = []
-            idaapi.enum_import_names(idx, utils.fcompose(utils.fbox, listable.append, utils.fconstant(True)))
-            for ea, name, ordinal in listable:
-                ui.navigation.set(ea)
-                yield ea, (utils.string.of(module), utils.string.of(name), ordinal)
-            continue
+        _, items, _, _ = cls._table()
+        for ea, item in items:
+            ui.navigation.set(ea)
+            yield ea, item
         return
 
     @utils.multicase(string=basestring)
@@ -1718,11 +2035,9 @@ class imports(object):
     def at(cls, ea):
         '''Return the import at the address `ea`.'''
         ea = interface.address.inside(ea)
-        iterable = itertools.ifilter(utils.fcompose(utils.first, functools.partial(operator.eq, ea)), cls.__iterate__())
-        try:
-            return utils.second(builtins.next(iterable))
-        except StopIteration:
-            pass
+        _, _, addresses, _ = cls._table()
+        if ea in addresses:
+            return addresses[ea]
         raise E.MissingTypeOrAttribute(u"{:s}.at({:#x}) : Unable to determine import at specified address.".format('.'.join((__name__, cls.__name__)), ea))
 
     @utils.multicase()
@@ -1735,12 +2050,25 @@ class imports(object):
     def module(cls, ea):
         '''Return the import module at the specified address `ea`.'''
         ea = interface.address.inside(ea)
-        for addr, (module, _, _) in cls.__iterate__():
-            if addr == ea:
-                return module
-            continue
+        _, _, addresses, _ = cls._table()
+        if ea in addresses:
+            module, _, _ = addresses[ea]
+            return module
         raise E.MissingTypeOrAttribute(u"{:s}.module({:#x}) : Unable to determine import module name at specified address.".format('.'.join((__name__, cls.__name__)), ea))
 
+    @utils.multicase(name=basestring)
+    @classmethod
+    @utils.string.decorate_arguments('name')
+    def address(cls, name):
+        '''Return the address of the import with the specified `name` or full name.'''
+        _, _, _, names = cls._table()
+        res = names.get(name, [])
+        if len(res) > 1:
+            logging.warn(u"{:s}.address({!r}) : Found {:d} imports with the specified name. Returning the first one at {:#x}.".format('.'.join((__name__, cls.__name__)), name, len(res), res[0]))
+        elif not res:
+            raise E.MissingTypeOrAttribute(u"{:s}.address({!r}) : Unable to find an import with the specified name.".format('.'.join((__name__, cls.__name__)), name))
+        return res[0]
+
     # specific parts of the import
     @utils.multicase()
     @classmethod
@@ -1876,6 +2204,8 @@ class address(object):
         > ea = database.a.prevreg(ea, 'edx', write=1)
         > ea = database.a.nextref(ea)
         > ea = database.a.prevcall(ea)
+        > for ea in database.a.heads(start, end, code=True): ...
+        > for items in database.a.batches(start, end, count=0x1000): ...
 
     """
 
@@ -1917,8 +2247,9 @@ class address(object):
     def iterate(cls, start, end):
         '''Iterate from address `start` to `end`.'''
         start, end = interface.address.within(start, end)
-        step = cls.prev if start > end else cls.next
-        return cls.iterate(start, end, step)
+        if start > end:
+            return cls.iterate(start, end, cls.prev)
+        return cls.__iterate__(start, end)
     @utils.multicase(start=six.integer_types, end=six.integer_types, step=callable)
     @classmethod
     def iterate(cls, start, end, step):
@@ -1936,6 +2267,86 @@ class address(object):
                 res = step(res)
         except E.OutOfBoundsError: pass
 
+    @staticmethod
+    def __iterate__(start, end):
+        '''Iterate forward from address `start` to `end` by stepping with ``idaapi.next_not_tail`` directly.'''
+        start, end = interface.address.inside(start, end)
+        _, right = config.bounds()
+
+        # the bounds were already checked, so the only thing left to stop us is the end
+        res, stop = start, min(end, right)
+        while res < stop:
+            yield res
+            res = idaapi.next_not_tail(res)
+        return
+
+    @staticmethod
+    def __heads__(start, end, mask, values, count):
+        '''Yield lists of up to `count` item heads from `start` to `end` whose flags masked by `mask` are one of the specified `values`.'''
+        get_flags = idaapi.getFlags if idaapi.__version__ < 7.0 else idaapi.get_flags
+        is_head = idaapi.isHead if idaapi.__version__ < 7.0 else idaapi.is_head
+        next_head = idaapi.next_head
+
+        # figure out the first head that is at or after the starting address
+        ea = idaapi.get_item_head(start)
+        ea = ea if ea == start and is_head(get_flags(ea)) else next_head(ea, end)
+
+        # collect the heads into a list so that we only yield once for each chunk
+        res = []
+        while ea < end:
+            if get_flags(ea) & mask in values:
+                res.append(ea)
+            if len(res) >= count:
+                yield res
+                res = []
+            ea = next_head(ea, end)
+        if res: yield res
+
+    @classmethod
+    def __typemask__(cls, **type):
+        '''Return the mask and the values of the flags that are selected by the keywords in `type`.'''
+        selected = {key : builtins.next((type[k] for k in keys if k in type), False) for key, keys in [('code', ('code', 'instruction', 'instructions')), ('data', ('data',))]}
+        if not any(six.itervalues(selected)):
+            return 0, {0}
+        return idaapi.MS_CLS, {flag for key, flag in [('code', idaapi.FF_CODE), ('data', idaapi.FF_DATA)] if selected[key]}
+
+    @utils.multicase(end=six.integer_types)
+    @classmethod
+    def heads(cls, end, **type):
+        '''Iterate through each item head from the current address to `end`.'''
+        return cls.heads(ui.current.address(), end, **type)
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def heads(cls, start, end, **type):
+        """Iterate through each item head from the address `start` to `end`.
+
+        If the bool `code` is specified, then only yield the heads that are instructions.
+        If the bool `data` is specified, then only yield the heads that are data.
+        """
+        start, end = interface.address.within(start, end)
+        mask, values = cls.__typemask__(**type)
+        iterable = cls.__heads__(start, end, mask, values, 0x1000)
+        return itertools.chain.from_iterable(iterable)
+
+    @utils.multicase(end=six.integer_types)
+    @classmethod
+    def batches(cls, end, **type):
+        '''Yield lists containing each item head from the current address to `end`.'''
+        return cls.batches(ui.current.address(), end, **type)
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def batches(cls, start, end, **type):
+        """Yield lists containing each item head from the address `start` to `end`.
+
+        If the integer `count` is specified, then use it as the maximum length of each list.
+        If the bool `code` is specified, then only include the heads that are instructions.
+        If the bool `data` is specified, then only include the heads that are data.
+        """
+        start, end = interface.address.within(start, end)
+        count = type.pop('count', 0x1000)
+        mask, values = cls.__typemask__(**type)
+        return cls.__heads__(start, end, mask, values, max(1, count))
+
     @classmethod
     @utils.multicase(end=six.integer_types)
     def blocks(cls, end):
@@ -2298,22 +2709,22 @@ class address(object):
         return cls.nextF(ea, Fcref, count)
     prevcode, nextcode = utils.alias(prevcref, 'address'), utils.alias(nextcref, 'address')
 
-    @utils.multicase(reg=(basestring, interface.register_t))
+    @utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def prevreg(cls, reg, *regs, **modifiers):
         '''Return the previous address containing an instruction that uses `reg` or any one of the specified registers `regs`.'''
         return cls.prevreg(ui.current.address(), reg, *regs, **modifiers)
-    @utils.multicase(predicate=builtins.callable, reg=(basestring, interface.register_t))
+    @utils.multicase(predicate=builtins.callable, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def prevreg(cls, predicate, reg, *regs, **modifiers):
         '''Return the previous address containing an instruction that uses `reg` or any one of the specified registers `regs` and matches `predicate`.'''
         return cls.prevreg(ui.current.address(), predicate, reg, *regs, **modifiers)
-    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t))
+    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def prevreg(cls, ea, reg, *regs, **modifiers):
         '''Return the previous address from `ea` containing an instruction that uses `reg` or any one of the specified registers `regs`.'''
         return cls.prevreg(ea, utils.fconst(True), reg, *regs, **modifiers)
-    @utils.multicase(ea=six.integer_types, predicate=builtins.callable, reg=(basestring, interface.register_t))
+    @utils.multicase(ea=six.integer_types, predicate=builtins.callable, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def prevreg(cls, ea, predicate, reg, *regs, **modifiers):
         '''Return the previous address from `ea` containing an instruction that uses `reg` or any one of the specified registers `regs` and matches `predicate`.'''
@@ -2360,22 +2771,22 @@ class address(object):
         modifiers['count'] = count - 1
         return cls.prevreg(res, predicate, *regs, **modifiers) if count > 1 else res
 
-    @utils.multicase(reg=(basestring, interface.register_t))
+    @utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def nextreg(cls, reg, *regs, **modifiers):
         '''Return the next address containing an instruction that uses `reg` or any one of the registers in `regs`.'''
         return cls.nextreg(ui.current.address(), reg, *regs, **modifiers)
-    @utils.multicase(predicate=builtins.callable, reg=(basestring, interface.register_t))
+    @utils.multicase(predicate=builtins.callable, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def nextreg(cls, predicate, reg, *regs, **modifiers):
         '''Return the next address containing an instruction that matches `predicate` and uses `reg` or any one of the registers in `regs`.'''
         return cls.nextreg(ui.current.address(), predicate, reg, *regs, **modifiers)
-    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t))
+    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def nextreg(cls, ea, reg, *regs, **modifiers):
         '''Return the next address from `ea` containing an instruction that uses `reg` or any one of the registers in `regs`.'''
         return cls.nextreg(ea, utils.fconst(True), reg, *regs, **modifiers)
-    @utils.multicase(ea=six.integer_types, predicate=builtins.callable, reg=(basestring, interface.register_t))
+    @utils.multicase(ea=six.integer_types, predicate=builtins.callable, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def nextreg(cls, ea, predicate, reg, *regs, **modifiers):
         '''Return the next address from `ea` containing an instruction that matches `predicate` and uses `reg` or any one of the registers in `regs`.'''
@@ -2789,6 +3200,7 @@ class type(object):
         > print database.type.size(ea)
         > print database.type.is_initialized(ea)
         > print database.type.is_data(ea)
+        > print database.type.snapshot(start, end).select(code=True, comment=True)
         > length = database.t.array.length(ea)
         > st = database.t.structure(ea)
 
@@ -2844,6 +3256,30 @@ class type(object):
             return res & mask
         raise E.UnsupportedVersion(u"{:s}.flags({:#x}, {:#x}, {:d}) : IDA 7.0 has unfortunately deprecated `idaapi.setFlags(...)`.".format('.'.join((__name__, cls.__name__)), ea, mask, value))
 
+    @utils.multicase()
+    @classmethod
+    def snapshot(cls):
+        '''Return a snapshot of the flags for every address within the current segment.'''
+        seg = segment.by()
+        return cls.snapshot(*interface.range.bounds(seg))
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def snapshot(cls, start, end):
+        """Return a snapshot of the flags for every address from `start` to `end`.
+
+        The snapshot is an ``interface.flags_t`` which can select the
+        addresses that have a combination of flags (such as the code
+        with comments, or the data with custom names) without fetching
+        the flags of each address individually.
+        """
+        getflags = idaapi.getFlags if idaapi.__version__ < 7.0 else idaapi.get_full_flags
+        start, end = interface.address.within(*sorted((start, end)))
+
+        # use the smallest array type that can hold the 32-bit flags
+        typecode = builtins.next(item for item in ('I', 'L') if _array.array(item).itemsize >= 4)
+        iterable = itertools.islice(itertools.count(start), end - start)
+        return interface.flags_t(start, _array.array(typecode, six.moves.map(getflags, iterable)))
+
     @utils.multicase()
     @staticmethod
     def is_initialized():
@@ -3568,6 +4004,13 @@ class marks(object):
         > database.marks.remove(ea)
         > ea, descr = database.marks.by(ea)
 
+    The slot of each mark is kept in a table that is indexed by its address
+    along with a heap of the slots that are available. This table is built
+    the first time that it is needed and is updated as marks are created or
+    removed. If a slot within the table is found to be out of date, then
+    the entire table will be rebuilt. It can also be discarded manually with
+    the function ``database.marks.invalidate``.
+
     """
     MAX_SLOT_COUNT = 0x400
     table = {}
@@ -3600,6 +4043,13 @@ class marks(object):
             res, idx = None, cls.__free_slotindex()
             logging.info(u"{:s}.new({:#x}, {!r}{:s}) : Creating mark {:d} at {:#x} with the description \"{:s}\".".format('.'.join((__name__, cls.__name__)), ea, description, u", {:s}".format(utils.string.kwargs(extra)) if extra else '', idx, ea, utils.string.escape(description, '"')))
         cls.__set_description(idx, ea, description, **extra)
+
+        # update the table with the slot that was used
+        addresses, available = cls._table()
+        addresses[ea] = idx
+        if idx in available:
+            available.remove(idx)
+            heapq.heapify(available)
         return res
 
     @utils.multicase()
@@ -3615,6 +4065,14 @@ class marks(object):
         idx = cls.__find_slotaddress(ea)
         descr = cls.__get_description(idx)
         cls.__set_description(idx, ea, '')
+
+        # if the slot was released, then we can add it back to the heap of available slots
+        addresses, available = cls._table()
+        try:
+            cls.__get_slotaddress(idx)
+        except E.AddressNotFoundError:
+            addresses.pop(ea, None)
+            heapq.heappush(available, idx)
         logging.warn(u"{:s}.remove({:#x}) : Removed mark {:d} at {:#x} with the description \"{:s}\".".format('.'.join((__name__, cls.__name__)), ea, idx, ea, utils.string.escape(descr, '"')))
         return descr
 
@@ -3632,7 +4090,74 @@ class marks(object):
     @classmethod
     def length(cls):
         '''Return the number of marks in the database.'''
-        return len(builtins.list(cls.iterate()))
+        _, available = cls._table()
+        return available[0] if available else cls.MAX_SLOT_COUNT
+
+    ## table of the slot of each mark by its address
+    # __table__ = ({address : index}, [available index, ...])
+
+    __table__ = None
+
+    @classmethod
+    def _table(cls):
+        '''Return the table of each mark slot by its address and the heap of available slots building it if necessary.'''
+        if cls.__table__ is not None:
+            return cls.__table__
+
+        addresses, available = {}, []
+        for index in six.moves.range(cls.MAX_SLOT_COUNT):
+            try:
+                addresses.setdefault(cls.__get_slotaddress(index), index)
+            except E.AddressNotFoundError:
+                available.append(index)
+            continue
+
+        # the slots are visited in order, so the available ones are already a heap
+        cls.__table__ = res = addresses, available
+        return res
+
+    @classmethod
+    def invalidate(cls):
+        '''Discard the table of mark slots so that it will be rebuilt the next time that it is needed.'''
+        cls.__table__ = None
+
+    @classmethod
+    def __find_slotaddress(cls, ea):
+        '''Return the index of the mark at the specified address `ea`.'''
+        fresh = cls.__table__ is None
+        for attempt in six.moves.range(2):
+            addresses, _ = cls._table()
+
+            # double-check the slot in case the marks were changed behind our back
+            index = addresses.get(ea, None)
+            try:
+                if index is not None and cls.__get_slotaddress(index) == ea:
+                    return index
+            except E.AddressNotFoundError:
+                pass
+
+            # if we missed, then the mark might have been added from the ui so rebuild the table once
+            if fresh:
+                break
+            cls.invalidate()
+            fresh = True
+        raise E.AddressNotFoundError(u"{:s}.find_slotaddress({:#x}) : Unable to find specified slot address.".format('.'.join((__name__, cls.__name__)), ea))
+
+    @classmethod
+    def __free_slotindex(cls):
+        '''Return the index of the next available mark slot.'''
+        for attempt in six.moves.range(2):
+            _, available = cls._table()
+            if not available:
+                break
+
+            # double-check that the slot is still available in case the marks were changed behind our back
+            try:
+                cls.__get_slotaddress(available[0])
+            except E.AddressNotFoundError:
+                return available[0]
+            cls.invalidate()
+        raise OverflowError("{:s}.free_slotindex() : No free slots available for mark.".format('.'.join((__name__, 'bookmarks', cls.__name__))))
 
     @classmethod
     def by_index(cls, index):
@@ -3679,26 +4204,6 @@ class marks(object):
             res = cls.__location().markdesc(index)
             return utils.string.of(res)
 
-        @classmethod
-        def __find_slotaddress(cls, ea):
-            '''Return the index of the mark at the specified address `ea`.'''
-            # FIXME: figure out how to fail if this address isn't found
-            res = itertools.islice(itertools.count(), cls.MAX_SLOT_COUNT)
-            res, iterable = itertools.tee(itertools.imap(cls.__get_slotaddress, res))
-            try:
-                count = len(builtins.list(itertools.takewhile(lambda n: n != ea, res)))
-            except:
-                raise E.AddressNotFoundError(u"{:s}.find_slotaddress({:#x}) : Unable to find specified slot address.".format('.'.join((__name__, cls.__name__)), ea))
-            builtins.list(itertools.islice(iterable, count))
-            if builtins.next(iterable) != ea:
-                raise E.AddressNotFoundError(u"{:s}.find_slotaddress({:#x}) : Unable to find specified slot address.".format('.'.join((__name__, cls.__name__)), ea))
-            return count
-
-        @classmethod
-        def __free_slotindex(cls):
-            '''Return the index of the next available mark slot.'''
-            return cls.length()
-
         @classmethod
         def __get_slotaddress(cls, index):
             '''Return the address of the mark at the specified `index`.'''
@@ -3727,28 +4232,6 @@ class marks(object):
             res = idaapi.get_mark_comment(index)
             return utils.string.of(res)
 
-        @classmethod
-        def __find_slotaddress(cls, ea):
-            '''Return the index of the mark at the specified address `ea`.'''
-            res = itertools.islice(itertools.count(), cls.MAX_SLOT_COUNT)
-            res, iterable = itertools.tee(itertools.imap(cls.__get_slotaddress, res))
-            try:
-                count = len(builtins.list(itertools.takewhile(lambda n: n != ea, res)))
-            except:
-                raise E.AddressNotFoundError(u"{:s}.find_slotaddress({:#x}) : Unable to find specified slot address.".format('.'.join((__name__, cls.__name__)), ea))
-            builtins.list(itertools.islice(iterable, count))
-            if builtins.next(iterable) != ea:
-                raise E.AddressNotFoundError(u"{:s}.find_slotaddress({:#x}) : Unable to find specified slot address.".format('.'.join((__name__, cls.__name__)), ea))
-            return count
-
-        @classmethod
-        def __free_slotindex(cls):
-            '''Return the index of the next available mark slot.'''
-            res = builtins.next((i for i in six.moves.range(cls.MAX_SLOT_COUNT) if idaapi.get_marked_pos(i) == idaapi.BADADDR), None)
-            if res is None:
-                raise OverflowError("{:s}.free_slotindex() : No free slots available for mark.".format('.'.join((__name__, 'bookmarks', cls.__name__))))
-            return res
-
         @classmethod
         def __get_slotaddress(cls, index):
             '''Get the address of the mark at index `index`.'''
@@ -4563,12 +5046,55 @@ class get(object):
 
         > res = database.get.signed()
         > res = database.get.unsigned(ea, 8, byteorder='big')
+        > res = database.get.unsigned_many(ea, 4, 0x10)
         > res = database.get.array(ea)
         > res = database.get.array(length=42)
         > res = database.get.structure(ea)
         > res = database.get.structure(ea, structure=structure.by('mystructure'))
 
     """
+
+    ## decoders for each of the integer sizes that the struct module supports
+    # __structs__[size, signed, little] = struct.Struct
+
+    __structs__ = { (size, signed, little) : _struct.Struct(('<' if little else '>') + (ch if signed else ch.upper())) for size, ch in [(1, 'b'), (2, 'h'), (4, 'i'), (8, 'q')] for signed in [False, True] for little in [False, True] }
+
+    @classmethod
+    def __littleQ__(cls, byteorder):
+        '''Return whether the keywords in `byteorder` (or the database) specify the little-endian byte order.'''
+        endian = byteorder.get('order', None) or byteorder.get('byteorder', config.byteorder())
+        return endian.lower().startswith('little')
+
+    @classmethod
+    def __integer__(cls, data, size, signed, little):
+        '''Decode the bytes in `data` as an integer of `size` bytes using the specified signedness and byte order.'''
+        decoder = cls.__structs__.get((size, signed, little), None) if len(data) == size else None
+        if decoder is not None:
+            return decoder.unpack(data)[0]
+
+        # if the struct module can't decode it, then convert it ourselves
+        res = int(binascii.hexlify(data[::-1] if little else data), 16) if data else 0
+        bits = size*8
+        return (res - (2**bits)) if signed and res & ((2**bits)>>1) else res
+
+    @classmethod
+    def __integers__(cls, ea, size, count, stride, signed, little):
+        '''Decode `count` integers of `size` bytes that are `stride` bytes apart starting at the address `ea`.'''
+        if count <= 0:
+            return []
+        total = stride * (count - 1) + size
+        data = read(ea, total)
+
+        # if we read everything then we can decode them with a single call
+        decoder = cls.__structs__.get((size, signed, little), None)
+        if decoder is not None and len(data) == total:
+            prefix, ch = decoder.format[:1], decoder.format[1:]
+            fmt = prefix + (ch + "{:d}x".format(stride - size)) * count if stride > size else prefix + "{:d}{:s}".format(count, ch)
+            return builtins.list(_struct.unpack_from(fmt, data + b'\0' * (stride - size)))
+
+        # otherwise decode each of them the same way as if they were read individually
+        return [ cls.__integer__(data[offset : offset + size], size, signed, little) for offset in six.moves.range(0, stride * count, stride) ]
+
     @utils.multicase()
     @classmethod
     def unsigned(cls, **byteorder):
@@ -4590,11 +5116,28 @@ class get(object):
 
         The default value of `byteorder` is the same as specified by the database architecture.
         """
-        data = read(ea, size)
-        endian = byteorder.get('order', None) or byteorder.get('byteorder', config.byteorder())
-        if endian.lower().startswith('little'):
-            data = data[::-1]
-        return reduce(lambda x, y: x << 8 | six.byte2int(y), data, 0)
+        return cls.__integer__(read(ea, size), size, False, cls.__littleQ__(byteorder))
+
+    @utils.multicase(size=six.integer_types, count=six.integer_types)
+    @classmethod
+    def unsigned_many(cls, size, count, **options):
+        '''Read `count` unsigned integers of the specified `size` from the current address.'''
+        return cls.unsigned_many(ui.current.address(), size, count, **options)
+    @utils.multicase(ea=six.integer_types, size=six.integer_types, count=six.integer_types)
+    @classmethod
+    def unsigned_many(cls, ea, size, count, **options):
+        """Read `count` unsigned integers of the specified `size` from the address `ea`.
+
+        If the integer `stride` is specified, then use it as the number of bytes between each integer.
+        If `byteorder` is 'big' then read in big-endian form.
+        If `byteorder` is 'little' then read in little-endian form.
+
+        The default value of `byteorder` is the same as specified by the database architecture.
+        """
+        stride = options.get('stride', size)
+        if stride < size:
+            raise E.InvalidParameterError(u"{:s}.unsigned_many({:#x}, {:d}, {:d}{:s}) : The specified stride ({:d}) is smaller than the size of each integer ({:d}).".format('.'.join((__name__, cls.__name__)), ea, size, count, u", {:s}".format(utils.string.kwargs(options)) if options else '', stride, size))
+        return cls.__integers__(ea, size, count, stride, False, cls.__littleQ__(options))
 
     @utils.multicase()
     @classmethod
@@ -4617,10 +5160,7 @@ class get(object):
 
         The default value of `byteorder` is the same as specified by the database architecture.
         """
-        bits = size*8
-        sf = (2**bits)>>1
-        res = cls.unsigned(ea, size, **byteorder)
-        return (res - (2**bits)) if res&sf else res
+        return cls.__integer__(read(ea, size), size, True, cls.__littleQ__(byteorder))
 
     class integer(object):
         """
@@ -4756,6 +5296,53 @@ class get(object):
 
     i = integer # XXX: ns alias
 
+    ## lookup tables for the numerical types of an array
+    # __numerics__ = ({DT_TYPE : typecode}, {DT_TYPE : size})
+
+    __numerics__ = None
+
+    @classmethod
+    def __tables__(cls):
+        '''Return the lookup tables for the numerical types that can be decoded by ``array.array`` and the ones that need to be decoded manually.'''
+        if cls.__numerics__ is not None:
+            return cls.__numerics__
+
+        # Figure out which typecode to use for each integer size since the
+        # sizes of them depend on the platform, and some 32-bit versions of
+        # python might not have array.array('Q').
+        typecodes = {}
+        for ch in 'BHILQ':
+            try:
+                typecodes.setdefault(_array.array(ch).itemsize, ch)
+            except (AttributeError, ValueError):
+                pass
+            continue
+
+        numerics = {
+            idaapi.FF_FLOAT : 'f',
+            idaapi.FF_DOUBLE : 'd',
+        }
+
+        # lookup table for long-numerics that require manually reading
+        lnumerics = {}
+
+        # FF_QWORD, FF_OWORD, FF_YWORD and FF_ZWORD might not exist in older
+        # versions of IDA, so try to add them "softly". Any of them that are
+        # larger than a typecode are added to our long-numerics.
+        integers = [(('FF_BYTE',), 1), (('FF_WORD',), 2), (('FF_DWORD', 'FF_DWRD'), 4), (('FF_QWORD', 'FF_QWRD'), 8), (('FF_OWORD', 'FF_OWRD'), 16), (('FF_YWORD', 'FF_YWRD'), 32), (('FF_ZWORD', 'FF_ZWRD'), 64)]
+        for names, cb in integers:
+            T = builtins.next((getattr(idaapi, name) for name in names if hasattr(idaapi, name)), None)
+            if T is None:
+                continue
+            elif cb in typecodes:
+                numerics[T] = typecodes[cb]
+            else:
+                lnumerics[T] = cb
+            continue
+
+        cls.__numerics__ = res = numerics, lnumerics
+        return res
+
     @utils.multicase()
     @classmethod
     def array(cls, **length):
@@ -4769,43 +5356,7 @@ class get(object):
         If the integer `length` is defined, then use it as the number of elements for the array.
         """
         ea = interface.address.within(ea)
-        numerics = {
-            idaapi.FF_BYTE : 'B',
-            idaapi.FF_WORD : 'H',
-            idaapi.FF_DWORD if hasattr(idaapi, 'FF_DWORD') else idaapi.FF_DWRD : 'L',
-            idaapi.FF_FLOAT : 'f',
-            idaapi.FF_DOUBLE : 'd',
-        }
-
-        # Some 32-bit versions of python might not have array.array('Q')
-        # and some versions of IDA also might not have FF_QWORD..
-        try:
-            _array.array('Q')
-            numerics[idaapi.FF_QWORD if hasattr(idaapi, 'FF_QWORD') else idaapi.FF_QWRD] = 'Q'
-        except (AttributeError, ValueError):
-            pass
-
-        # lookup table for long-numerics that require manually reading
-        lnumerics = {}
-
-        # if we have FF_QWRD defined but its not in _array, then add it to our
-        # long-numerics so we can read them
-        if any(hasattr(idaapi, name) for name in {'FF_QWRD', 'FF_QWORD'}):
-            name = six.next(name for name in {'FF_QWRD', 'FF_QWORD'} if hasattr(idaapi, name))
-            value = getattr(idaapi, name)
-            if value not in numerics:
-                lnumerics[value] = 8
-            pass
-
-        # FF_OWORD, FF_YWORD and FF_ZWORD might not exist in older versions
-        # of IDA, so try to add them to our long-numerics "softly".
-        try:
-            lnumerics[idaapi.FF_QWORD if hasattr(idaapi, 'FF_QWORD') else idaapi.FF_QWRD] = 8
-            lnumerics[idaapi.FF_OWORD if hasattr(idaapi, 'FF_OWORD') else idaapi.FF_OWRD] = 16
-            lnumerics[idaapi.FF_YWORD if hasattr(idaapi, 'FF_YWORD') else idaapi.FF_YWRD] = 32
-            lnumerics[idaapi.FF_ZWORD if hasattr(idaapi, 'FF_ZWORD') else idaapi.FF_ZWRD] = 64
-        except AttributeError:
-            pass
+        numerics, lnumerics = cls.__tables__()
 
         strings = {
             1 : 'c',
@@ -4827,10 +5378,8 @@ class get(object):
             t = ch.lower() if F & idaapi.FF_SIGN == idaapi.FF_SIGN else ch
         elif T in lnumerics:
             cb, total = lnumerics[T], idaapi.get_item_size(ea)
-            # FIXME: return signed version of number
-            t = get.signed if F & idaapi.FF_SIGN == idaapi.FF_SIGN else get.unsigned
             count = length.get('length', math.trunc(math.ceil(float(total) / cb)))
-            return [ t(ea + i*cb, cb) for i in six.moves.range(count) ]
+            return cls.__integers__(ea, cb, count, cb, F & idaapi.FF_SIGN == idaapi.FF_SIGN, cls.__littleQ__({}))
         else:
             raise E.UnsupportedCapability(u"{:s}.array({:#x}{:s}) : Unknown DT_TYPE found in flags at address {:#x}. The flags {:#x} have the `idaapi.DT_TYPE` as {:#x}.".format('.'.join((__name__, cls.__name__)), ea, u", {:s}".format(utils.string.kwargs(length)) if length else '', ea, F, T))
 
@@ -22,7 +22,7 @@ import six
 from six.moves import builtins
 
 import functools, operator, itertools, types
-import logging
+import collections, bisect, logging
 
 import database, instruction, structure
 import ui, internal
@@ -39,7 +39,17 @@ def by_address():
 def by_address(ea):
     '''Return the function containing the address `ea`.'''
     ea = interface.address.within(ea)
-    res = idaapi.get_func(ea)
+    index = chunks._index(ea)
+    if index is None:
+        raise E.FunctionNotFoundError(u"{:s}.by_address({:#x}) : Unable to locate function by address.".format(__name__, ea))
+
+    # if IDA doesn't have the function that owns the chunk, then the chunk table is out of date
+    _, _, owners, _ = chunks._table()
+    res = idaapi.get_func(owners[index])
+    if res is None:
+        chunks.invalidate()
+        res = idaapi.get_func(ea)
+
     if res is None:
         raise E.FunctionNotFoundError(u"{:s}.by_address({:#x}) : Unable to locate function by address.".format(__name__, ea))
     return res
@@ -310,7 +320,6 @@ def bottom():
 def bottom(func):
     '''Return the exit-points of the function `func`.'''
     fn = by(func)
-    fc = idaapi.FlowChart(f=fn, flags=idaapi.FC_PREDS)
     exit_types = (
         interface.fc_block_type_t.fcb_ret,
         interface.fc_block_type_t.fcb_cndret,
@@ -318,7 +327,7 @@ def bottom(func):
         interface.fc_block_type_t.fcb_enoret,
         interface.fc_block_type_t.fcb_error
     )
-    return tuple(database.address.prev(interface.range.end(item)) for item in fc if item.type in exit_types)
+    return tuple(database.address.prev(interface.range.end(item)) for item in blocks.iterate(fn) if item.type in exit_types)
 
 @utils.multicase()
 def marks():
@@ -373,10 +382,18 @@ class chunks(object):
     associated with a function. By default this namespace will yield
     the boundaries of each chunk associated with a function.
 
+    The boundaries of every chunk in the database are kept in a table
+    sorted by address along with the function that owns each chunk. This
+    table is used to determine the function that contains an address
+    and is kept current by the hooks whenever a chunk is changed. If it
+    becomes out of date, then it can be rebuilt with the function
+    ``function.chunks.invalidate``.
+
     Some of the ways to use this namespace are::
 
         > for l, r in function.chunks(): ...
         > for ea in function.chunks.iterate(ea): ...
+        > ea = function.chunks.owner(ea)
 
     """
     @utils.multicase()
@@ -407,7 +424,7 @@ class chunks(object):
     def iterate(cls, func):
         '''Iterate through all the instructions for each chunk in the function `func`.'''
         for start, end in cls(func):
-            for ea in itertools.ifilter(database.type.is_code, database.address.iterate(start, end)):
+            for ea in database.address.heads(start, end, code=True):
                 yield ea
             continue
         return
@@ -434,12 +451,12 @@ class chunks(object):
             continue
         raise E.AddressNotFoundError(u"{:s}.at({:#x}, {:#x}) : Unable to locate chunk for address {:#x} in function {:#x}.".format('.'.join((__name__, cls.__name__)), interface.range.start(fn), ea, ea, interface.range.start(fn)))
 
-    @utils.multicase(reg=(basestring, interface.register_t))
+    @utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, reg, *regs, **modifiers):
         '''Yield each `(address, opnum, state)` within the current function that uses `reg` or any one of the registers in `regs`.'''
         return cls.register(ui.current.function(), reg, *regs, **modifiers)
-    @utils.multicase(reg=(basestring, interface.register_t))
+    @utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, func, reg, *regs, **modifiers):
         """Yield each `(address, opnum, state)` within the function `func` that uses `reg` or any one of the registers in `regs`.
@@ -455,6 +472,124 @@ class chunks(object):
             continue
         return
 
+    ## table of the boundaries of every function chunk and the function that owns it
+    # __table__ = ([start, ...], [end, ...], [owner, ...], [external, ...]) sorted by start
+
+    __table__ = None
+
+    @classmethod
+    def _table(cls):
+        '''Return the table of every function chunk within the database building it if necessary.'''
+        if cls.__table__ is not None:
+            return cls.__table__
+
+        # IDA already keeps its chunks sorted, but we sort them anyways in case it doesn't
+        items = []
+        for index in six.moves.range(idaapi.get_fchunk_qty()):
+            ch = idaapi.getn_fchunk(index)
+            start, end = interface.range.unpack(ch)
+            owner = ch.owner if ch.flags & idaapi.FUNC_TAIL else start
+            items.append((start, end, owner, idaapi.segtype(start) == idaapi.SEG_XTRN))
+        items.sort()
+
+        cls.__table__ = res = [ builtins.list(column) for column in builtins.zip(*items) ] if items else [[], [], [], []]
+        return res
+
+    @classmethod
+    def _index(cls, ea):
+        '''Return the row of the chunk table containing the address `ea` or ``None`` if it is not within a chunk.'''
+        starts, ends, _, _ = cls._table()
+        index = bisect.bisect_right(starts, ea) - 1
+        return index if index >= 0 and ea < ends[index] else None
+
+    @classmethod
+    def _insert(cls, start, end, owner):
+        '''Add the chunk from `start` to `end` owned by the function at `owner` to the chunk table.'''
+        if cls.__table__ is None:
+            return
+        starts, ends, owners, external = cls.__table__
+        index = bisect.bisect_left(starts, start)
+        if index < len(starts) and starts[index] == start:
+            [ column.pop(index) for column in cls.__table__ ]
+        [ column.insert(index, value) for column, value in zip(cls.__table__, (start, end, owner, idaapi.segtype(start) == idaapi.SEG_XTRN)) ]
+
+    @classmethod
+    def _remove(cls, start):
+        '''Remove the chunk at `start` from the chunk table and return whether it was found.'''
+        if cls.__table__ is None:
+            return True
+        starts, _, _, _ = cls.__table__
+        index = bisect.bisect_left(starts, start)
+        if index < len(starts) and starts[index] == start:
+            [ column.pop(index) for column in cls.__table__ ]
+            return True
+        cls.__table__ = None
+        return False
+
+    @classmethod
+    def _update(cls, ea, **boundaries):
+        """Update the boundaries of the chunk at `ea` within the chunk table with the specified `boundaries`.
+
+        If the keyword `owner` is specified, then assign it to each chunk
+        that was owned by the function at `ea`.
+        """
+        if cls.__table__ is None:
+            return
+        starts, ends, owners, _ = cls.__table__
+        index = bisect.bisect_left(starts, ea)
+        if not (index < len(starts) and starts[index] == ea):
+            cls.__table__ = None
+            return
+
+        # if the owner is changing, then we need to update every chunk that it owns
+        if 'owner' in boundaries:
+            owner = boundaries['owner']
+            [ operator.setitem(owners, row, owner) for row, item in enumerate(owners) if item == ea ]
+
+        end, owner = boundaries.get('end', ends[index]), owners[index]
+        cls._remove(ea), cls._insert(boundaries.get('start', ea), end, owner)
+
+    @classmethod
+    def _discard(cls, owner):
+        '''Remove every chunk owned by the function at `owner` from the chunk table.'''
+        if cls.__table__ is None:
+            return
+        rows = [ row for row, item in enumerate(cls.__table__[2]) if item == owner ]
+        [ column.pop(row) for row in reversed(rows) for column in cls.__table__ ]
+
+    @classmethod
+    def _sync(cls, owner):
+        '''Replace the rows of the chunk table that are owned by the function at `owner` with the chunks that the function currently has.'''
+        if cls.__table__ is None:
+            return
+        cls._discard(owner)
+        fn = idaapi.get_func(owner)
+        if fn is None:
+            return
+        [ cls._insert(start, end, owner) for start, end in cls(fn) ]
+
+    @utils.multicase()
+    @classmethod
+    def invalidate(cls):
+        '''Discard the chunk table so that it will be rebuilt the next time that it is needed.'''
+        cls.__table__ = None
+
+    @utils.multicase()
+    @classmethod
+    def owner(cls):
+        '''Return the address of the function that owns the chunk at the current address.'''
+        return cls.owner(ui.current.address())
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def owner(cls, ea):
+        '''Return the address of the function that owns the chunk containing the address `ea`.'''
+        ea = interface.address.within(ea)
+        index = cls._index(ea)
+        if index is None:
+            raise E.FunctionNotFoundError(u"{:s}.owner({:#x}) : Unable to locate a function chunk at the specified address.".format('.'.join((__name__, cls.__name__)), ea))
+        _, _, owners, _ = cls._table()
+        return owners[index]
+
 iterate = utils.alias(chunks.iterate, 'chunks')
 register = utils.alias(chunks.register, 'chunks')
 
@@ -590,7 +725,11 @@ def within():
 def within(ea):
     '''Return true if the address `ea` is within a function.'''
     ea = interface.address.within(ea)
-    return idaapi.get_func(ea) is not None and idaapi.segtype(ea) != idaapi.SEG_XTRN
+    index = chunks._index(ea)
+    if index is None:
+        return False
+    _, _, _, external = chunks._table()
+    return not external[index]
 
 # Checks if ea is contained in function or in any of its chunks
 @utils.multicase()
@@ -626,11 +765,18 @@ class blocks(object):
     often, these functions are exported globally as ``function.flowchart``
     and ``function.digraph``.
 
+    The basic blocks of the most recently used functions are cached along
+    with their boundaries and edges so that locating the block for an
+    address does not require the flowchart to be rebuilt. This cache is
+    discarded by the hooks whenever the boundaries of a function change,
+    but can also be discarded explicitly with ``function.blocks.invalidate``.
+
     Some examples of this namespace's usage::
 
         > for bb in function.blocks(): ...
         > chart = function.blocks.flowchart(ea)
         > G = function.blocks.graph()
+        > function.blocks.invalidate(ea)
 
     """
     @utils.multicase()
@@ -664,8 +810,8 @@ class blocks(object):
     def iterate(cls, func):
         '''Returns each ``idaapi.BasicBlock`` for the function `func`.'''
         fn = by(func)
-        fc = idaapi.FlowChart(f=fn, flags=idaapi.FC_PREDS)
-        for bb in fc:
+        _, items, _, _ = cls._graph(fn)
+        for bb in items:
             yield bb
         return
 
@@ -685,11 +831,91 @@ class blocks(object):
     def at(cls, func, ea):
         '''Return the ``idaapi.BasicBlock`` in function `func` at address `ea`.'''
         fn = by(func)
-        for bb in blocks.iterate(fn):
-            if interface.range.within(ea, bb):
-                return bb
+        _, items, _, _ = cls._graph(fn)
+        index = cls._index(fn, ea)
+        if index is None:
+            raise E.AddressNotFoundError(u"{:s}.at({:#x}, {:#x}) : Unable to locate `idaapi.BasicBlock` for address {:#x} in function {:#x}.".format('.'.join((__name__, cls.__name__)), interface.range.start(fn), ea, ea, interface.range.start(fn)))
+        return items[index]
+
+    ## cache of the basic-block graph for each function
+    # __cache__[fn.start_ea] = (flowchart, [idaapi.BasicBlock, ...], (starts, ends, order), (predecessors, successors))
+
+    MAXIMUM = 0x40
+    __cache__ = collections.OrderedDict()
+
+    @classmethod
+    def _graph(cls, fn):
+        """Return the basic-block graph for the function `fn` building it with ``idaapi.FlowChart`` if it has not been cached.
+
+        The graph is a tuple composed of the flowchart, the list of each
+        ``idaapi.BasicBlock`` in the order of the flowchart, a tuple of the
+        sorted starts and ends of each block along with their index, and a
+        tuple of the predecessors and successors of each block as indices.
+        """
+        key, cache = interface.range.start(fn), cls.__cache__
+        if key in cache:
+            res = cache.pop(key)
+
+        else:
+            fc = idaapi.FlowChart(f=fn, flags=idaapi.FC_PREDS)
+            items = [ bb for bb in fc ]
+            position = { bb.id : index for index, bb in enumerate(items) }
+
+            # sort the boundaries of each block so that they can be bisected
+            order = sorted(six.moves.range(len(items)), key=lambda index: interface.range.bounds(items[index]))
+            starts, ends = [ interface.range.start(items[index]) for index in order ], [ interface.range.end(items[index]) for index in order ]
+
+            # walk the edges of each block only once
+            predecessors = [ [ position[bb.id] for bb in item.preds() ] for item in items ]
+            successors = [ [ position[bb.id] for bb in item.succs() ] for item in items ]
+            res = fc, items, (starts, ends, order), (predecessors, successors)
+        cache[key] = res
+
+        # evict the least recently used functions
+        while len(cache) > max(1, cls.MAXIMUM):
+            cache.popitem(last=False)
+        return res
+
+    @classmethod
+    def _index(cls, fn, ea):
+        '''Return the index of the basic block in the graph of function `fn` that contains the address `ea` or ``None`` if it was not found.'''
+        _, items, (starts, ends, order), _ = cls._graph(fn)
+        index = bisect.bisect_right(starts, ea) - 1
+        if index >= 0 and starts[index] <= ea < ends[index]:
+            return order[index]
+
+        # fall back to checking every block in case any of them overlap
+        iterable = (index for index, bb in enumerate(items) if interface.range.within(ea, bb))
+        return next(iterable, None)
+
+    @utils.multicase()
+    @classmethod
+    def invalidate(cls):
+        '''Discard the basic-block graph of every function that has been cached.'''
+        count = len(cls.__cache__)
+        cls.__cache__.clear()
+        return count
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def invalidate(cls, ea):
+        '''Discard the cached basic-block graph of the function that starts at or contains the address `ea`.'''
+        fn = idaapi.get_func(ea)
+        keys = {ea} if fn is None else {ea, interface.range.start(fn)}
+        return len([ cls.__cache__.pop(key) for key in keys if key in cls.__cache__ ])
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def invalidate(cls, start, end):
+        '''Discard the cached basic-block graph of every function that contains the address `start` or has a block within the addresses from `start` to `end`.'''
+        fn = idaapi.get_func(start)
+        keys = {start} if fn is None else {start, interface.range.start(fn)}
+
+        # the blocks don't overlap, so the last block starting before `end` is the only one to check
+        for key, (_, _, (starts, ends, _), _) in cls.__cache__.items():
+            index = bisect.bisect_left(starts, end) - 1
+            if index >= 0 and ends[index] > start:
+                keys.add(key)
             continue
-        raise E.AddressNotFoundError(u"{:s}.at({:#x}, {:#x}) : Unable to locate `idaapi.BasicBlock` for address {:#x} in function {:#x}.".format('.'.join((__name__, cls.__name__)), interface.range.start(fn), ea, ea, interface.range.start(fn)))
+        return len([ cls.__cache__.pop(key) for key in keys if key in cls.__cache__ ])
 
     @utils.multicase()
     @classmethod
@@ -1061,8 +1287,12 @@ class block(object):
     @classmethod
     def before(cls, ea):
         '''Return the addresses of all the instructions that branch to the basic block at address `ea`.'''
-        res = blocks.at(ea)
-        return cls.before(res)
+        fn = by_address(ea)
+        _, items, _, (predecessors, _) = blocks._graph(fn)
+        index = blocks._index(fn, ea)
+        if index is None:
+            return cls.before(blocks.at(fn, ea))
+        return [ database.address.prev(interface.range.end(items[item])) for item in predecessors[index] ]
     @utils.multicase(bounds=types.TupleType)
     @classmethod
     def before(cls, bounds):
@@ -1085,8 +1315,12 @@ class block(object):
     @classmethod
     def after(cls, ea):
         '''Return the addresses of all the instructions that the basic block at address `ea` leaves to.'''
-        bb = cls.at(ea)
-        return cls.after(bb)
+        fn = by_address(ea)
+        _, items, _, (_, successors) = blocks._graph(fn)
+        index = blocks._index(fn, ea)
+        if index is None:
+            return cls.after(blocks.at(fn, ea))
+        return [ interface.range.start(items[item]) for item in successors[index] ]
     @utils.multicase(bounds=types.TupleType)
     @classmethod
     def after(cls, bounds):
@@ -1124,24 +1358,24 @@ class block(object):
         left, right = interface.range.unpack(bb)
         return database.address.iterate(left, right)
 
-    @utils.multicase(reg=(basestring, interface.register_t))
+    @utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, reg, *regs, **modifiers):
         '''Yield each `(address, opnum, state)` within the current block that uses `reg` or any one of the registers in `regs`.'''
         return cls.register(ui.current.address(), reg, *regs, **modifiers)
-    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t))
+    @utils.multicase(ea=six.integer_types, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, ea, reg, *regs, **modifiers):
         '''Yield each `(address, opnum, state)` within the block containing `ea` that uses `reg` or any one of the registers in `regs`.'''
         blk = blocks.at(ea)
         return cls.register(blk, reg, *regs, **modifiers)
-    @utils.multicase(bounds=types.TupleType, reg=(basestring, interface.register_t))
+    @utils.multicase(bounds=types.TupleType, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, bounds, reg, *regs, **modifiers):
         '''Yield each `(address, opnum, state)` within the block identified by `bounds` that uses `reg` or any one of the registers in `regs`.'''
         bb = cls.at(bounds)
         return cls.register(bb, reg, *regs, **modifiers)
-    @utils.multicase(bb=idaapi.BasicBlock, reg=(basestring, interface.register_t))
+    @utils.multicase(bb=idaapi.BasicBlock, reg=(basestring, interface.register_t, interface.regmask_t))
     @classmethod
     def register(cls, bb, reg, *regs, **modifiers):
         """Yield each `(address, opnum, state)` within the block `bb` that uses `reg` or any one of the registers in `regs`.
@@ -1650,8 +1884,13 @@ def select(func, **boolean):
     # collect the keys to query as specified by the user
     Or, And = (set(iter(boolean.get(B, ()))) for B in ('Or', 'And'))
 
-    # walk through every tagged address and cross-check it against query
-    for ea in internal.comment.contents.address(interface.range.start(fn)):
+    # use the tag index to find the addresses that could match the query, and
+    # fall back to walking through every tagged address if it can't be used
+    res = internal.comment.index.select(interface.range.start(fn), And=And, Or=Or)
+    iterable = internal.comment.contents.address(interface.range.start(fn)) if res is None else res
+
+    # walk through every candidate and cross-check it against query
+    for ea in iterable:
         ui.navigation.analyze(ea)
         res, d = {}, database.tag(ea)
 
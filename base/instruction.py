@@ -22,6 +22,13 @@ take an address and return an ``idaapi.insn_t``. To get an operand type
 (``idaapi.op_t``), a user can use ``instruction.operand``.  This will
 take an address and an operand index and return the desired type.
 
+To decode every instruction within a function or a range of addresses
+at once, ``instruction.decode_range`` can be used. This returns the
+instructions and their operands as columns which can be filtered
+without having to decode each operand individually. As the columns
+are usually an ``array.array``, they can be wrapped without copying
+(with ``numpy.frombuffer`` for example).
+
 Some globals are also defined for the given architecture which
 can be used to query or access the registers that are currently
 available. Once IDA has determined the architecture for the database
@@ -42,6 +49,7 @@ from six.moves import builtins
 
 import functools, operator, itertools, types
 import logging, collections
+import array as _array
 
 import database, function
 import structure, enumeration
@@ -93,14 +101,94 @@ class __optype__(object):
         return idaapi.get_dtype_size(op.dtype)
 
 ## general functions
-@utils.multicase()
-def at():
-    '''Returns the ``idaapi.insn_t`` instance at the current address.'''
-    return at(ui.current.address())
-@utils.multicase(ea=six.integer_types)
-def at(ea):
-    '''Returns the ``idaapi.insn_t`` instance at the address `ea`.'''
-    ea = interface.address.inside(ea)
+class cache(object):
+    """
+    This namespace is for managing the cache of the instructions that
+    have been decoded by this module. Each instruction is decoded once
+    and then shared by all of the ``op_`` and ``ops_`` functions along
+    with its operands until it is either evicted or modified. The values
+    of the operands are not cached as they also depend on things such as
+    the sign of the operand or the contents of a literal pool.
+
+    The cache is invalidated by the hooks whenever the bytes at an
+    address are patched or the type of an address is changed. The
+    number of hits and misses can be used to tune the maximum number
+    of instructions that are cached.
+
+    Some examples of this namespace's usage::
+
+        > print instruction.cache.statistics()
+        > instruction.cache.invalidate(ea)
+        > instruction.cache.MAXIMUM = 0x1000
+
+    """
+
+    ## cache of each decoded instruction
+    # __cache__[ea] = (insn_t, (op_t, ...))
+
+    MAXIMUM, LENGTH = 0x400, 0x10
+    __cache__, __counter__ = collections.OrderedDict(), collections.Counter()
+
+    @classmethod
+    def decode(cls, ea):
+        """Return the ``idaapi.insn_t`` and the ``idaapi.op_t`` for each operand of the instruction at the address `ea`.
+
+        The instances that are returned are owned by the cache and should
+        not be modified.
+        """
+        cache = cls.__cache__
+        if ea in cache:
+            cls.__counter__['hit'] += 1
+            res = cache.pop(ea)
+        else:
+            cls.__counter__['miss'] += 1
+            res = __decode__(ea)
+        cache[ea] = res
+
+        # evict the least recently used instructions
+        while len(cache) > max(1, cls.MAXIMUM):
+            cache.popitem(last=False)
+        return res
+
+    @utils.multicase()
+    @classmethod
+    def invalidate(cls):
+        '''Discard every instruction that has been decoded.'''
+        count = len(cls.__cache__)
+        cls.__cache__.clear()
+        return count
+    @utils.multicase(ea=six.integer_types)
+    @classmethod
+    def invalidate(cls, ea):
+        '''Discard the decoded instruction that overlaps the address `ea`.'''
+        return cls.invalidate(ea, ea + 1)
+    @utils.multicase(start=six.integer_types, end=six.integer_types)
+    @classmethod
+    def invalidate(cls, start, end):
+        '''Discard any of the decoded instructions that overlap the addresses from `start` to `end`.'''
+        cache = cls.__cache__
+
+        # an instruction can only overlap if it starts within its maximum length
+        if end - start + cls.LENGTH < len(cache):
+            candidates = [ ea for ea in six.moves.range(max(0, start - cls.LENGTH + 1), end) if ea in cache ]
+        else:
+            candidates = [ ea for ea in cache ]
+
+        items = [ ea for ea in candidates if ea < end and start < ea + cache[ea][0].size ]
+        [ cache.pop(ea) for ea in items ]
+        return len(items)
+
+    @classmethod
+    def statistics(cls):
+        '''Return a dictionary containing the number of hits, misses, and instructions that are currently cached.'''
+        res = dict(cls.__counter__)
+        res.setdefault('hit', 0), res.setdefault('miss', 0)
+        res['size'], res['maximum'] = len(cls.__cache__), cls.MAXIMUM
+        return res
+    stats = utils.alias(statistics, 'cache')
+
+def __decode__(ea):
+    '''Decode the instruction at the address `ea` and return a copy of its ``idaapi.insn_t`` along with a copy of the ``idaapi.op_t`` for each of its operands.'''
     if not database.type.is_code(ea):
         raise E.InvalidTypeOrValueError(u"{:s}.at({:#x}) : Unable to decode a non-instruction at specified address.".format(__name__, ea))
 
@@ -109,17 +197,54 @@ def at(ea):
     if hasattr(idaapi, 'cmd'):
         length = idaapi.decode_insn(ea)
         if idaapi.__version__ < 7.0:
-            return idaapi.cmd.copy()
+            insn = idaapi.cmd.copy()
+        else:
+            insn = idaapi.insn_t()
+            insn.assign(idaapi.cmd)
 
-        tmp = idaapi.insn_t()
-        tmp.assign(idaapi.cmd)
-        return tmp
+        # take operands until we encounter an idaapi.o_void
+        iterable = itertools.takewhile(utils.fcompose(operator.attrgetter('type'), functools.partial(operator.ne, idaapi.o_void)), insn.Operands)
+
+        # if we're using IDA < 7.0, then make copies of each operand
+        if idaapi.__version__ < 7.0:
+            return insn, tuple(op.copy() for op in iterable)
+
+        # otherwise, we need to make an instance of it and then assign to make a copy
+        iterable = ((idaapi.op_t(), op) for op in iterable)
+        return insn, tuple([n.assign(op), n][1] for n, op in iterable)
 
     # Otherwise we can just use the API as we see fit
-    res = idaapi.insn_t()
-    length = idaapi.decode_insn(res, ea)
+    insn = idaapi.insn_t()
+    length = idaapi.decode_insn(insn, ea)
+
+    # apparently idaapi is not increasing a reference count for our operands, so we
+    # need to make a copy of them quickly before we access them.
+    operands = [idaapi.op_t() for index in six.moves.range(idaapi.UA_MAXOP)]
+    [ op.assign(insn.ops[index]) for index, op in enumerate(operands)]
+
+    # now we can just fetch them until idaapi.o_void
+    iterable = itertools.takewhile(utils.fcompose(operator.attrgetter('type'), functools.partial(operator.ne, idaapi.o_void)), operands)
+    return insn, tuple(iterable)
+
+def __copy__(object, type):
+    '''Return a copy of the ``idaapi.insn_t`` or ``idaapi.op_t`` in `object` by instantiating `type` if necessary.'''
+    if idaapi.__version__ < 7.0:
+        return object.copy()
+    res = type()
+    res.assign(object)
     return res
 
+@utils.multicase()
+def at():
+    '''Returns the ``idaapi.insn_t`` instance at the current address.'''
+    return at(ui.current.address())
+@utils.multicase(ea=six.integer_types)
+def at(ea):
+    '''Returns the ``idaapi.insn_t`` instance at the address `ea`.'''
+    ea = interface.address.inside(ea)
+    insn, _ = cache.decode(ea)
+    return __copy__(insn, idaapi.insn_t)
+
 @utils.multicase()
 def size():
     '''Returns the length of the instruction at the current address.'''
@@ -137,7 +262,8 @@ def feature():
 def feature(ea):
     '''Return the feature bitmask for the instruction at the address `ea`.'''
     if database.is_code(ea):
-        return at(ea).get_canon_feature()
+        insn, _ = cache.decode(interface.address.inside(ea))
+        return insn.get_canon_feature()
     return None
 
 @utils.multicase(opnum=six.integer_types)
@@ -170,33 +296,8 @@ def operands():
 @utils.multicase(ea=six.integer_types)
 def operands(ea):
     '''Returns all of the ``idaapi.op_t`` instances for the instruction at the address `ea`.'''
-    insn = at(ea)
-
-    # if we're in compatibility mode, then old-fashioned IDA requires us to copy
-    # our operands into our new types.
-    if hasattr(idaapi, 'cmd'):
-
-        # take operands until we encounter an idaapi.o_void
-        iterable = itertools.takewhile(utils.fcompose(operator.attrgetter('type'), functools.partial(operator.ne, idaapi.o_void)), insn.Operands)
-
-        # if we're using IDA < 7.0, then make copies of each instruction and return it
-        if idaapi.__version__ < 7.0:
-            return tuple(op.copy() for op in iterable)
-
-        # otherwise, we need to make an instance of it and then assign to make a copy
-        iterable = ((idaapi.op_t(), op) for op in iterable)
-        return tuple([n.assign(op), n][1] for n, op in iterable)
-
-    # apparently idaapi is not increasing a reference count for our operands, so we
-    # need to make a copy of them quickly before we access them.
-    operands = [idaapi.op_t() for index in six.moves.range(idaapi.UA_MAXOP)]
-    [ op.assign(insn.ops[index]) for index, op in enumerate(operands)]
-
-    # now we can just fetch them until idaapi.o_void
-    iterable = itertools.takewhile(utils.fcompose(operator.attrgetter('type'), functools.partial(operator.ne, idaapi.o_void)), operands)
-
-    # and return it as a tuple
-    return tuple(iterable)
+    _, res = cache.decode(interface.address.inside(ea))
+    return tuple(__copy__(op, idaapi.op_t) for op in res)
 
 @utils.multicase(opnum=six.integer_types)
 def operand(opnum):
@@ -205,24 +306,11 @@ def operand(opnum):
 @utils.multicase(ea=six.integer_types, opnum=six.integer_types)
 def operand(ea, opnum):
     '''Returns the ``idaapi.op_t`` for the operand `opnum` belonging to the instruction at the address `ea`.'''
-    insn = at(ea)
-
-    # If we're using backwards-compatiblity mode then we need to assign the
-    # operand into our op_t.
-    if hasattr(idaapi, 'cmd'):
-        # IDA < 7.0 means we can just call .copy() to duplicate it
-        if idaapi.__version__ < 7.0:
-            return insn.Operands[opnum].copy()
-
-        # Otherwise we'll need to instantiate it, and then .assign() into it
-        res = idaapi.op_t()
-        res.assign(insn.Operands[opnum])
-        return res
+    insn, _ = cache.decode(interface.address.inside(ea))
 
-    # Otherwise we need to make a copy of it because IDA will crash if we don't
-    res = idaapi.op_t()
-    res.assign(insn.ops[opnum])
-    return res
+    # We need to make a copy of the operand because IDA will crash if we don't
+    res = insn.Operands[opnum] if hasattr(idaapi, 'cmd') else insn.ops[opnum]
+    return __copy__(res, idaapi.op_t)
 
 ## functions vs all operands of an insn
 @utils.multicase()
@@ -232,8 +320,8 @@ def ops_count():
 @utils.multicase(ea=six.integer_types)
 def ops_count(ea):
     '''Returns the number of operands of the instruction at the address `ea`.'''
-    ea = interface.address.inside(ea)
-    return len(operands(ea))
+    _, res = cache.decode(interface.address.inside(ea))
+    return len(res)
 
 @utils.multicase()
 def ops_repr():
@@ -330,14 +418,14 @@ def ops_constant(ea):
     return tuple(opnum for opnum, value in enumerate(ops_value(ea)) if isinstance(value, six.integer_types))
 ops_const = utils.alias(ops_constant)
 
-@utils.multicase(reg=(basestring, interface.register_t))
+@utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
 def ops_register(reg, *regs, **modifiers):
     """Yields the index of each operand in the instruction at the current address that uses `reg` or any one of the registers in `regs`.
 
     If the keyword `write` is true, then only return the result if it's writing to the register.
     """
     return ops_register(ui.current.address(), reg, *regs, **modifiers)
-@utils.multicase(reg=(basestring, interface.register_t))
+@utils.multicase(reg=(basestring, interface.register_t, interface.regmask_t))
 def ops_register(ea, reg, *regs, **modifiers):
     """Yields the index of each operand in the instruction at address `ea` that uses `reg` or any one of the registers in `regs`.
 
@@ -349,6 +437,98 @@ def ops_register(ea, reg, *regs, **modifiers):
     return tuple(filter(functools.partial(uses, ea), iterops(ea)))
 ops_reg = ops_regs = utils.alias(ops_register)
 
+## functions for decoding all of the instructions within a range into columns
+class instructions_t(interface.namedtypedtuple):
+    """
+    A tuple of columns containing each instruction that was decoded by
+    ``instruction.decode_range``. Each column is an ``array.array`` and
+    each row represents a single instruction. If there isn't a typecode
+    that is large enough for an address, then the `address` column is a
+    list instead.
+
+    The `itype` column contains the mnemonic id of each instruction, and
+    the `operands` column contains the row of its first operand.
+    """
+    _fields = ('address', 'size', 'itype', 'feature', 'count', 'operands')
+    _types = ((_array.array, builtins.list),) + (_array.array,) * (len(_fields) - 1)
+
+class operands_t(interface.namedtypedtuple):
+    """
+    A tuple of columns containing each operand that was decoded by
+    ``instruction.decode_range``. Each column is an ``array.array`` and
+    each row represents a single operand.
+
+    The `index` column contains the row of the instruction that owns the
+    operand. The `register` column contains the index of the register
+    that is used by the operand (comparable to ``register_t.id``), and
+    the `state` column has bit 0 set if the operand is read from and
+    bit 1 set if it is written to. Like ``instructions_t``, the `value`
+    and `address` columns are a list if there isn't a typecode that is
+    large enough for an address.
+    """
+    _fields = ('index', 'opnum', 'type', 'dtype', 'register', 'value', 'address', 'state')
+    _types = (_array.array,) * 5 + ((_array.array, builtins.list),) * 2 + (_array.array,)
+
+def __columns__(iterable):
+    '''Decode the instruction at each address in `iterable` and return their instructions and operands as a tuple of columns.'''
+    get_dtype_attribute = operator.attrgetter('dtyp' if idaapi.__version__ < 7.0 else 'dtype')
+    read, write = ops_state.read, ops_state.write
+
+    # The size of each typecode depends on the platform, and Python 2 doesn't
+    # have array.array('Q'). So pick the first one that can hold an address
+    # for the database, and use a list if there aren't any.
+    itemsizes = {}
+    for ch in 'ILQ':
+        try:
+            itemsizes[ch] = _array.array(ch).itemsize
+        except ValueError:
+            pass
+        continue
+    wide = builtins.next((ch for ch in 'ILQ' if itemsizes.get(ch, 0) >= database.config.bits() // 8), None)
+    column = lambda typecode: _array.array(typecode) if typecode else builtins.list()
+
+    insns = instructions_t(*(column(typecode) for typecode in (wide, 'H', 'H', 'L', 'B', 'L')))
+    ops = operands_t(*(column(typecode) for typecode in ('L', 'B', 'B', 'B', 'H', wide, wide, 'B')))
+
+    # decode each instruction directly so that we don't evict the instructions that are cached
+    for ea in iterable:
+        insn, operands = __decode__(ea)
+        feature = insn.get_canon_feature()
+        [ column.append(value) for column, value in zip(insns, (ea, insn.size, insn.itype, feature, len(operands), len(ops.index))) ]
+
+        # now we can add each of the operands that belong to it
+        row = len(insns.address) - 1
+        for opnum, op in enumerate(operands):
+            dtype = get_dtype_attribute(op)
+            state = (1 if feature & read[opnum] else 0) | (2 if feature & write[opnum] else 0)
+            [ column.append(value) for column, value in zip(ops, (row, opnum, op.type, dtype if isinstance(dtype, six.integer_types) else six.byte2int(dtype), op.reg, op.value, op.addr, state)) ]
+        continue
+    return insns, ops
+
+@utils.multicase()
+def decode_range():
+    '''Decode every instruction within the current function and return their instructions and operands as a tuple of columns.'''
+    return decode_range(ui.current.address())
+@utils.multicase(ea=six.integer_types)
+def decode_range(ea):
+    """Decode every instruction within the function containing the address `ea` and return their instructions and operands as a tuple of columns.
+
+    The result is a tuple composed of an ``instructions_t`` and an
+    ``operands_t``.
+    """
+    fn = function.by_address(ea)
+    iterable = (database.address.heads(start, end, code=True) for start, end in function.chunks(fn))
+    return __columns__(itertools.chain(*iterable))
+@utils.multicase(start=six.integer_types, end=six.integer_types)
+def decode_range(start, end):
+    """Decode every instruction from the address `start` to `end` and return their instructions and operands as a tuple of columns.
+
+    The result is a tuple composed of an ``instructions_t`` and an
+    ``operands_t``.
+    """
+    start, end = interface.address.within(start, end)
+    return __columns__(database.address.heads(start, end, code=True))
+
 ## functions vs a specific operand of an insn
 @utils.multicase(opnum=six.integer_types)
 def op_repr(opnum):
@@ -436,8 +616,8 @@ def op(opnum):
 @utils.multicase(ea=six.integer_types, opnum=six.integer_types)
 def op(ea, opnum):
     '''Decodes the operand `opnum` for the instruction at the address `ea`.'''
-    res = operand(ea, opnum)
-    return __optype__.decode(ea, res)
+    ea = interface.address.inside(ea)
+    return __optype__.decode(ea, operand(ea, opnum))
 op_value = op_decode = utils.alias(op)
 
 ## older typeinfo stuff
@@ -1671,8 +1851,9 @@ def __newprc__(id):
         iogging.warn("{:s} : IDP_Hooks.newprc({:d}) : Unsupported processor type {:d} was specified. Tools that use the instruction module might not work properly.".format(__name__, id, plfm))
         return
 
-    # assign our required globals
+    # assign our required globals and discard anything decoded by the previous processor
     m.architecture, m.register = res, res.r
+    cache.invalidate()
 
     # assign some aliases so that its much shorter to type
     m.arch, m.reg = m.architecture, m.register
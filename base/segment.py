@@ -260,14 +260,22 @@ def read():
     seg = ui.current.segment()
     if seg is None:
         raise E.SegmentNotFoundError(u"{:s}.read() : Unable to locate the current segment.".format(__name__))
-    return get_bytes(interface.range.start(seg), interface.range.size(seg))
+
+    # use the segment image if it has been enabled
+    start, end = interface.range.unpack(seg)
+    res = database.image.view(start, end) if database.image.ENABLED else None
+    return get_bytes(start, end - start) if res is None else res.tobytes()
 @utils.multicase()
 def read(segment):
     '''Return the contents of the segment identified by `segment`.'''
     get_bytes = idaapi.get_many_bytes if idaapi.__version__ < 7.0 else idaapi.get_bytes
 
     seg = by(segment)
-    return get_bytes(interface.range.start(seg), interface.range.size(seg))
+
+    # use the segment image if it has been enabled
+    start, end = interface.range.unpack(seg)
+    res = database.image.view(start, end) if database.image.ENABLED else None
+    return get_bytes(start, end - start) if res is None else res.tobytes()
 string = utils.alias(read)
 
 @utils.multicase()
@@ -797,8 +797,14 @@ class members_t(object):
         > iterable = st.members.iterate(like='p_*')
         > result = st.members.by(offset=0x2a)
 
+    The index of each member is kept in a table keyed by its identifier so
+    that a member that was found by its name, offset, or identifier does
+    not require checking every member. Each index that is taken from the
+    table is checked against the structure, and the table is rebuilt if
+    it is found to be out of date.
+
     """
-    __slots__ = ('__owner', 'baseoffset')
+    __slots__ = ('__owner', 'baseoffset', '__table')
 
     # members state
     @property
@@ -812,6 +818,7 @@ class members_t(object):
     def __init__(self, owner, baseoffset=0):
         self.__owner = owner
         self.baseoffset = baseoffset
+        self.__table = None
 
     def __getstate__(self):
         return (self.owner.name, self.baseoffset, map(self.__getitem__, six.moves.range(len(self))))
@@ -829,6 +836,7 @@ class members_t(object):
         # assign the properties for our new member using the instance we figured out
         self.baseoffset = baseoffset
         self.__owner = __instance__(identifier, offset=baseoffset)
+        self.__table = None
         return
 
     # fetching members
@@ -861,10 +869,15 @@ class members_t(object):
         if not hasattr(member, 'id'):
             raise E.InvalidParameterError(u"{:s}.instance({!r}).members.index({!r}) : An invalid type ({!r}) was specified for the member to search for.".format(__name__, self.owner.name, member, member.__class__))
 
-        for i in six.moves.range(self.owner.ptr.memqty):
-            if member.id == self[i].id:
-                return i
-            continue
+        # try the table first, and then rebuild it if it was out of date
+        sptr = self.owner.ptr
+        i = None if self.__table is None else self.__table.get(member.id, None)
+        if i is None or i >= sptr.memqty or sptr.get_member(i).id != member.id:
+            self.__table = table = { sptr.get_member(i).id : i for i in six.moves.range(sptr.memqty) }
+            i = table.get(member.id, None)
+
+        if i is not None:
+            return i
         raise E.MemberNotFoundError(u"{:s}.instance({!r}).members.index({!s}) : The requested member is not in the members list.".format(__name__, self.owner.name, "{:#x}".format(member.id) if isinstance(member, (member_t, idaapi.member_t)) else "{!r}".format(member)))
 
     __member_matcher = utils.matcher()
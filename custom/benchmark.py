@@ -0,0 +1,338 @@
+"""
+Benchmark module
+
+This module exposes a number of microbenchmarks that can be used to
+measure the different parts of the plugin within the current database.
+Each benchmark compares the implementation that is currently used by
+the plugin against the original implementation that it replaced so
+that a user can verify that the replacement is actually faster when
+run against their own database.
+
+To compare the dispatch of a multicased function at the current address::
+
+    > custom.benchmark.multicase()
+
+To compare the dispatch for a specific address with a number of iterations::
+
+    > custom.benchmark.multicase(ea, 1000000)
+
+To verify the comment codec against its reference implementation and then
+compare them using the comments within the current function::
+
+    > custom.benchmark.fuzz_comment(100000)
+    > custom.benchmark.comment(func.iterate(), 100)
+
+To compare the throughput of the formats used by the tagcache::
+
+    > custom.benchmark.tagcache()
+
+To compare the original walk for reading the global tags against the
+candidates from the tagcache and the candidates from scanning the flags::
+
+    > custom.benchmark.globals()
+
+To compare looking up the index of every member within the widest
+structure and the largest frame in the database::
+
+    > custom.benchmark.members()
+
+To compare decoding a table of pointers at the current address::
+
+    > custom.benchmark.integers()
+
+"""
+
+import six, sys, logging
+import functools, operator, itertools, types
+import heapq, timeit, random
+import idaapi
+
+import database as db, function as func, structure as struc, ui
+import internal
+
+output = sys.stderr
+
+### utilities
+def measure(callable, count):
+    '''Return the number of seconds that it takes to execute `callable` for `count` number of times.'''
+    timer = timeit.default_timer
+    start = timer()
+    for _ in six.moves.range(count):
+        callable()
+    return timer() - start
+
+def report(name, count, results):
+    '''Emit the timings in `results` for the benchmark `name` that was run `count` number of times.'''
+    (_, baseline), rest = results[0], results[1:]
+    six.print_(u"{:s}: {:d} iteration{:s}".format(name, count, '' if count == 1 else 's'), file=output)
+    for description, seconds in results:
+        rate = count / seconds if seconds else float('inf')
+        speedup = baseline / seconds if seconds else float('inf')
+        six.print_(u"    {:<32s} : {:.6f}s ({:.0f}/s) {:.2f}x".format(description, seconds, rate, speedup), file=output)
+    return dict(results)
+
+### multicase
+def multicase(ea=None, count=100000):
+    """Compare the dispatch of a multicased function using ``database.type.is_code`` at the address `ea`.
+
+    The original dispatch resolves the case by scanning the entire heap of
+    cases for every call, whereas the current dispatch uses a decision table.
+    Both the resolution of the case and the entire call are measured.
+    """
+    ea = ui.current.address() if ea is None else ea
+    F = internal.utils.multicase.ex_function(db.type.is_code)
+    cache, dispatch = (getattr(F, name) for name in (internal.utils.multicase.cache_name, internal.utils.multicase.dispatch_name))
+    arguments, keywords = (ea,), {}
+
+    # this is the way that the original wrapper resolved the case to call
+    def linear():
+        heap = [res for _, res in heapq.nsmallest(len(cache), cache)]
+        f, _ = internal.utils.multicase.match((arguments[:], keywords), heap)
+        return f
+    def compiled():
+        return dispatch(arguments, keywords)
+
+    # double-check that both of them resolve to the very same case
+    if linear() is not compiled():
+        raise AssertionError(u"{:s}.multicase({:#x}, {:d}) : The compiled dispatch resolved a different case ({!r}) than the original ({!r}).".format('.'.join(('custom', __name__)), ea, count, compiled(), linear()))
+
+    # now we can measure them
+    f = compiled()
+    results = [
+        ('dispatch (linear)', measure(linear, count)),
+        ('dispatch (compiled)', measure(compiled, count)),
+        ('call (linear)', measure(lambda: linear()(*arguments), count)),
+        ('call (compiled)', measure(lambda: db.type.is_code(*arguments), count)),
+        ('call (direct)', measure(lambda: f(*arguments), count)),
+    ]
+    return report(u"database.type.is_code({:#x})".format(ea), count, results)
+
+### comment encoding and decoding
+def reference_decode(data, default=''):
+    '''Decode the comment in `data` with the reference implementation from ``internal.comment.tag``.'''
+    res = {}
+    for line in (data or '').split('\n') if data else []:
+        try:
+            k, v = internal.comment.tag.decode(iter(line))
+        except internal.exceptions.InvalidFormatError:
+            k, v = default, line
+        res[k] = v
+    return res
+
+def reference_encode(dict):
+    '''Encode the dictionary `dict` with the reference implementation from ``internal.comment.tag``.'''
+    return '\n'.join(internal.comment.tag.encode(k, v) for k, v in six.iteritems(dict or {}))
+
+def fuzz_comment(count=10000, seed=None):
+    """Verify that the comment codec produces identical results to its reference implementation for `count` randomly generated comments.
+
+    Both the decoding of arbitrary comments and the round-trip of arbitrary
+    tags are compared including whichever exception gets raised. If `seed`
+    is specified, then use it to seed the random number generator. Returns
+    a list of the inputs that were mismatched.
+    """
+    rng = random.Random(seed)
+    alphabet = [six.unichr(ch) for ch in itertools.chain(six.moves.range(0x20), six.moves.range(0x7f, 0xa1))]
+    alphabet += [ch for ch in u"[]\\ abcdefxuU0123456789-+(){}'\"set([float.,:"] * 4
+    alphabet += [u'\xe9', u'\u200b', u'\u3000', u'\ufeff', u'\U0001f600']
+    values = [0, -100, 4021, 2**70, 0.5, True, {1 : 'a', 'b' : 2}, [1, 'x'], (3,), {10, 20, 30}, u'', '']
+
+    def outcome(F, *args):
+        try: return True, F(*args)
+        except Exception, E: return False, E.__class__
+    def string(length):
+        res = u''.join(rng.choice(alphabet) for _ in six.moves.range(length))
+        return res if rng.random() < 0.8 else res.encode('utf8')
+
+    failures = []
+    for i in six.moves.range(count):
+        data = string(rng.randint(0, 0x20))
+        data = data[:1] + '\n' + data[1:] if rng.random() < 0.3 else data
+        data = '[' + data if rng.random() < 0.4 else data
+        if outcome(reference_decode, data) != outcome(internal.comment.decode, data):
+            failures.append(data)
+
+        key, value = string(rng.randint(0, 0x10)), rng.choice(values) if rng.random() < 0.3 else string(rng.randint(0, 0x20))
+        (ok, res), current = outcome(reference_encode, {key : value}), outcome(internal.comment.encode, {key : value})
+        if (ok, res) != current or res.__class__ != current[1].__class__:
+            failures.append({key : value})
+        elif ok and outcome(reference_decode, res) != outcome(internal.comment.decode, res):
+            failures.append(res)
+        continue
+
+    six.print_(u"comment: {:d} of {:d} comment{:s} mismatched".format(len(failures), count, '' if count == 1 else 's'), file=output)
+    return failures
+
+def comment(iterable, count=100):
+    '''Compare the comment codec against its reference implementation using the comments at each address in `iterable` for `count` iterations.'''
+    comments = [item for item in (db.comment(ea, repeatable=repeatable) for ea in iterable for repeatable in (False, True)) if item]
+    decoded = [internal.comment.decode(item) for item in comments]
+    if [reference_decode(item) for item in comments] != decoded:
+        raise AssertionError(u"{:s}.comment(..., {:d}) : The codec decoded the comments differently than the reference implementation.".format('.'.join(('custom', __name__)), count))
+
+    results = [
+        ('decode (reference)', measure(lambda: [reference_decode(item) for item in comments], count)),
+        ('decode (codec)', measure(lambda: [internal.comment.decode(item) for item in comments], count)),
+        ('encode (reference)', measure(lambda: [reference_encode(item) for item in decoded], count)),
+        ('encode (codec)', measure(lambda: [internal.comment.encode(item) for item in decoded], count)),
+    ]
+    return report(u"internal.comment ({:d} comment{:s})".format(len(comments), '' if len(comments) == 1 else 's'), count, results)
+
+### tagcache format
+def tagcache(count=10):
+    """Compare the throughput of the original format of the tagcache against the binary format using the contents of every function for `count` iterations.
+
+    The original format marshals the dictionary of reference counts and
+    compresses it with ``bz2``, whereas the binary format encodes the
+    addresses relative to each other and uses ``zlib`` if necessary.
+    """
+    contents = internal.comment.contents
+    states = [(ea, state) for ea, state in ((ea, contents._read(ea, ea)) for ea, _ in contents.iterate()) if state]
+    if not states:
+        raise internal.exceptions.ItemNotFoundError(u"{:s}.tagcache({:d}) : Unable to find any functions with contents in the tagcache.".format('.'.join(('custom', __name__)), count))
+
+    def original_encode():
+        return [contents.codec.encode(contents.marshaller.dumps(state))[0] for _, state in states]
+    def binary_encode():
+        return [contents.pack(ea, state) for ea, state in states]
+    original, binary = original_encode(), binary_encode()
+
+    def original_decode():
+        return [contents.marshaller.loads(contents.codec.decode(data)[0]) for data in original]
+    def binary_decode():
+        return [contents.unpack(ea, data) for (ea, _), data in zip(states, binary)]
+
+    # double-check that the binary format is lossless
+    if binary_decode() != [state for _, state in states]:
+        raise AssertionError(u"{:s}.tagcache({:d}) : The binary format decoded the contents differently than what was encoded.".format('.'.join(('custom', __name__)), count))
+
+    results = [
+        ('encode (original)', measure(original_encode, count)),
+        ('encode (binary)', measure(binary_encode, count)),
+        ('decode (original)', measure(original_decode, count)),
+        ('decode (binary)', measure(binary_decode, count)),
+    ]
+    size = [sum(map(len, items)) for items in (original, binary)]
+    res = report(u"internal.comment.contents ({:d} function{:s})".format(len(states), '' if len(states) == 1 else 's'), count, results)
+    for description, total in zip(('size (original)', 'size (binary)'), size):
+        six.print_(u"    {:<32s} : {:d} bytes ({:.2f}MB/s encode, {:.2f}MB/s decode)".format(description, total, total * count / res[description.replace('size', 'encode')] / 1e6, total * count / res[description.replace('size', 'decode')] / 1e6), file=output)
+    return res
+
+### reading the global tags
+def reference_globals():
+    '''Iterate through the global tags with the reference implementation that walks through every address in the database.'''
+    ea, sentinel = db.config.bounds()
+    while ea < sentinel:
+        funcQ = func.within(ea)
+        res = (func.tag if funcQ else db.tag)(ea)
+        if res: yield ea, res
+        if funcQ:
+            _, ea = func.chunk(ea)
+            continue
+        try: ea = db.a.next(ea)
+        except internal.exceptions.OutOfBoundsError: ea = sentinel
+    return
+
+def globals(count=1, reference=True):
+    """Compare the ways of reading the global tags with ``custom.tags.read.globals`` for `count` iterations.
+
+    The reference implementation visits every address within the database,
+    whereas the current implementation only visits the candidates from the
+    tagcache or the flags. As the reference implementation can take quite
+    a while for a large database, it can be skipped by setting `reference`
+    to false. The addresses that are only found by one of the ways are
+    emitted so that the tagcache can be checked.
+    """
+    import custom
+    read = custom.tags.read
+
+    modes = [
+        ('read (tagcache)', lambda: dict(read.globals())),
+        ('read (scan)', lambda: dict(read.globals(cache=False))),
+        ('read (verify)', lambda: dict(read.globals(verify=True))),
+    ]
+    reference and modes.insert(0, ('read (reference)', lambda: dict(reference_globals())))
+
+    # read the tags once with each of them so that we can compare what was found
+    found = [(description, F()) for description, F in modes]
+    _, baseline = found[0]
+    for description, items in found[1:]:
+        missing, extra = (sorted(set(x) - set(y)) for x, y in [(baseline, items), (items, baseline)])
+        if missing or extra:
+            six.print_(u"{:s}: {:d} address{:s} missing and {:d} extra when compared to \"{:s}\" ({:s})".format(description, len(missing), '' if len(missing) == 1 else 'es', len(extra), found[0][0], ', '.join(itertools.chain(("-{:#x}".format(ea) for ea in missing), ("+{:#x}".format(ea) for ea in extra)))), file=output)
+        continue
+
+    results = [(description, measure(F, count)) for description, F in modes]
+    return report(u"custom.tags.read.globals ({:d} address{:s})".format(len(baseline), '' if len(baseline) == 1 else 'es'), count, results)
+
+### structure members
+def reference_index(members, member):
+    '''Return the index of `member` within `members` with the reference implementation that checks every member.'''
+    for i in six.moves.range(len(members)):
+        if member.id == members[i].id:
+            return i
+        continue
+    raise internal.exceptions.MemberNotFoundError(u"{:s}.reference_index({!r}, {:#x}) : The requested member is not in the members list.".format('.'.join(('custom', __name__)), members, member.id))
+
+def members(structures=(), count=10):
+    """Compare looking up the index of every member within each of the `structures` for `count` iterations.
+
+    The reference implementation checks the identifier of each member until
+    it finds the one being searched for, whereas the current implementation
+    uses a table of the identifiers. If `structures` is not specified, then
+    use the structure and the function frame with the most members.
+    """
+    if not structures:
+        frames = (func.frame(ea) for ea in db.functions() if idaapi.get_frame(ea) is not None)
+        candidates = [max(items, key=lambda st: len(st.members)) for items in map(list, (struc.iterate(), frames)) if items]
+        structures = [item for item in candidates if len(item.members)]
+    if not structures:
+        raise internal.exceptions.ItemNotFoundError(u"{:s}.members({!r}, {:d}) : Unable to find any structures with members in the database.".format('.'.join(('custom', __name__)), structures, count))
+
+    res = {}
+    for st in structures:
+        items = [item for item in st.members]
+
+        # double-check that both of them resolve every member to the very same index
+        if [reference_index(st.members, item) for item in items] != [st.members.index(item) for item in items]:
+            raise AssertionError(u"{:s}.members({!r}, {:d}) : The table resolved the members of structure {!r} to different indices than the reference implementation.".format('.'.join(('custom', __name__)), structures, count, st.name))
+
+        results = [
+            ('index (reference)', measure(lambda: [reference_index(st.members, item) for item in items], count)),
+            ('index (table)', measure(lambda: [st.members.index(item) for item in items], count)),
+        ]
+        res[st.name] = report(u"structure.members_t.index ({:s}, {:d} member{:s})".format(st.name, len(items), '' if len(items) == 1 else 's'), count, results)
+    return res
+
+### decoding integers
+def reference_unsigned(ea, size, byteorder):
+    '''Read an unsigned integer of `size` bytes from the address `ea` with the reference implementation that folds each byte.'''
+    data = db.read(ea, size)
+    data = data[::-1] if byteorder.lower().startswith('little') else data
+    return functools.reduce(lambda x, y: x << 8 | six.byte2int(y), data, 0)
+
+def integers(ea=None, length=0x100, count=100):
+    """Compare decoding `length` pointer-sized integers at the address `ea` for `count` iterations.
+
+    The reference implementation folds each byte of every integer, whereas
+    the current implementation decodes them with the ``struct`` module
+    either individually with ``database.get.unsigned`` or all at once with
+    ``database.get.unsigned_many``.
+    """
+    ea = ui.current.address() if ea is None else ea
+    size, byteorder = db.config.bits() // 8, db.config.byteorder()
+    addresses = [ea + i * size for i in six.moves.range(length)]
+
+    # double-check that all of them decode the very same integers
+    expected = [reference_unsigned(item, size, byteorder) for item in addresses]
+    if expected != [db.get.unsigned(item, size) for item in addresses] or expected != db.get.unsigned_many(ea, size, length):
+        raise AssertionError(u"{:s}.integers({:#x}, {:d}, {:d}) : The integers were decoded differently than the reference implementation.".format('.'.join(('custom', __name__)), ea, length, count))
+
+    results = [
+        ('unsigned (reference)', measure(lambda: [reference_unsigned(item, size, byteorder) for item in addresses], count)),
+        ('unsigned (struct)', measure(lambda: [db.get.unsigned(item, size) for item in addresses], count)),
+        ('unsigned_many', measure(lambda: db.get.unsigned_many(ea, size, length), count)),
+    ]
+    return report(u"database.get.unsigned({:#x}, {:d}) ({:d} integer{:s})".format(ea, size, length, '' if length == 1 else 's'), count, results)
+
+__all__ = ['multicase', 'fuzz_comment', 'comment', 'tagcache', 'globals', 'members', 'integers']
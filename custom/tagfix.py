@@ -12,15 +12,26 @@ To manually rebuild the cache for the database, use the following::
 
     > custom.tagfix.everything()
 
+If the rebuild was canceled or interrupted, then running it again will
+resume it from where it left off. To start over from the beginning, use
+the following::
+
+    > custom.tagfix.everything(resume=False)
+
 Likewise to rebuild the cache for just the globals or the contents::
 
     > custom.tagfix.globals()
     > custom.tagfix.contents()
 
+To rebuild the index that is used to query the tags in the database::
+
+    > custom.tagfix.index()
+
 """
 
-import six, sys, logging
+import six, sys, logging, builtins
 import functools, operator, itertools, types
+import marshal, time, datetime
 
 import database as db, function as func, ui
 import internal
@@ -50,6 +61,7 @@ def fetch_contents(fn):
 
 def check_contents(ea):
     '''Validate the cache defined for the contents of the function `ea`.'''
+    internal.comment.contents.flush()
     node, key = internal.netnode.get(internal.comment.tagging.node()), internal.comment.contents._key(ea)
     tag = internal.comment.decode(db.comment(key))
 
@@ -184,6 +196,8 @@ def contents(ea):
             continue
         internal.comment.contents.set_address(k, v)
 
+    # remember the addresses with a color so that their implicit tag can be tracked
+    [ internal.comment.colors.set(k, True) for k in addr if db.color(k) is not None ]
     return addr, tags
 
 def globals():
@@ -201,6 +215,8 @@ def globals():
     for k, v in six.iteritems(addr):
         internal.comment.globals.set_address(k, v)
 
+    # remember the addresses with a color so that their implicit tag can be tracked
+    [ internal.comment.colors.set(k, True) for k in addr if db.color(k) is not None ]
     return addr, tags
 
 def all():
@@ -208,14 +224,42 @@ def all():
     total = len(list(db.functions()))
 
     # process all function contents tags
-    for i, ea in enumerate(db.functions()):
-        six.print_(u"updating references for contents ({:#x}) : {:d} of {:d}".format(ea, i, total), file=output)
-        _, _ = contents(ea)
+    with internal.comment.contents.transaction():
+        for i, ea in enumerate(db.functions()):
+            six.print_(u"updating references for contents ({:#x}) : {:d} of {:d}".format(ea, i, total), file=output)
+            _, _ = contents(ea)
 
     # process all global tags
     six.print_(u'updating references for globals', file=output)
     _, _ = globals()
 
+    # rebuild the index for all of the tags
+    six.print_(u'updating the index for all tags', file=output)
+    index()
+
+def index():
+    '''Re-build the index for all of the tags in the database.'''
+    internal.comment.index.reset()
+    total = len(list(db.functions()))
+
+    with internal.comment.tagging.transaction():
+        # process all function contents and function tags
+        for i, fn in enumerate(db.functions()):
+            six.print_(u"index: updating the index for function ({:#x}) : {:d} of {:d}".format(fn, i, total), file=output)
+            ui.navigation.auto(fn)
+            for ea in func.iterate(fn):
+                [ internal.comment.index.add(fn, k, ea) for k in db.tag(ea) ]
+            [ internal.comment.index.add(None, k, fn) for k in func.tag(fn) ]
+
+        # process all global tags that are not within a function
+        six.print_(u'index: updating the index for globals', file=output)
+        left, right = db.range()
+        for ea in db.address.iterate(left, right):
+            if func.within(ea): continue
+            ui.navigation.auto(ea)
+            [ internal.comment.index.add(None, k, ea) for k in db.tag(ea) ]
+    return
+
 def customnames():
     '''Iterate through all of the custom names defined in the database and update the cache with their reference counts.'''
     # FIXME: first delete all the custom names '__name__' tag
@@ -240,18 +284,208 @@ def extracomments():
         if count: [ ctx.inc(ea, '__extra_suffix__') for i in six.moves.range(count) ]
     return
 
-def everything():
-    '''Re-create the cache for all the tags found in the database.'''
-    erase()
-    all()
+def everything(**options):
+    """Re-create the cache for all the tags found in the database.
+
+    If the rebuild was interrupted, then it is resumed from its checkpoint
+    unless the bool `resume` is specified as false. See ``rebuild`` for more.
+    """
+    return rebuild(**options)
+
+### rebuilding the cache as a pipeline
+class checkpoint(object):
+    """
+    This namespace is used to store the progress of ``rebuild`` so
+    that a rebuild which has been interrupted can be resumed. The
+    checkpoint is stored as a marshalled dictionary within a blob of
+    the netnode defined by ``checkpoint.__node__``. This dictionary
+    contains the current stage, the position within that stage, and
+    the reference counts of the global tag names that have been
+    aggregated so far.
+
+    When a database is created, the tagcache is built after the initial
+    auto-analysis by converting the global tags within each function into
+    contents tags. The position of the next function for this build is
+    stored in its own blob within the same netnode under ``checkpoint.ptag``
+    so that it can be resumed if it was interrupted.
+    """
+    __node__, btag, ptag = '$ tagfix', 'C', 'P'
+
+    @classmethod
+    def node(cls):
+        '''Return the netnode for the checkpoint or ``None`` if there isn't one.'''
+        res = internal.netnode.get(cls.__node__)
+        return None if res == idaapi.BADADDR else res
+
+    @classmethod
+    def load(cls, tag=None):
+        """Return the state of the rebuild that was interrupted or ``None`` if there isn't one.
+
+        If `tag` is specified, then return the state stored under it instead.
+        """
+        node = cls.node()
+        res = None if node is None else internal.netnode.blob.get(node, cls.btag if tag is None else tag)
+        return marshal.loads(res) if res else None
+
+    @classmethod
+    def save(cls, state, tag=None):
+        """Write the state of the current rebuild in `state` to the checkpoint.
+
+        If `tag` is specified, then write the state under it instead.
+        """
+        node = cls.node()
+        node = internal.netnode.new(cls.__node__) if node is None else node
+        return internal.netnode.blob.set(node, cls.btag if tag is None else tag, marshal.dumps(state))
+
+    @classmethod
+    def clear(cls, tag=None):
+        """Remove the checkpoint so that the next rebuild starts from the very beginning.
+
+        If `tag` is specified, then only remove the state stored under it.
+        """
+        node = cls.node()
+        if node is None:
+            return False
+        return internal.netnode.remove(node) if tag is None else internal.netnode.blob.remove(node, tag)
+
+def collect(ea):
+    '''Return the raw comments and the names of the implicit tags at the address `ea` so that they can be decoded by ``aggregate``.'''
+    implicit = []
+    if db.type.flags(ea, idaapi.FF_NAME) and db.name(ea): implicit.append('__name__')
+    if db.extra.__get_prefix__(ea) is not None: implicit.append('__extra_prefix__')
+    if db.extra.__get_suffix__(ea) is not None: implicit.append('__extra_suffix__')
+    if db.color(ea) is not None: implicit.append('__color__')
+    return ea, db.comment(ea, repeatable=False), db.comment(ea, repeatable=True), implicit
+
+def collect_function(fn):
+    '''Return the raw comments and the names of the implicit tags for the function `fn` so that they can be decoded by ``aggregate``.'''
+    implicit = ['__name__'] if db.type.flags(fn, idaapi.FF_NAME) and func.name(fn) else []
+    return fn, func.comment(fn, repeatable=False), func.comment(fn, repeatable=True), implicit
+
+def aggregate((key, items)):
+    """Decode the comments for each of the `items` that were collected for `key` and return the tag names at each address and the reference count for each tag name.
+
+    This function only depends on the comment codec so that the
+    comments can be collected separately from decoding them. Returns
+    the tuple `(key, addresses, tags)`.
+    """
+    addresses, tags = {}, {}
+    for ea, comment, repeatable, implicit in items:
+        res = set(internal.comment.decode(comment)) | set(internal.comment.decode(repeatable)) | set(implicit)
+
+        # the contents cache used to be stored in the comment at the beginning of a function
+        if ea == key: res -= {'__tags__', '__address__'}
+        if not res: continue
+
+        addresses[ea] = sorted(res)
+        for name in res:
+            tags[name] = tags.get(name, 0) + 1
+        continue
+    return key, addresses, tags
+
+def throughput(started, count, total):
+    '''Return a description of the rate and remaining time after processing `count` of `total` items since the time `started`.'''
+    elapsed = time.time() - started
+    rate = count / elapsed if elapsed > 0 else 0.
+    remaining = datetime.timedelta(seconds=int((total - count) / rate)) if rate else '?'
+    return u"{:.1f}/s, {!s} remaining".format(rate, remaining)
+
+def rebuild(resume=True, functions=0x40, addresses=0x1000):
+    """Re-build the entire cache for the tags in the database as a pipeline and return whether it was completed.
+
+    The raw comments for each chunk of `functions` or `addresses` are
+    collected and then decoded by ``aggregate``. The results for each
+    chunk are written in a single transaction and the progress is
+    recorded in ``checkpoint``. If the rebuild is canceled or interrupted,
+    then it will be resumed from the checkpoint unless the bool `resume`
+    is false.
+    """
+    state = checkpoint.load() if resume else None
+
+    # if we're starting from the beginning, then erase everything including
+    # any build of the tagcache that was interrupted since it's being replaced
+    if state is None:
+        erase()
+        internal.comment.index.reset()
+        checkpoint.clear(checkpoint.ptag)
+        state = {'stage' : 0, 'position' : 0, 'names' : {}}
+        checkpoint.save(state)
+    else:
+        six.print_(u"rebuild: resuming stage {:d} from position {:#x}".format(state['stage'], state['position']), file=output)
+
+    listable, (left, right) = sorted(db.functions()), db.range()
+    stages = [
+        (u'contents', len(listable), lambda position: ((fn, [collect(ea) for ea in func.iterate(fn)]) for fn in listable[position : position + functions])),
+        (u'functions', len(listable), lambda position: [(None, [collect_function(fn) for fn in listable[position : position + functions]])]),
+        (u'globals', right - left, lambda position: [(None, [collect(ea) for ea in itertools.islice((ea for ea in db.address.iterate(left + position, right) if not func.within(ea)), addresses)])]),
+    ]
+
+    maximum = sum(total for _, total, _ in stages)
+    started, initial = time.time(), sum(total for _, total, _ in stages[:state['stage']]) + state['position']
+
+    p = ui.Progress()
+    p.update(current=initial, min=0, max=maximum, title=u"Rebuilding the tagcache...")
+    p.open()
+    try:
+        completed = initial
+        for stage, (description, total, producer) in enumerate(stages):
+            if stage < state['stage']:
+                continue
+
+            while state['position'] < total:
+                if p.canceled:
+                    six.print_(u"rebuild: canceled during the {:s} at position {:#x}".format(description, state['position']), file=output)
+                    return False
+
+                # collect the chunk and then hand it off to be decoded
+                items = builtins.list(producer(state['position']))
+                results = builtins.list(builtins.map(aggregate, items))
+
+                # write the results back in a single transaction
+                with internal.comment.tagging.transaction():
+                    for key, res, tags in results:
+                        if key is None:
+                            [ internal.comment.globals.set_address(ea, len(names)) for ea, names in six.iteritems(res) ]
+                            [ state['names'].__setitem__(name, state['names'].get(name, 0) + count) for name, count in six.iteritems(tags) ]
+                        else:
+                            [ internal.comment.contents.set_name(key, name, count, target=key) for name, count in six.iteritems(tags) ]
+                            [ internal.comment.contents.set_address(ea, len(names), target=key) for ea, names in six.iteritems(res) ]
+                        [ internal.comment.index._contains(internal.comment.index.addresses(key, name), ea) or internal.comment.index.add(key, name, ea) for ea, names in six.iteritems(res) for name in names ]
+                        [ internal.comment.colors.set(ea, True) for ea, names in six.iteritems(res) if '__color__' in names ]
+                    pass
+
+                # figure out how far we've gotten and then save it
+                if stage < 2:
+                    count = min(functions, total - state['position'])
+                else:
+                    processed = [ea for _, chunk in items for ea, _, _, _ in chunk]
+                    count = processed[-1] + 1 - left - state['position'] if len(processed) == addresses else total - state['position']
+                state['position'] += count
+                checkpoint.save(state)
+
+                completed += count
+                p.update(current=completed, text=u"Rebuilding the {:s} : {:d} of {:d} ({:s})".format(description, state['position'], total, throughput(started, completed - initial, maximum - initial)))
+            state['stage'], state['position'] = stage + 1, 0
+            checkpoint.save(state)
+
+        # now we can write the global tag names and remove the checkpoint
+        [ internal.comment.globals.set_name(name, count) for name, count in six.iteritems(state['names']) ]
+        checkpoint.clear()
+
+    finally:
+        p.close()
+
+    six.print_(u"rebuild: successfully rebuilt the cache for {:d} function{:s} and {:d} global tag name{:s}".format(len(listable), '' if len(listable) == 1 else 's', len(state['names']), '' if len(state['names']) == 1 else 's'), file=output)
+    return True
 
 def erase_globals():
     '''Erase the cache defined for all of the global tags in the database.'''
+    internal.comment.contents.invalidate()
     n = internal.comment.tagging.node()
-    res = internal.netnode.hash.fiter(n), internal.netnode.alt.fiter(n), internal.netnode.sup.fiter(n)
+    res = internal.netnode.hash.fiter(n), internal.netnode.alt.fiter(n), internal.netnode.sup.fiter(n), internal.comment.colors.address()
     res = map(list, res)
     total = sum(map(len, res))
-    hashes, alts, sups = res
+    hashes, alts, sups, colors = res
 
     yield total
 
@@ -262,13 +496,18 @@ def erase_globals():
 
     current += len(hashes)
     for idx, ea in enumerate(sups):
-        internal.netnode.sup.remove(n, ea)
+        internal.comment.contents._write_header(ea, ea, None)
         yield current + idx, ea
 
     current += len(sups)
     for idx, (ea, _) in enumerate(alts):
         internal.netnode.alt.remove(n, ea)
         yield current + idx, ea
+
+    current += len(alts)
+    for idx, ea in enumerate(colors):
+        internal.comment.colors.set(ea, False)
+        yield current + idx, ea
     return
 
 def erase_contents():
@@ -277,6 +516,9 @@ def erase_contents():
     total, tag = len(res), internal.comment.contents.btag
     yield total
 
+    # discard the contents that are cached since we're removing them
+    internal.comment.contents.invalidate()
+
     for idx, ea in enumerate(db.functions()):
         internal.netnode.blob.remove(ea, tag)
         yield idx, ea
@@ -297,4 +539,4 @@ def erase():
         six.print_(u"erasing global {:s} : {:d} of {:d}".format(fmt.format(addressOrName), res+idx, total), file=output)
     return
 
-__all__ = ['everything', 'globals', 'contents']
+__all__ = ['everything', 'rebuild', 'globals', 'contents', 'index']
@@ -11,10 +11,19 @@ To fetch all of the tags from the database::
 
     > res = custom.tags.read()
 
+To read the global tags while cross-checking them with the tagcache::
+
+    > res = dict(custom.tags.read.globals(verify=True))
+
 To export only specific tags from the database::
 
     > res = custom.tags.export('tag1', 'tag2', ...)
 
+To write the tags to a file as they are read, and then apply them from it::
+
+    > custom.tags.stream('/path/to/file', compress=True)
+    > custom.tags.stream.apply('/path/to/file')
+
 To apply previously read tags to the database::
 
     > custom.tags.apply(res)
@@ -27,10 +36,13 @@ To apply previously read tags with different names to the database::
 
 import six, sys, logging, builtins
 import functools, operator, itertools, types, string
+import contextlib, struct, zlib, marshal
 
 import database as db, function as func, structure as struc, ui
 import internal
 
+import idaapi
+
 output = sys.stderr
 
 ### miscellaneous tag utilities
@@ -172,30 +184,121 @@ class read(object):
 
     ## reading the globals from the database
     @staticmethod
-    def globals():
-        '''Iterate through all of the tags defined globally witin the database.'''
-        ea, sentinel = db.config.bounds()
+    def globals(cache=True, verify=False):
+        """Iterate through all of the tags defined globally within the database.
+
+        The candidates are the addresses of the global tags within the
+        tagcache so that only the addresses that are actually tagged will
+        be visited. If `cache` is false or the tagcache is suspect, then
+        the candidates will be found by scanning the flags of every segment.
+        If `verify` is true, then scan for the candidates and cross-check
+        them with the tagcache while logging any that are different.
+        """
+        global read
 
-        # loop till we hit the end of the database
-        while ea < sentinel:
+        # figure out how we're going to find our candidates
+        if verify:
+            iterable = read.verify()
+        elif cache and read.trusted():
+            iterable = read.sparse()
+        else:
+            iterable = read.scan()
+
+        # now we can grab the tags for each candidate and yield them
+        for ea in iterable:
             ui.navigation.auto(ea)
-            funcQ = func.within(ea)
+            res = func.tag(ea) if func.within(ea) else db.tag(ea)
+            if res: yield ea, res
+        return
 
-            # figure out which tag function to use
-            f = func.tag if funcQ else db.tag
+    ## finding the candidates for the global tags
+    @staticmethod
+    def trusted():
+        '''Return whether the global addresses within the tagcache can be trusted to contain every global tag.'''
+        import custom
+
+        # if the format is different, the colors aren't being tracked, or the
+        # tagcache is being built, then it's suspect
+        if internal.comment.tagging.version() != internal.comment.tagging.VERSION:
+            return False
+        elif not internal.comment.colors.tracked():
+            return False
+        checkpoint = custom.tagfix.checkpoint
+        return checkpoint.load() is None and checkpoint.load(checkpoint.ptag) is None
 
-            # grab the tag and yield it
-            res = f(ea)
-            if res: yield ea, res
+    @staticmethod
+    def sparse():
+        """Iterate through the addresses of the global tags that are stored within the tagcache.
 
-            # if we're in a function, then seek to the next chunk
-            if funcQ:
-                _, ea = func.chunk(ea)
+        The colors are tracked as they are changed, so any address outside
+        a function with a color is also stored within the tagcache.
+        """
+        for ea in internal.comment.globals.address():
+            yield ea
+        return
+
+    @staticmethod
+    def scan(count=0x10000):
+        """Iterate through the addresses that might contain a global tag by scanning the flags for every segment in blocks of `count` addresses.
+
+        Each function is a candidate, as is any address outside a function
+        that has a comment, a custom name, an extra comment, or a color. As
+        the color of an address is not stored within its flags, the color is
+        checked for every address that is not the tail of an item.
+        """
+        mask = idaapi.FF_COMM | idaapi.FF_NAME | idaapi.FF_LINE
+
+        # functions are yielded in order along with the addresses from each segment
+        functions = iter(db.functions())
+        function = next(functions, None)
+        for index in six.moves.range(idaapi.get_segm_qty()):
+            seg = idaapi.getnseg(index)
+            left, right = internal.interface.range.unpack(seg)
+            for start in itertools.takewhile(functools.partial(operator.gt, right), itertools.count(left, count)):
+                snapshot = db.type.snapshot(start, min(start + count, right))
+                for ea in (start + offset for offset, flags in enumerate(snapshot.flags) if flags & mask or flags & idaapi.MS_CLS != idaapi.FF_TAIL and idaapi.get_item_color(start + offset) != 0xffffffff):
+                    while function is not None and function <= ea:
+                        yield function
+                        function = next(functions, None)
+                    if not func.within(ea):
+                        yield ea
+                    continue
                 continue
+            continue
+
+        # yield whatever functions that are left
+        while function is not None:
+            yield function
+            function = next(functions, None)
+        return
+
+    @staticmethod
+    def verify():
+        """Iterate through the candidates from scanning the flags while cross-checking them with the addresses of the global tags within the tagcache.
 
-            # otherwise, try the next address till we hit a sentinel value
-            try: ea = db.a.next(ea)
-            except internal.exceptions.OutOfBoundsError: ea = sentinel
+        Any addresses that are missing from the tagcache, or are within the
+        tagcache but were not found by the scan will be logged and yielded.
+        """
+        global read
+        cached = read.sparse()
+        expected = next(cached, None)
+        for ea in read.scan():
+            while expected is not None and expected < ea:
+                logging.warn(u"{:s}.verify() : Address {:#x} is within the tagcache but was not found when scanning the database.".format('.'.join((__name__, read.__name__)), expected))
+                yield expected
+                expected = next(cached, None)
+
+            if ea == expected:
+                expected = next(cached, None)
+            elif func.tag(ea) if func.within(ea) else db.tag(ea):
+                logging.warn(u"{:s}.verify() : Address {:#x} was found when scanning the database but is not within the tagcache.".format('.'.join((__name__, read.__name__)), ea))
+            yield ea
+
+        # anything left over in the tagcache was not found by the scan
+        while expected is not None:
+            logging.warn(u"{:s}.verify() : Address {:#x} is within the tagcache but was not found when scanning the database.".format('.'.join((__name__, read.__name__)), expected))
+            yield expected
+            expected = next(cached, None)
         return
 
     ## reading the contents from the entire database
@@ -244,6 +347,9 @@ class apply(object):
     keyword arguments which represent a mapping for the tag names. When a
     tag name was specified, this mapping will be used to rename the tags
     before actually writing them back into the database.
+
+    The tags for the globals and contents are written in bulk by grouping
+    them by their function so that each comment is only written once.
     """
 
     def __new__(cls, (Globals, Contents, Frames), **tagmap):
@@ -414,6 +520,83 @@ class apply(object):
 
         return
 
+    ## writing tags to the database in bulk
+    @staticmethod
+    @contextlib.contextmanager
+    def suspended():
+        '''Suspend the hooks that are responsible for tracking the tags within comments for the duration of the context.'''
+        events = {'changing_cmt', 'cmt_changed', 'changing_area_cmt', 'area_cmt_changed', 'changing_range_cmt', 'range_cmt_changed'}
+        res = [ event for event in ui.hook.idb if event in events and ui.hook.idb.disable(event) ]
+        try:
+            yield
+        finally:
+            [ ui.hook.idb.enable(event) for event in res ]
+        return
+
+    @staticmethod
+    def __address__(ea, tags):
+        '''Merge `tags` into the comment at the address `ea` and return the tagcache, the address, and the names of the tags that were added.'''
+        within = func.within(ea)
+        repeatable = False if within else True
+
+        # decode both comments once, giving priority to the one that we're writing to
+        other, state = (internal.comment.decode(db.comment(ea, repeatable=item)) for item in (not repeatable, repeatable))
+        res, keys = dict(other), six.viewkeys(other) | six.viewkeys(state)
+        res.update(state)
+        res.update(tags)
+
+        # clear the other comment and then write the new one exactly once
+        other and db.comment(ea, '', repeatable=not repeatable)
+        db.comment(ea, internal.comment.encode(res), repeatable=repeatable)
+        return internal.comment.contents if within else internal.comment.globals, ea, { name for name in tags if name not in keys }
+
+    @staticmethod
+    def __function__(ea, tags):
+        '''Merge `tags` into the comment for the function containing the address `ea` and return the tagcache, the address, and the names of the tags that were added.'''
+        fn = func.by(ea)
+        res = internal.comment.decode(func.comment(fn, repeatable=True))
+        keys = { name for name in res }
+        res.update(tags)
+        func.comment(fn, internal.comment.encode(res), repeatable=True)
+        return internal.comment.globals, func.address(fn), { name for name in tags if name not in keys }
+
+    @classmethod
+    def batch(cls, iterable):
+        """Write the tags for each `(namespace, ea, tags)` in `iterable` into the database and return the number of items that were processed.
+
+        The items are grouped by the function that owns each address. The
+        comment at every address is decoded, merged, and written only once
+        while the comment hooks are suspended. The references to any tags
+        that were added are then updated for the entire group within a
+        single transaction of the tagcache.
+        """
+        implicit = {'__name__', '__extra_prefix__', '__extra_suffix__', '__color__'}
+        owner = lambda (ns, ea, tags): func.address(ea) if func.within(ea) else None
+
+        count = 0
+        with cls.suspended(), internal.comment.tagging.transaction():
+            for _, items in itertools.groupby(iterable, owner):
+                references = []
+                for ns, ea, tags in items:
+                    special = {'__name__'} if ns is func else implicit
+
+                    # implicit tags aren't stored in a comment, so dispatch them to the namespace
+                    try:
+                        [ ns.tag(ea, name, value) for name, value in six.iteritems(tags) if name in special ]
+                        res = { name : value for name, value in six.iteritems(tags) if name not in special }
+                        res and references.append((cls.__function__ if ns is func else cls.__address__)(ea, res))
+                    except:
+                        logging.warn(u"{:s}.batch(...) : Unable to apply tags ({!s}) to address {:#x}.".format('.'.join((__name__, cls.__name__)), internal.utils.string.repr(tags), ea), exc_info=True)
+
+                    # increase our counter
+                    count += 1
+
+                # now we can update the references for the whole group
+                for tagcache, ea, names in references:
+                    [ tagcache.inc(ea, name) for name in names ]
+                continue
+        return count
+
     ## applying tags to the globals
     @staticmethod
     def globals(Globals, **tagmap):
@@ -421,36 +604,32 @@ class apply(object):
         global apply
         cls, tagmap_output = apply.__class__, u", {:s}".format(u', '.join(u"{:s}={:s}".format(internal.utils.string.escape(oldtag), internal.utils.string.escape(newtag)) for oldtag, newtag in six.iteritems(tagmap))) if tagmap else ''
 
-        count = 0
-        for ea, res in Globals:
-            ns = func if func.within(ea) else db
-
-            # grab the current (old) tag state
-            state = ns.tag(ea)
+        def changes(Globals):
+            '''Yield the namespace, address, and the tags that have changed for each item in `Globals`.'''
+            for ea, res in Globals:
+                ns = func if func.within(ea) else db
 
-            # transform the new tag state using the tagmap
-            new = { tagmap.get(name, name) : value for name, value in six.viewitems(res) }
+                # grab the current (old) tag state
+                state = ns.tag(ea)
 
-            # check if the tag mapping resulted in the deletion of a tag
-            if len(new) != len(res):
-                for name in six.viewkeys(res) - six.viewkeys(new):
-                    logging.warn(u"{:s}.globals(...{:s}) : Refusing requested tag mapping as it results in the tag \"{:s}\" overwriting the tag \"{:s}\" in the global {:#x}. The value {!s} would be replaced with {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), internal.utils.string.escape(tagmap[name], '"'), ea, internal.utils.string.repr(res[name]), internal.utils.string.repr(res[tagmap[name]])))
-                pass
+                # transform the new tag state using the tagmap
+                new = { tagmap.get(name, name) : value for name, value in six.viewitems(res) }
 
-            # check what's going to be overwritten with different values prior to doing it
-            for name in six.viewkeys(state) & six.viewkeys(new):
-                if state[name] == new[name]: continue
-                logging.warn(u"{:s}.globals(...{:s}) : Overwriting tag \"{:s}\" for global at {:#x} with new value {!s}. Old value was {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), ea, internal.utils.string.repr(new[name]), internal.utils.string.repr(state[name])))
+                # check if the tag mapping resulted in the deletion of a tag
+                if len(new) != len(res):
+                    for name in six.viewkeys(res) - six.viewkeys(new):
+                        logging.warn(u"{:s}.globals(...{:s}) : Refusing requested tag mapping as it results in the tag \"{:s}\" overwriting the tag \"{:s}\" in the global {:#x}. The value {!s} would be replaced with {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), internal.utils.string.escape(tagmap[name], '"'), ea, internal.utils.string.repr(res[name]), internal.utils.string.repr(res[tagmap[name]])))
+                    pass
 
-            # now we can apply the tags to the global address
-            try:
-                [ ns.tag(ea, name, value) for name, value in six.iteritems(new) if state.get(name, dummy) != value ]
-            except:
-                logging.warn(u"{:s}.globals(...{:s}) : Unable to apply tags ({!s}) to global {:#x}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.repr(new), ea), exc_info=True)
+                # check what's going to be overwritten with different values prior to doing it
+                for name in six.viewkeys(state) & six.viewkeys(new):
+                    if state[name] == new[name]: continue
+                    logging.warn(u"{:s}.globals(...{:s}) : Overwriting tag \"{:s}\" for global at {:#x} with new value {!s}. Old value was {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), ea, internal.utils.string.repr(new[name]), internal.utils.string.repr(state[name])))
 
-            # increase our counter
-            count += 1
-        return count
+                # now we can hand off the tags that have changed to be applied to the global address
+                yield ns, ea, { name : value for name, value in six.iteritems(new) if state.get(name, dummy) != value }
+            return
+        return apply.batch(changes(Globals))
 
     ## applying contents tags to all the functions
     @staticmethod
@@ -459,40 +638,36 @@ class apply(object):
         global apply
         cls, tagmap_output = apply.__class__, u", {:s}".format(u', '.join(u"{:s}={:s}".format(internal.utils.string.escape(oldtag), internal.utils.string.escape(newtag)) for oldtag, newtag in six.iteritems(tagmap))) if tagmap else ''
 
-        count = 0
-        for loc, res in Contents:
-            ea = locationToAddress(loc)
-
-            # warn the user if this address is not within a function
-            if not func.within(ea):
-                logging.warn(u"{:s}.contents(...{:s}) : Address {:#x} is not within a function. Using a global tag.".format('.'.join((__name__, cls.__name__)), tagmap_output, ea))
+        def changes(Contents):
+            '''Yield the namespace, address, and the tags that have changed for each item in `Contents`.'''
+            for loc, res in Contents:
+                ea = locationToAddress(loc)
 
-            # grab the current (old) tag state
-            state = db.tag(ea)
+                # warn the user if this address is not within a function
+                if not func.within(ea):
+                    logging.warn(u"{:s}.contents(...{:s}) : Address {:#x} is not within a function. Using a global tag.".format('.'.join((__name__, cls.__name__)), tagmap_output, ea))
 
-            # transform the new tag state using the tagmap
-            new = { tagmap.get(name, name) : value for name, value in six.viewitems(res) }
+                # grab the current (old) tag state
+                state = db.tag(ea)
 
-            # check if the tag mapping resulted in the deletion of a tag
-            if len(new) != len(res):
-                for name in six.viewkeys(res) - six.viewkeys(new):
-                    logging.warn(u"{:s}.contents(...{:s}) : Refusing requested tag mapping as it results in the tag \"{:s}\" overwriting tag \"{:s}\" for the contents at {:#x}. The value {!s} would be overwritten by {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), internal.utils.string.escape(tagmap[name], '"'), ea, internal.utils.string.repr(res[name]), internal.utils.string.repr(res[tagmap[name]])))
-                pass
+                # transform the new tag state using the tagmap
+                new = { tagmap.get(name, name) : value for name, value in six.viewitems(res) }
 
-            # inform the user if any tags are being overwritten with different values
-            for name in six.viewkeys(state) & six.viewkeys(new):
-                if state[name] == new[name]: continue
-                logging.warn(u"{:s}.contents(...{:s}) : Overwriting contents tag \"{:s}\" for address {:#x} with new value {!s}. Old value was {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), ea, internal.utils.string.repr(new[name]), internal.utils.string.repr(state[name])))
+                # check if the tag mapping resulted in the deletion of a tag
+                if len(new) != len(res):
+                    for name in six.viewkeys(res) - six.viewkeys(new):
+                        logging.warn(u"{:s}.contents(...{:s}) : Refusing requested tag mapping as it results in the tag \"{:s}\" overwriting tag \"{:s}\" for the contents at {:#x}. The value {!s} would be overwritten by {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), internal.utils.string.escape(tagmap[name], '"'), ea, internal.utils.string.repr(res[name]), internal.utils.string.repr(res[tagmap[name]])))
+                    pass
 
-            # write the tags to the contents address
-            try:
-                [ db.tag(ea, name, value) for name, value in six.iteritems(new) if state.get(name, dummy) != value ]
-            except:
-                logging.warn(u"{:s}.contents(...{:s}) : Unable to apply tags {!s} to location {:#x}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.repr(new), ea), exc_info=True)
+                # inform the user if any tags are being overwritten with different values
+                for name in six.viewkeys(state) & six.viewkeys(new):
+                    if state[name] == new[name]: continue
+                    logging.warn(u"{:s}.contents(...{:s}) : Overwriting contents tag \"{:s}\" for address {:#x} with new value {!s}. Old value was {!s}.".format('.'.join((__name__, cls.__name__)), tagmap_output, internal.utils.string.escape(name, '"'), ea, internal.utils.string.repr(new[name]), internal.utils.string.repr(state[name])))
 
-            # increase our counter
-            count += 1
-        return count
+                # hand off the tags that have changed so that they can be written to the contents address
+                yield db, ea, { name : value for name, value in six.iteritems(new) if state.get(name, dummy) != value }
+            return
+        return apply.batch(changes(Contents))
 
     ## applying frames to all the functions
     @staticmethod
@@ -637,4 +812,232 @@ class export(object):
             if res: yield ea, res
         return
 
-__all__ = ['list', 'read', 'export', 'apply']
+### Streaming tags to and from a file
+class stream(object):
+    """
+    This namespace contains tools that can be used to write the tags
+    within the database to a file as they are read, and then apply them
+    from the file in batches without having to load all of them first.
+
+    The file begins with a header containing the md5 of the input file
+    and the base address of the database. This way the tags can be
+    rebased if they are applied to a database at a different address.
+    Each record that follows is length-prefixed and marshalled with the
+    format `(scope, location, tags)` where `scope` is one of "globals",
+    "contents", or "frames". As the file can be shared, ``marshal`` is
+    used so that reading a record can not execute any code. Thus the
+    python types and the structures within the type of a frame member
+    are written as their name. If `compress` was specified as true, then
+    every record after the header is compressed with ``zlib``.
+
+    If `cache` is specified as false, then read the tags without using
+    the cache. If `location` is specified as true, then write each
+    contents tag according to its location rather than its address.
+    """
+    MAGIC, VERSION = b'TAGS', 2
+    length = struct.Struct('<L')
+
+    # the python types that can be used within the type of a frame member
+    types = { item.__name__ : item for item in [int, long, float, chr, str, unicode, type] }
+
+    def __new__(cls, file, *tags, **options):
+        '''Write the specified `tags` within the database to `file` using the given `options`.'''
+        return cls.write(file, *tags, **options)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def __open__(file, mode):
+        '''Return a context manager for `file` opening it with `mode` if it is a path.'''
+        if not isinstance(file, basestring):
+            yield file
+            return
+        with open(file, mode) as res:
+            yield res
+        return
+
+    @classmethod
+    def __encode__(cls, type):
+        '''Return the type of a frame member in `type` with each of its python types and structures replaced by their name so that it can be marshalled.'''
+        if isinstance(type, (builtins.list, builtins.tuple)):
+            return type.__class__(cls.__encode__(item) for item in type)
+        elif isinstance(type, struc.structure_t):
+            return ('__structure__', type.name)
+        elif any(type is item for item in cls.types.values()):
+            return ('__builtin__', type.__name__)
+        return type
+
+    @classmethod
+    def __decode__(cls, type):
+        '''Return the type of a frame member in `type` with the name of each python type and structure replaced by what it names.'''
+        if isinstance(type, builtins.tuple) and len(type) == 2 and type[0] == '__builtin__':
+            if type[1] not in cls.types:
+                raise internal.exceptions.InvalidFormatError(u"{:s}.__decode__({!r}) : Unable to decode an unknown python type ({!r}).".format('.'.join((__name__, cls.__name__)), type, type[1]))
+            return cls.types[type[1]]
+        elif isinstance(type, builtins.tuple) and len(type) == 2 and type[0] == '__structure__':
+            try:
+                return struc.by(type[1])
+            except internal.exceptions.StructureNotFoundError:
+                logging.warn(u"{:s}.__decode__({!r}) : Unable to find the structure \"{:s}\" within the database. Using its name instead.".format('.'.join((__name__, cls.__name__)), type, internal.utils.string.escape(type[1], '"')))
+            return type[1]
+        elif isinstance(type, (builtins.list, builtins.tuple)):
+            return type.__class__(cls.__decode__(item) for item in type)
+        return type
+
+    @classmethod
+    def __loads__(cls, data):
+        '''Unmarshal the record within `data` without executing any code.'''
+        try:
+            return marshal.loads(data)
+        except (ValueError, EOFError, TypeError):
+            raise internal.exceptions.InvalidFormatError(u"{:s}.__loads__(...) : Unable to unmarshal a record from the {:d} byte{:s} that were read.".format('.'.join((__name__, cls.__name__)), len(data), '' if len(data) == 1 else 's'))
+
+    @classmethod
+    def __records__(cls, chunks):
+        '''Iterate through each of the length-prefixed records that are decoded from the data in `chunks`.'''
+        buffer, offset = b'', 0
+        for data in chunks:
+            buffer = buffer[offset:] + data
+            offset = 0
+            while len(buffer) - offset >= cls.length.size:
+                size, = cls.length.unpack(buffer[offset : offset + cls.length.size])
+                if len(buffer) - offset < cls.length.size + size:
+                    break
+                yield cls.__loads__(buffer[offset + cls.length.size : offset + cls.length.size + size])
+                offset += cls.length.size + size
+            continue
+
+        if len(buffer) > offset:
+            raise internal.exceptions.InvalidFormatError(u"{:s}.__records__(...) : Unable to decode a record from the {:d} byte{:s} at the end of the file.".format('.'.join((__name__, cls.__name__)), len(buffer) - offset, '' if len(buffer) - offset == 1 else 's'))
+        return
+
+    @classmethod
+    def header(cls):
+        '''Return the header describing the current database.'''
+        md5 = idaapi.retrieve_input_file_md5()
+        return {
+            'version' : cls.VERSION,
+            'md5' : md5.encode('hex') if md5 else None,
+            'base' : db.config.baseaddress(),
+        }
+
+    @classmethod
+    def write(cls, file, *tags, **options):
+        """Write the specified `tags` within the database to `file` as they are read and return the number of records that were written.
+
+        If no tags were specified, then write every tag within the database.
+        """
+        global read, export
+        location, compress = (options.get(item, False) for item in ('location', 'compress'))
+        if options.get('cache', True):
+            scopes = [('globals', export.globals(*tags)), ('contents', export.contents(*tags, location=location)), ('frames', export.frames(*tags))]
+        elif tags:
+            raise internal.exceptions.InvalidParameterError(u"{:s}.write({!r}, {:s}{:s}) : Unable to select the specified tags without using the cache.".format('.'.join((__name__, cls.__name__)), file, ', '.join(map(internal.utils.string.repr, tags)), u", {:s}".format(internal.utils.string.kwargs(options)) if options else ''))
+        else:
+            scopes = [('globals', read.globals()), ('contents', read.contents(location=location)), ('frames', read.frames())]
+
+        header = cls.header()
+        header['compress'] = bool(compress)
+
+        def record(item):
+            try:
+                data = marshal.dumps(item)
+            except ValueError:
+                raise internal.exceptions.SerializationError(u"{:s}.write({!r}{:s}) : Unable to marshal the record {!r}.".format('.'.join((__name__, cls.__name__)), file, u", {:s}".format(internal.utils.string.kwargs(options)) if options else '', item))
+            return cls.length.pack(len(data)) + data
+
+        count = 0
+        with cls.__open__(file, 'wb') as out:
+            out.write(cls.MAGIC + record(header))
+            z = zlib.compressobj() if compress else None
+            for scope, iterable in scopes:
+                six.print_(u"--> Writing {:s}...".format(scope), file=output)
+                for loc, res in iterable:
+                    if scope == 'frames':
+                        res = { offset : (name, cls.__encode__(type), comment) for offset, (name, type, comment) in six.iteritems(res) }
+
+                    # if the record can't be marshalled, then skip it so the rest of the file can still be written
+                    try:
+                        data = record((scope, loc, res))
+                    except internal.exceptions.SerializationError:
+                        logging.warn(u"{:s}.write({!r}{:s}) : Skipping the {:s} at {!s} due to being unable to marshal its record.".format('.'.join((__name__, cls.__name__)), file, u", {:s}".format(internal.utils.string.kwargs(options)) if options else '', scope, internal.utils.string.repr(loc)), exc_info=True)
+                        continue
+                    out.write(z.compress(data) if z else data)
+                    count += 1
+                continue
+            z and out.write(z.flush())
+        return count
+
+    @classmethod
+    def iterate(cls, file):
+        """Iterate through each `(scope, location, tags)` record that was written to `file`.
+
+        The header that was written with the records is yielded first.
+        """
+        with cls.__open__(file, 'rb') as input:
+            magic = input.read(len(cls.MAGIC))
+            if magic != cls.MAGIC:
+                raise internal.exceptions.InvalidFormatError(u"{:s}.iterate({!r}) : The file does not begin with the expected signature ({!r}).".format('.'.join((__name__, cls.__name__)), file, magic))
+
+            # read the header so that we know how the records were written
+            size, = cls.length.unpack(input.read(cls.length.size))
+            header = cls.__loads__(input.read(size))
+            if not isinstance(header, dict) or header.get('version') != cls.VERSION:
+                raise internal.exceptions.InvalidFormatError(u"{:s}.iterate({!r}) : Unable to read a file with an unsupported version ({!s}).".format('.'.join((__name__, cls.__name__)), file, header.get('version') if isinstance(header, dict) else None))
+            yield header
+
+            # if the records were compressed, then we need to decompress them as we read
+            chunks = iter(functools.partial(input.read, 0x10000), b'')
+            if header.get('compress', False):
+                z = zlib.decompressobj()
+                chunks = itertools.chain(six.moves.map(z.decompress, chunks), iter(z.flush, b''))
+
+            # validate each record and decode the types for any frames
+            for item in cls.__records__(chunks):
+                if not (isinstance(item, builtins.tuple) and len(item) == 3):
+                    raise internal.exceptions.InvalidFormatError(u"{:s}.iterate({!r}) : Unable to read a record that is not of the format `(scope, location, tags)`.".format('.'.join((__name__, cls.__name__)), file))
+                scope, loc, res = item
+                if scope == 'frames':
+                    res = { offset : (name, cls.__decode__(type), comment) for offset, (name, type, comment) in six.iteritems(res) }
+                yield scope, loc, res
+            return
+        return
+
+    @classmethod
+    def apply(cls, file, batch=0x400, **tagmap):
+        """Apply the tags from `file` to the database in batches of `batch` records with the specified `tagmap`.
+
+        If the base address of the database is different from the one
+        within the header, then each address will be rebased before it is
+        applied. Returns the number of records that were applied.
+        """
+        global apply
+        iterable = cls.iterate(file)
+        header = next(iterable)
+
+        # check that the header matches the current database
+        current = cls.header()
+        if header['md5'] != current['md5']:
+            logging.warn(u"{:s}.apply({!r}, {:d}{:s}) : The md5 of the input file ({:s}) is different from the one that the tags were written from ({:s}).".format('.'.join((__name__, cls.__name__)), file, batch, u", {:s}".format(internal.utils.string.kwargs(tagmap)) if tagmap else '', current['md5'] or '', header['md5'] or ''))
+
+        delta = current['base'] - header['base']
+        if delta:
+            logging.info(u"{:s}.apply({!r}, {:d}{:s}) : Rebasing the tags from {:#x} to {:#x} ({:+#x}).".format('.'.join((__name__, cls.__name__)), file, batch, u", {:s}".format(internal.utils.string.kwargs(tagmap)) if tagmap else '', header['base'], current['base'], delta))
+        rebase = lambda loc: (loc[0] + delta,) + tuple(loc[1:]) if isinstance(loc, tuple) else loc + delta
+
+        # apply each scope of the records in batches
+        Fapply = {'globals' : apply.globals, 'contents' : apply.contents, 'frames' : apply.frames}
+        count = 0
+        for scope, items in itertools.groupby(iterable, operator.itemgetter(0)):
+            if scope not in Fapply:
+                raise internal.exceptions.InvalidFormatError(u"{:s}.apply({!r}, {:d}{:s}) : Unable to apply the records for an unknown scope ({!r}).".format('.'.join((__name__, cls.__name__)), file, batch, u", {:s}".format(internal.utils.string.kwargs(tagmap)) if tagmap else '', scope))
+
+            six.print_(u"--> Applying {:s}...".format(scope), file=output)
+            while True:
+                res = [(rebase(loc), tags) for _, loc, tags in itertools.islice(items, batch)]
+                if not res: break
+                Fapply[scope](sorted(res, key=operator.itemgetter(0)), **tagmap)
+                count += len(res)
+            continue
+        return count
+
+__all__ = ['list', 'read', 'export', 'apply', 'stream']
@@ -5,13 +5,20 @@ This is an internal module that contains implementations of all the hooks
 that are used. Some of the things that are hooked are things such as
 comment creation, function and segment scoping, etc. This is not intended
 to be used by the average user.
+
+To defer the reference counts that are updated by these hooks during a
+large number of modifications, use the ``deferred`` context manager::
+
+    > with hooks.deferred():
+    >     ...
 """
 
 import six
 import sys, logging
 import functools, operator, itertools, types
+import collections, bisect
 
-import database, function, ui
+import database, function, instruction, ui
 import internal
 from internal import comment, utils, interface, exceptions as E
 
@@ -32,6 +39,80 @@ def notify(name):
     notification.__name__ = "notify({:s})".format(name)
     return notification
 
+def debugQ():
+    '''Return whether debug messages will be emitted so that they are only formatted when necessary.'''
+    return logging.root.isEnabledFor(logging.DEBUG)
+
+### deferring the reference counts
+class deferred(object):
+    """
+    This context manager defers the reference counts that are updated
+    by the hooks within this module until the outermost context exits.
+    While it is active, each update is queued by its tagcache, address,
+    tag name, and function so that an increase and a decrease for the
+    same tag cancel each other out. Upon exit the net difference is
+    written into the tagcache within a single transaction.
+
+    The function owning an address is resolved when the update is
+    queued, so the addresses remain correct if the function boundaries
+    are changed before the context exits.
+    """
+    __depth__, __ledger__ = 0, collections.OrderedDict()
+
+    def __enter__(self):
+        deferred.__depth__ += 1
+        return self
+
+    def __exit__(self, *exception):
+        deferred.__depth__ -= 1
+        if not deferred.__depth__:
+            deferred.apply()
+        return
+
+    @classmethod
+    def update(cls, tagcache, address, name, delta, target=None):
+        '''Queue the reference count for the tag `name` at `address` in `tagcache` to be adjusted by `delta` for the function `target`.'''
+        contentsQ = tagcache is internal.comment.contents
+
+        # if we're not deferring anything, then update the tagcache immediately
+        if not cls.__depth__:
+            F = tagcache.inc if delta > 0 else tagcache.dec
+            return [ F(address, name, target=target) if contentsQ else F(address, name) for _ in six.moves.range(abs(delta)) ]
+
+        # otherwise, add it to the ledger and remove it if everything cancelled out
+        item = tagcache, address, name, internal.comment.contents._key(address) if contentsQ and target is None else target
+        res = cls.__ledger__.pop(item, 0) + delta
+        if res: cls.__ledger__[item] = res
+        return res
+
+    @classmethod
+    def inc(cls, tagcache, address, name, **target):
+        '''Increase the reference count for the tag `name` at `address` in `tagcache` belonging to the function `target`.'''
+        return cls.update(tagcache, address, name, +1, target.get('target', None))
+
+    @classmethod
+    def dec(cls, tagcache, address, name, **target):
+        '''Decrease the reference count for the tag `name` at `address` in `tagcache` belonging to the function `target`.'''
+        return cls.update(tagcache, address, name, -1, target.get('target', None))
+
+    @classmethod
+    def apply(cls):
+        '''Write the net difference of every reference count that was deferred into the tagcache and return the number of tags that were updated.'''
+        items, count = cls.__ledger__.items(), 0
+        cls.__ledger__.clear()
+
+        # apply the decreases first so that tags that were moved don't linger
+        with internal.comment.tagging.transaction():
+            for (tagcache, address, name, target), delta in sorted(items, key=lambda (_, delta): delta > 0):
+                try:
+                    cls.update(tagcache, address, name, delta, target)
+                except Exception:
+                    logging.warn(u"{:s}.apply() : Unable to adjust the reference count for tag {!s} at {:#x} by {:+d}.".format('.'.join((__name__, cls.__name__)), utils.string.repr(name), address, delta), exc_info=True)
+                    continue
+                count += 1
+            pass
+        return count
+
 ### comment hooks
 class comment(object):
     @classmethod
@@ -52,13 +133,13 @@ class address(comment):
         f = idaapi.get_func(ea)
         for key in old.viewkeys() ^ new.viewkeys():
             if key not in new:
-                logging.debug(u"{:s}.update_refs({:#x}) : Decreasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
-                if f: internal.comment.contents.dec(ea, key)
-                else: internal.comment.globals.dec(ea, key)
+                debugQ() and logging.debug(u"{:s}.update_refs({:#x}) : Decreasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
+                if f: deferred.dec(internal.comment.contents, ea, key)
+                else: deferred.dec(internal.comment.globals, ea, key)
             if key not in old:
-                logging.debug(u"{:s}.update_refs({:#x}) : Increasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
-                if f: internal.comment.contents.inc(ea, key)
-                else: internal.comment.globals.inc(ea, key)
+                debugQ() and logging.debug(u"{:s}.update_refs({:#x}) : Increasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
+                if f: deferred.inc(internal.comment.contents, ea, key)
+                else: deferred.inc(internal.comment.globals, ea, key)
             continue
         return
 
@@ -66,18 +147,18 @@ class address(comment):
     def _create_refs(cls, ea, res):
         f = idaapi.get_func(ea)
         for key in res.viewkeys():
-            logging.debug(u"{:s}.create_refs({:#x}) : Increasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(res.viewkeys())))
-            if f: internal.comment.contents.inc(ea, key)
-            else: internal.comment.globals.inc(ea, key)
+            debugQ() and logging.debug(u"{:s}.create_refs({:#x}) : Increasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea, utils.string.repr(key), 'address', utils.string.repr(res.viewkeys())))
+            if f: deferred.inc(internal.comment.contents, ea, key)
+            else: deferred.inc(internal.comment.globals, ea, key)
         return
 
     @classmethod
     def _delete_refs(cls, ea, res):
         f = idaapi.get_func(ea)
         for key in res.viewkeys():
-            logging.debug(u"{:s}.delete_refs({:#x}) : Decreasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea,  utils.string.repr(key), 'address', utils.string.repr(res.viewkeys())))
-            if f: internal.comment.contents.dec(ea, key)
-            else: internal.comment.globals.dec(ea, key)
+            debugQ() and logging.debug(u"{:s}.delete_refs({:#x}) : Decreasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), ea,  utils.string.repr(key), 'address', utils.string.repr(res.viewkeys())))
+            if f: deferred.dec(internal.comment.contents, ea, key)
+            else: deferred.dec(internal.comment.globals, ea, key)
         return
 
     @classmethod
@@ -136,7 +217,7 @@ class address(comment):
 
     @classmethod
     def changing(cls, ea, repeatable_cmt, newcmt):
-        logging.debug(u"{:s}.changing({:#x}, {:d}, {!s}) : Received comment.changing event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), ea, repeatable_cmt, utils.string.repr(newcmt), 'repeatable' if repeatable_cmt else 'non-repeatable', ea))
+        debugQ() and logging.debug(u"{:s}.changing({:#x}, {:d}, {!s}) : Received comment.changing event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), ea, repeatable_cmt, utils.string.repr(newcmt), 'repeatable' if repeatable_cmt else 'non-repeatable', ea))
         oldcmt = utils.string.of(idaapi.get_cmt(ea, repeatable_cmt))
         try: cls.event.send((ea, bool(repeatable_cmt), utils.string.of(newcmt)))
         except StopIteration, e:
@@ -145,7 +226,7 @@ class address(comment):
 
     @classmethod
     def changed(cls, ea, repeatable_cmt):
-        logging.debug(u"{:s}.changed({:#x}, {:d}) : Received comment.changed event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), ea, repeatable_cmt, 'repeatable' if repeatable_cmt else 'non-repeatable', ea))
+        debugQ() and logging.debug(u"{:s}.changed({:#x}, {:d}) : Received comment.changed event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), ea, repeatable_cmt, 'repeatable' if repeatable_cmt else 'non-repeatable', ea))
         newcmt = utils.string.of(idaapi.get_cmt(ea, repeatable_cmt))
         try: cls.event.send((ea, bool(repeatable_cmt), None))
         except StopIteration, e:
@@ -157,26 +238,26 @@ class globals(comment):
     def _update_refs(cls, fn, old, new):
         for key in old.viewkeys() ^ new.viewkeys():
             if key not in new:
-                logging.debug(u"{:s}.update_refs({:#x}) : Decreasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
-                internal.comment.globals.dec(interface.range.start(fn), key)
+                debugQ() and logging.debug(u"{:s}.update_refs({:#x}) : Decreasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
+                deferred.dec(internal.comment.globals, interface.range.start(fn), key)
             if key not in old:
-                logging.debug(u"{:s}.update_refs({:#x}) : Increasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
-                internal.comment.globals.inc(interface.range.start(fn), key)
+                debugQ() and logging.debug(u"{:s}.update_refs({:#x}) : Increasing refcount for {!s} at {:s}. Updating old keys ({!s}) to new keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(old.viewkeys()), utils.string.repr(new.viewkeys())))
+                deferred.inc(internal.comment.globals, interface.range.start(fn), key)
             continue
         return
 
     @classmethod
     def _create_refs(cls, fn, res):
         for key in res.viewkeys():
-            internal.comment.globals.inc(interface.range.start(fn), key)
-            logging.debug(u"{:s}.create_refs({:#x}) : Increasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(res.viewkeys())))
+            deferred.inc(internal.comment.globals, interface.range.start(fn), key)
+            debugQ() and logging.debug(u"{:s}.create_refs({:#x}) : Increasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(res.viewkeys())))
         return
 
     @classmethod
     def _delete_refs(cls, fn, res):
         for key in res.viewkeys():
-            internal.comment.globals.dec(interface.range.start(fn), key)
-            logging.debug(u"{:s}.delete_refs({:#x}) : Decreasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(res.viewkeys())))
+            deferred.dec(internal.comment.globals, interface.range.start(fn), key)
+            debugQ() and logging.debug(u"{:s}.delete_refs({:#x}) : Decreasing refcount for {!s} at {:s} for keys ({!s}).".format('.'.join((__name__, cls.__name__)), interface.range.start(fn) if fn else idaapi.BADADDR, utils.string.repr(key), 'function' if fn else 'global', utils.string.repr(res.viewkeys())))
         return
 
     @classmethod
@@ -237,7 +318,7 @@ class globals(comment):
 
     @classmethod
     def changing(cls, cb, a, cmt, repeatable):
-        logging.debug(u"{:s}.changing({!s}, {:#x}, {!s}, {:d}) : Received comment.changing event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), utils.string.repr(cb), interface.range.start(a), utils.string.repr(cmt), repeatable, 'repeatable' if repeatable else 'non-repeatable', interface.range.start(a)))
+        debugQ() and logging.debug(u"{:s}.changing({!s}, {:#x}, {!s}, {:d}) : Received comment.changing event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), utils.string.repr(cb), interface.range.start(a), utils.string.repr(cmt), repeatable, 'repeatable' if repeatable else 'non-repeatable', interface.range.start(a)))
         fn = idaapi.get_func(interface.range.start(a))
         if fn is None and not cmt:
             return
@@ -253,7 +334,7 @@ class globals(comment):
 
     @classmethod
     def changed(cls, cb, a, cmt, repeatable):
-        logging.debug(u"{:s}.changed({!s}, {:#x}, {!s}, {:d}) : Received comment.changed event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), utils.string.repr(cb), interface.range.start(a), utils.string.repr(cmt), repeatable, 'repeatable' if repeatable else 'non-repeatable', interface.range.start(a)))
+        debugQ() and logging.debug(u"{:s}.changed({!s}, {:#x}, {!s}, {:d}) : Received comment.changed event for a {:s} comment at {:x}.".format('.'.join((__name__, cls.__name__)), utils.string.repr(cb), interface.range.start(a), utils.string.repr(cmt), repeatable, 'repeatable' if repeatable else 'non-repeatable', interface.range.start(a)))
         fn = idaapi.get_func(interface.range.start(a))
         if fn is None and not cmt:
             return
@@ -284,7 +365,7 @@ def on_init(idp_modname):
     if State == None:
         State = state.init
     else:
-        logging.debug(u"{:s}.on_init({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(idp_modname), utils.string.repr(State)))
+        debugQ() and logging.debug(u"{:s}.on_init({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(idp_modname), utils.string.repr(State)))
 
 def on_newfile(fname):
     '''IDP_Hooks.newfile'''
@@ -294,7 +375,7 @@ def on_newfile(fname):
     if State == state.init:
         State = state.loaded
     else:
-        logging.debug(u"{:s}.on_newfile({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(fname), utils.string.repr(State)))
+        debugQ() and logging.debug(u"{:s}.on_newfile({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(fname), utils.string.repr(State)))
     # FIXME: save current state like base addresses and such
 
 def on_oldfile(fname):
@@ -306,14 +387,31 @@ def on_oldfile(fname):
         State = state.ready
 
         __check_functions()
+        __migrate_tagcache()
+        __resume_tagcache()
     else:
-        logging.debug(u"{:s}.on_oldfile({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(fname), utils.string.repr(State)))
+        debugQ() and logging.debug(u"{:s}.on_oldfile({!s}) : Received unexpected state transition from state ({!s}).".format(__name__, utils.string.repr(fname), utils.string.repr(State)))
     # FIXME: save current state like base addresses and such
 
 def __check_functions():
     # FIXME: check if tagcache needs to be created
     return
 
+def __migrate_tagcache():
+    iterable = internal.comment.contents.migrate()
+    total = next(iterable)
+    if not total:
+        return
+
+    p = ui.Progress()
+    p.update(current=0, min=0, max=total, title=u"Upgrading tagcache...")
+    p.open()
+    six.print_(u"Upgrading the tagcache for {:d} function{:s} from version {:d} to {:d}.".format(total, '' if total == 1 else 's', internal.comment.tagging.version(), internal.comment.tagging.VERSION))
+    for i, ea in enumerate(iterable):
+        p.update(value=i, text=u"Function {:d} of {:d} : {:#x}".format(1 + i, total, ea))
+    p.close()
+    six.print_(u"Successfully upgraded the tagcache to version {:d}.".format(internal.comment.tagging.version()))
+
 def on_ready():
     '''IDP_Hooks.auto_empty'''
     global State
@@ -326,26 +424,69 @@ def on_ready():
         __process_functions()
 
     elif State == state.ready:
-        logging.debug(u"{:s}.on_ready() : Database is already ready ({!s}).".format(__name__, utils.string.repr(State)))
+        debugQ() and logging.debug(u"{:s}.on_ready() : Database is already ready ({!s}).".format(__name__, utils.string.repr(State)))
 
     else:
-        logging.debug(u"{:s}.on_ready() : Received unexpected transition from state ({!s}).".format(__name__, utils.string.repr(State)))
+        debugQ() and logging.debug(u"{:s}.on_ready() : Received unexpected transition from state ({!s}).".format(__name__, utils.string.repr(State)))
 
 def auto_queue_empty(type):
     if type == idaapi.AU_FINAL:
         on_ready()
 
-def __process_functions(percentage=0.10):
-    p = ui.Progress()
-    globals = set(internal.comment.globals.address())
+def on_save(*args):
+    '''IDB_Hooks.savebase'''
+
+    # Database is being saved, so write anything that was modified
+    # in the caches into the tagcache.
+    count = internal.comment.tagging.commit()
+    debugQ() and logging.debug(u"{:s}.on_save() : Flushed {:d} item{:s} from the tagcache.".format(__name__, count, '' if count == 1 else 's'))
+
+def on_close(*args):
+    '''IDB_Hooks.closebase'''
+
+    # Database is being closed, so anything that is still modified has
+    # been discarded by the user and we need to forget about it.
+    count = internal.comment.tagging.discard()
+    function.blocks.invalidate()
+    database.functions.invalidate()
+    database.names.invalidate()
+    database.imports.invalidate()
+    database.entries.invalidate()
+    database.marks.invalidate()
+    function.chunks.invalidate()
+    database.image.invalidate()
+    instruction.cache.invalidate()
+    if count:
+        debugQ() and logging.debug(u"{:s}.on_close() : Discarded {:d} modified item{:s} from the tagcache.".format(__name__, count, '' if count == 1 else 's'))
+
+def on_timer(interval=1000):
+    '''Timer that writes the contents cache into the tagcache while idle.'''
+    try:
+        internal.comment.tagging.idle()
+    except Exception:
+        logging.warn(u"{:s}.on_timer({:d}) : Unable to flush the caches to the tagcache.".format(__name__, interval), exc_info=True)
+    return interval
+
+def __process_functions(percentage=0.10, position=0):
+    import custom
+    checkpoint = custom.tagfix.checkpoint
 
+    p = ui.Progress()
     total = 0
 
-    funcs = list(database.functions())
-    p.update(current=0, max=len(funcs), title=u"Pre-building tagcache...")
+    # the functions are processed in order so that the position of the next one
+    # can be saved in the checkpoint after each function has been written
+    funcs = sorted(database.functions())
+    checkpoint.save({'position' : position}, tag=checkpoint.ptag)
+    p.update(current=position, max=len(funcs), title=u"Pre-building tagcache...")
     p.open()
-    six.print_(u"Pre-building tagcache for {:d} functions.".format(len(funcs)))
-    for i, fn in enumerate(funcs):
+    six.print_(u"Pre-building tagcache for {:d} functions{:s}.".format(len(funcs), u" starting at function {:d}".format(position + 1) if position else u''))
+    for i, fn in enumerate(funcs[position:], position):
+        if p.canceled:
+            six.print_(u"Pre-building of the tagcache was canceled at function {:#x} ({:d} of {:d}) and will be resumed when the database is opened again.".format(fn, i + 1, len(funcs)))
+            p.close()
+            return
+
         chunks = list(function.chunks(fn))
 
         text = functools.partial(u"Processing function {:#x} ({chunks:d} chunk{plural:s}) -> {:d} of {:d}".format, fn, i + 1, len(funcs))
@@ -354,24 +495,60 @@ def __process_functions(percentage=0.10):
         if i % (int(len(funcs) * percentage) or 1) == 0:
             six.print_(u"Processing function {:#x} -> {:d} of {:d} ({:.02f}%)".format(fn, i+1, len(funcs), i / float(len(funcs)) * 100.0))
 
-        contents = set(internal.comment.contents.address(fn))
+        # only the global tags within the function need to be converted
+        globals, contents = [], set(internal.comment.contents.address(fn, target=fn))
         for ci, (l, r) in enumerate(chunks):
             p.update(text=text(chunks=len(chunks), plural='' if len(chunks) == 1 else 's'), tooltip="Chunk #{:d} : {:#x} - {:#x}".format(ci, l, r))
             ui.navigation.analyze(l)
-            for ea in database.address.iterate(l, r):
-                # FIXME: no need to iterate really since we should have
-                #        all of the addresses
-                for k, v in six.iteritems(database.tag(ea)):
-                    if ea in globals: internal.comment.globals.dec(ea, k)
-                    if ea not in contents: internal.comment.contents.inc(ea, k, target=fn)
-                    total += 1
-                continue
-            continue
-        continue
+            globals.extend((ea, database.tag(ea)) for ea in internal.comment.globals.address(l, r))
+
+        # write the contents before removing the globals, so that if we're
+        # interrupted then processing the function again won't lose anything
+        with internal.comment.tagging.transaction():
+            for ea, res in globals:
+                if ea in contents: continue
+                [ internal.comment.contents.inc(ea, k, target=fn) for k in res ]
+            pass
+
+        with internal.comment.tagging.transaction():
+            for ea, res in globals:
+                [ internal.comment.globals.dec(ea, k) for k in res ]
+                total += len(res)
+            pass
+        checkpoint.save({'position' : i + 1}, tag=checkpoint.ptag)
+
+    checkpoint.clear(checkpoint.ptag)
     six.print_(u"Successfully built tag-cache composed of {:d} tag{:s}.".format(total, '' if total == 1 else 's'))
     p.close()
 
+def __resume_tagcache():
+    import custom
+    checkpoint = custom.tagfix.checkpoint
+
+    # if the tagcache was being rebuilt, then the rebuild replaces everything
+    if checkpoint.load() is not None:
+        six.print_(u"Resuming the interrupted rebuild of the tagcache.")
+        if custom.tagfix.rebuild(resume=True):
+            six.print_(u"Successfully built the tagcache.")
+        return
+
+    # otherwise continue building the tagcache from the function it stopped at
+    state = checkpoint.load(checkpoint.ptag)
+    if state is not None:
+        six.print_(u"Resuming the interrupted pre-building of the tagcache.")
+        __process_functions(position=state['position'])
+    return
+
 def rebase(info):
+    instruction.cache.invalidate()
+    function.blocks.invalidate()
+    function.chunks.invalidate()
+    database.imports.invalidate()
+    database.entries.invalidate()
+    database.marks.invalidate()
+    database.functions.invalidate()
+    database.names.invalidate()
+    database.image.invalidate()
     functions, globals = map(utils.fcompose(sorted, list), (database.functions(), internal.netnode.alt.fiter(internal.comment.tagging.node())))
 
     p = ui.Progress()
@@ -381,27 +558,36 @@ def rebase(info):
     scount = info.size() + 1
     six.print_(u"{:s}.rebase({!s}) : Rebasing tagcache for {:d} segments.".format(__name__, utils.string.repr(info), scount))
 
+    # re-key the functions in the contents cache and move their headers since ida only moved
+    # the netnodes for their blobs, and translate the addresses in the tag index since it's
+    # not keyed by address.
+    segments = [(info[si]._from, info[si].to, info[si].size) for si in six.moves.range(scount)]
+    internal.comment.contents.relocate(segments)
+    internal.comment.index.relocate(segments)
+    internal.comment.colors.relocate(segments)
+
     # for each segment
     p.open()
-    for si in six.moves.range(scount):
-        msg = u"Rebasing tagcache for segment {:d} of {:d} : {:#x} ({:+#x}) -> {:#x}".format(si, scount, info[si]._from, info[si].size, info[si].to)
-        p.update(title=msg), six.print_(msg)
-
-        # for each function (using target address because ida moved the netnodes for us)
-        res = [n for n in functions if info[si].to <= n < info[si].to + info[si].size]
-        for i, fn in __rebase_function(info[si]._from, info[si].to, info[si].size, iter(res)):
-            text = u"Function {:d} of {:d} : {:#x}".format(i + fcount, len(functions), fn)
-            p.update(value=sum((fcount, gcount, i)), text=text)
-            ui.navigation.procedure(fn)
-        fcount += len(res)
-
-        # for each global
-        res = [(ea, count) for ea, count in globals if info[si]._from <= ea < info[si]._from + info[si].size]
-        for i, ea in __rebase_globals(info[si]._from, info[si].to, info[si].size, iter(res)):
-            text = u"Global {:d} of {:d} : {:#x}".format(i + gcount, len(globals), ea)
-            p.update(value=sum((fcount, gcount, i)), text=text)
-            ui.navigation.analyze(ea)
-        gcount += len(res)
+    with internal.comment.contents.transaction():
+        for si in six.moves.range(scount):
+            msg = u"Rebasing tagcache for segment {:d} of {:d} : {:#x} ({:+#x}) -> {:#x}".format(si, scount, info[si]._from, info[si].size, info[si].to)
+            p.update(title=msg), six.print_(msg)
+
+            # for each function (using target address because ida moved the netnodes for us)
+            res = [n for n in functions if info[si].to <= n < info[si].to + info[si].size]
+            for i, fn in __rebase_function(info[si]._from, info[si].to, info[si].size, iter(res)):
+                text = u"Function {:d} of {:d} : {:#x}".format(i + fcount, len(functions), fn)
+                p.update(value=sum((fcount, gcount, i)), text=text)
+                ui.navigation.procedure(fn)
+            fcount += len(res)
+
+            # for each global
+            res = [(ea, count) for ea, count in globals if info[si]._from <= ea < info[si]._from + info[si].size]
+            for i, ea in __rebase_globals(info[si]._from, info[si].to, info[si].size, iter(res)):
+                text = u"Global {:d} of {:d} : {:#x}".format(i + gcount, len(globals), ea)
+                p.update(value=sum((fcount, gcount, i)), text=text)
+                ui.navigation.analyze(ea)
+            gcount += len(res)
     p.close()
 
 def __rebase_function(old, new, size, iterable):
@@ -409,6 +595,13 @@ def __rebase_function(old, new, size, iterable):
     failure, total = [], list(iterable)
 
     for i, fn in enumerate(total):
+        # the binary format and the cache are already relative to the new
+        # address, and the headers were moved when the contents were
+        # relocated. so only the original format needs to be translated
+        if not internal.comment.contents._absoluteQ(fn):
+            yield i, fn
+            continue
+
         # grab the contents dictionary
         try:
             state = internal.comment.contents._read(None, fn)
@@ -417,10 +610,6 @@ def __rebase_function(old, new, size, iterable):
             state = None
         if state is None: continue
 
-        # now we can erase the old one
-        res = fn - new + old
-        internal.comment.contents._write(res, None, None)
-
         # update the addresses
         res, state[key] = state[key], {ea - old + new : ref for ea, ref in six.iteritems(state[key])}
 
@@ -454,6 +643,8 @@ def __rebase_globals(old, new, size, iterable):
 
 # address naming
 def rename(ea, newname):
+    database.names.invalidate()
+    database.functions.invalidate(ea)
     fl = database.type.flags(ea)
     labelQ, customQ = (fl & n == n for n in {idaapi.FF_LABL, idaapi.FF_NAME})
     #r, fn = database.xref.up(ea), idaapi.get_func(ea)
@@ -466,14 +657,14 @@ def rename(ea, newname):
     if not newname:
         # if it's a custom name
         if (not labelQ and customQ):
-            ctx.dec(ea, '__name__')
-            logging.debug(u"{:s}.rename({:#x}, {!s}) : Decreasing refcount for tag {!r} at address due to an empty name.".format(__name__, ea, utils.string.repr(newname), '__name__'))
+            deferred.dec(ctx, ea, '__name__')
+            debugQ() and logging.debug(u"{:s}.rename({:#x}, {!s}) : Decreasing refcount for tag {!r} at address due to an empty name.".format(__name__, ea, utils.string.repr(newname), '__name__'))
         return
 
     # if it's currently a label or is unnamed
     if (labelQ and not customQ) or all(not q for q in {labelQ, customQ}):
-        ctx.inc(ea, '__name__')
-        logging.debug(u"{:s}.rename({:#x}, {!s}) : Increasing refcount for tag {!r} at address due to a new name.".format(__name__, ea, utils.string.repr(newname), '__name__'))
+        deferred.inc(ctx, ea, '__name__')
+        debugQ() and logging.debug(u"{:s}.rename({:#x}, {!s}) : Increasing refcount for tag {!r} at address due to a new name.".format(__name__, ea, utils.string.repr(newname), '__name__'))
     return
 
 def extra_cmt_changed(ea, line_idx, cmt):
@@ -491,124 +682,228 @@ def extra_cmt_changed(ea, line_idx, cmt):
 
     for l, r, key in (prefix, suffix):
         if l <= line_idx < r:
-            if oldcmt is None and cmt is not None: ctx.inc(ea, key)
-            elif oldcmt is not None and cmt is None: ctx.dec(ea, key)
-            logging.debug(u"{:s}.extra_cmt_changed({:#x}, {:d}, {!s}, oldcmt={!s}) : {:s} refcount at address for tag {!s}.".format(__name__, ea, line_idx, utils.string.repr(cmt), utils.string.repr(oldcmt), 'Increasing' if oldcmt is None and cmt is not None else 'Decreasing' if oldcmt is not None and cmt is None else 'Doing nothing to', utils.string.repr(key)))
+            if oldcmt is None and cmt is not None: deferred.inc(ctx, ea, key)
+            elif oldcmt is not None and cmt is None: deferred.dec(ctx, ea, key)
+            debugQ() and logging.debug(u"{:s}.extra_cmt_changed({:#x}, {:d}, {!s}, oldcmt={!s}) : {:s} refcount at address for tag {!s}.".format(__name__, ea, line_idx, utils.string.repr(cmt), utils.string.repr(oldcmt), 'Increasing' if oldcmt is None and cmt is not None else 'Decreasing' if oldcmt is not None and cmt is None else 'Doing nothing to', utils.string.repr(key)))
         continue
     return
 
+def item_color_changed(ea, color):
+    '''IDB_Hooks.item_color_changed'''
+
+    # we're not told what the previous color was, so check whether we knew it had one
+    colored = color != 0xffffffff
+    if internal.comment.colors.set(ea, colored) == colored:
+        return
+
+    ctx = internal.comment.contents if function.within(ea) else internal.comment.globals
+    if colored: deferred.inc(ctx, ea, '__color__')
+    else: deferred.dec(ctx, ea, '__color__')
+    debugQ() and logging.debug(u"{:s}.item_color_changed({:#x}, {:#x}) : {:s} refcount at address for tag {!s}.".format(__name__, ea, color, 'Increasing' if colored else 'Decreasing', utils.string.repr('__color__')))
+
+### instruction decoding and basic blocks
+def byte_patched(ea, *old_value):
+    '''IDB_Hooks.byte_patched'''
+    instruction.cache.invalidate(ea)
+    function.blocks.invalidate(ea)
+    database.image.update(ea)
+
+def segments_changed(*args):
+    '''IDB_Hooks.segm_added, IDB_Hooks.segm_deleted, IDB_Hooks.segm_start_changed, IDB_Hooks.segm_end_changed, or IDB_Hooks.segm_moved'''
+
+    # the boundaries of the segments are different, so their images need to be read again
+    database.image.invalidate()
+
+    # the code in a segment might have moved too, so the instructions and the basic blocks need to be decoded again
+    instruction.cache.invalidate()
+    function.blocks.invalidate()
+
+def make_code(*args):
+    '''IDP_Hooks.make_code or IDB_Hooks.make_code'''
+
+    # IDA < 7.0 gives us the address and the size, whereas newer versions give us an insn_t
+    ea, size = args if len(args) > 1 else (args[0].ea, args[0].size)
+    instruction.cache.invalidate(ea, ea + size)
+    function.blocks.invalidate(ea, ea + size)
+
+def make_data(ea, flags, tid, size):
+    '''IDP_Hooks.make_data or IDB_Hooks.make_data'''
+    instruction.cache.invalidate(ea, ea + max(1, size))
+    function.blocks.invalidate(ea, ea + max(1, size))
+
+def undefine(ea):
+    '''IDP_Hooks.undefine'''
+    instruction.cache.invalidate(ea)
+    function.blocks.invalidate(ea)
+
+def destroyed_items(ea1, ea2, will_disable_range):
+    '''IDB_Hooks.destroyed_items'''
+    instruction.cache.invalidate(ea1, ea2)
+    function.blocks.invalidate(ea1, ea2)
+
 ### function scope
 def thunk_func_created(pfn):
     pass
 
+def func_updated(pfn):
+    '''IDB_Hooks.func_updated'''
+
+    # the flowchart of the function might have changed, so discard its cached basic blocks and metrics
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+
+    # the chunks of the function might have changed too, so re-sync them in the chunk table
+    function.chunks._sync(interface.range.start(pfn))
+
+def tail_owner_changed(tail, owner, *old_owner):
+    '''IDB_Hooks.tail_owner_changed'''
+
+    # the owner of the tail has changed, so we need to update it in the chunk table
+    l, r = interface.range.unpack(tail)
+    function.chunks._insert(l, r, owner)
+
+def __tagged(addresses, start, end):
+    '''Return the addresses from the sorted list `addresses` that are within the range from `start` to `end`.'''
+    left, right = bisect.bisect_left(addresses, start), bisect.bisect_left(addresses, end)
+    return addresses[left : right]
+
 def func_tail_appended(pfn, tail):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    function.chunks._insert(interface.range.start(tail), interface.range.end(tail), interface.range.start(pfn))
     if State != state.ready: return
-    # tail = func_t
-    for ea in database.address.iterate(*interface.range.unpack(tail)):
-        for k in database.tag(ea):
-            internal.comment.globals.dec(ea, k)
-            internal.comment.contents.inc(ea, k, target=interface.range.start(pfn))
-            logging.debug(u"{:s}.func_tail_appended({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), interface.range.start(tail), utils.string.repr(k), utils.string.repr(k)))
-        continue
-    return
+    with deferred():
+        # tail = func_t
+        l, r = interface.range.unpack(tail)
+        for ea in internal.comment.globals.address(l, r):
+            for k in database.tag(ea):
+                deferred.dec(internal.comment.globals, ea, k)
+                deferred.inc(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                debugQ() and logging.debug(u"{:s}.func_tail_appended({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), interface.range.start(tail), utils.string.repr(k), utils.string.repr(k)))
+            continue
+        return
 
 def removing_func_tail(pfn, tail):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    function.chunks._remove(interface.range.start(tail))
     if State != state.ready: return
-    # tail = range_t
-    for ea in database.address.iterate(*interface.range.unpack(tail)):
-        for k in database.tag(ea):
-            internal.comment.contents.dec(ea, k, target=interface.range.start(pfn))
-            internal.comment.globals.inc(ea, k)
-            logging.debug(u"{:s}.removing_func_tail({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), interface.range.start(tail), utils.string.repr(k), utils.string.repr(k)))
-        continue
-    return
+    with deferred():
+        # tail = range_t
+        l, r = interface.range.unpack(tail)
+        for ea in __tagged(internal.comment.contents.address(l, target=interface.range.start(pfn)), l, r):
+            for k in database.tag(ea):
+                deferred.dec(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                deferred.inc(internal.comment.globals, ea, k)
+                debugQ() and logging.debug(u"{:s}.removing_func_tail({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), interface.range.start(tail), utils.string.repr(k), utils.string.repr(k)))
+            continue
+        return
 
 def add_func(pfn):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    [ function.chunks._insert(l, r, interface.range.start(pfn)) for l, r in function.chunks(pfn) ]
     if State != state.ready: return
 
-    # convert all globals into contents
-    for l, r in function.chunks(pfn):
-        for ea in database.address.iterate(l, r):
-            for k in database.tag(ea):
-                internal.comment.globals.dec(ea, k)
-                internal.comment.contents.inc(ea, k, target=interface.range.start(pfn))
-                logging.debug(u"{:s}.add_func({:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), utils.string.repr(k), utils.string.repr(k)))
+    with deferred():
+        # convert all globals into contents
+        for l, r in function.chunks(pfn):
+            for ea in internal.comment.globals.address(l, r):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.globals, ea, k)
+                    deferred.inc(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    debugQ() and logging.debug(u"{:s}.add_func({:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), utils.string.repr(k), utils.string.repr(k)))
+                continue
             continue
-        continue
-    return
+        return
 
 def del_func(pfn):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    function.chunks._discard(interface.range.start(pfn))
     if State != state.ready: return
 
-    # convert all contents into globals
-    for l, r in function.chunks(pfn):
-        for ea in database.address.iterate(l, r):
-            for k in database.tag(ea):
-                internal.comment.contents.dec(ea, k, target=interface.range.start(pfn))
-                internal.comment.globals.inc(ea, k)
-                logging.debug(u"{:s}.del_func({:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), utils.string.repr(k), utils.string.repr(k)))
+    with deferred():
+        # convert all contents into globals
+        addresses = internal.comment.contents.address(interface.range.start(pfn), target=interface.range.start(pfn))
+        for l, r in function.chunks(pfn):
+            for ea in __tagged(addresses, l, r):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    deferred.inc(internal.comment.globals, ea, k)
+                    debugQ() and logging.debug(u"{:s}.del_func({:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), utils.string.repr(k), utils.string.repr(k)))
+                continue
             continue
-        continue
 
-    # remove all function tags
-    for k in function.tag(interface.range.start(pfn)):
-        internal.comment.globals.dec(interface.range.start(pfn), k)
-        logging.debug(u"{:s}.del_func({:#x}) : Removing (global) tag {!s} from function.".format(__name__, interface.range.start(pfn), utils.string.repr(k)))
-    return
+        # remove all function tags
+        for k in function.tag(interface.range.start(pfn)):
+            deferred.dec(internal.comment.globals, interface.range.start(pfn), k)
+            debugQ() and logging.debug(u"{:s}.del_func({:#x}) : Removing (global) tag {!s} from function.".format(__name__, interface.range.start(pfn), utils.string.repr(k)))
+        return
 
 def set_func_start(pfn, new_start):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    function.chunks._update(interface.range.start(pfn), start=new_start, owner=new_start)
     if State != state.ready: return
 
-    # new_start has removed addresses from function
-    # replace contents with globals
-    if interface.range.start(pfn) > new_start:
-        for ea in database.address.iterate(new_start, interface.range.start(pfn)):
-            for k in database.tag(ea):
-                internal.comment.contents.dec(ea, k, target=interface.range.start(pfn))
-                internal.comment.globals.inc(ea, k)
-                logging.debug(u"{:s}.set_func_start({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_start, utils.string.repr(k), utils.string.repr(k)))
-            continue
-        return
+    with deferred():
+        # new_start has removed addresses from function
+        # replace contents with globals
+        if interface.range.start(pfn) > new_start:
+            addresses = internal.comment.contents.address(interface.range.start(pfn), target=interface.range.start(pfn))
+            for ea in __tagged(addresses, new_start, interface.range.start(pfn)):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    deferred.inc(internal.comment.globals, ea, k)
+                    debugQ() and logging.debug(u"{:s}.set_func_start({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_start, utils.string.repr(k), utils.string.repr(k)))
+                continue
+            return
 
-    # new_start has added addresses to function
-    # replace globals with contents
-    elif interface.range.start(pfn) < new_start:
-        for ea in database.address.iterate(interface.range.start(pfn), new_start):
-            for k in database.tag(ea):
-                internal.comment.globals.dec(ea, k)
-                internal.comment.contents.inc(ea, k, target=interface.range.start(pfn))
-                logging.debug(u"{:s}.set_func_start({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_start, utils.string.repr(k), utils.string.repr(k)))
-            continue
+        # new_start has added addresses to function
+        # replace globals with contents
+        elif interface.range.start(pfn) < new_start:
+            for ea in internal.comment.globals.address(interface.range.start(pfn), new_start):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.globals, ea, k)
+                    deferred.inc(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    debugQ() and logging.debug(u"{:s}.set_func_start({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_start, utils.string.repr(k), utils.string.repr(k)))
+                continue
+            return
         return
-    return
 
 def set_func_end(pfn, new_end):
     global State
+    function.blocks.invalidate(interface.range.start(pfn))
+    database.functions.invalidate(interface.range.start(pfn))
+    function.chunks._update(interface.range.start(pfn), end=new_end)
     if State != state.ready: return
-    # new_end has added addresses to function
-    # replace globals with contents
-    if new_end > interface.range.end(pfn):
-        for ea in database.address.iterate(interface.range.end(pfn), new_end):
-            for k in database.tag(ea):
-                internal.comment.globals.dec(ea, k)
-                internal.comment.contents.inc(ea, k, target=interface.range.start(pfn))
-                logging.debug(u"{:s}.set_func_end({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_end, utils.string.repr(k), utils.string.repr(k)))
-            continue
-        return
+    with deferred():
+        # new_end has added addresses to function
+        # replace globals with contents
+        if new_end > interface.range.end(pfn):
+            for ea in internal.comment.globals.address(interface.range.end(pfn), new_end):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.globals, ea, k)
+                    deferred.inc(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    debugQ() and logging.debug(u"{:s}.set_func_end({:#x}, {:#x}) : Exchanging (decreasing) refcount for global tag {!s} and (increasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_end, utils.string.repr(k), utils.string.repr(k)))
+                continue
+            return
 
-    # new_end has removed addresses from function
-    # replace contents with globals
-    elif new_end < interface.range.end(pfn):
-        for ea in database.address.iterate(new_end, interface.range.end(pfn)):
-            for k in database.tag(ea):
-                internal.comment.contents.dec(ea, k, target=interface.range.start(pfn))
-                internal.comment.globals.inc(ea, k)
-                logging.debug(u"{:s}.set_func_end({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_end, utils.string.repr(k), utils.string.repr(k)))
-            continue
+        # new_end has removed addresses from function
+        # replace contents with globals
+        elif new_end < interface.range.end(pfn):
+            addresses = internal.comment.contents.address(interface.range.start(pfn), target=interface.range.start(pfn))
+            for ea in __tagged(addresses, new_end, interface.range.end(pfn)):
+                for k in database.tag(ea):
+                    deferred.dec(internal.comment.contents, ea, k, target=interface.range.start(pfn))
+                    deferred.inc(internal.comment.globals, ea, k)
+                    debugQ() and logging.debug(u"{:s}.set_func_end({:#x}, {:#x}) : Exchanging (increasing) refcount for global tag {!s} and (decreasing) refcount for contents tag {!s}.".format(__name__, interface.range.start(pfn), new_end, utils.string.repr(k), utils.string.repr(k)))
+                continue
+            return
         return
-    return